@@ -1,30 +1,102 @@
+from scraper_common.async_coreapi import AsyncCoreAPIClient
+from scraper_common.buffers import (
+    DownloadBuffers,
+    SpooledBuffer,
+    StagedFile,
+    download_buffers,
+)
+from scraper_common.coordination import (
+    CoordinationServer,
+    CoordinationStore,
+    HTTPStore,
+    MemoryStore,
+    SQLiteStore,
+    coordination_store,
+)
 from scraper_common.coreapi import CoreAPIClient
+from scraper_common.dedup import (
+    ContentHashIndex,
+    DedupStorageClient,
+    GCSHashIndex,
+    HashingReader,
+    SQLiteHashIndex,
+)
+from scraper_common.feedcache import FeedCache
 from scraper_common.proxy import ProxyConfig, proxy_config
+from scraper_common.proxypool import ProxyPool, is_proxy_failure
+from scraper_common.ratelimit import (
+    RateLimiter,
+    TokenBucket,
+    is_rate_limited,
+    rate_limiter,
+)
+from scraper_common.seen import SeenVideoIndex
 from scraper_common.storage import (
     DiskStorageClient,
     GoogleCloudStorageClient,
+    IterableReader,
     StorageClient,
+    stored_ids,
+    upload_async_chunks,
 )
+from scraper_common.tiered import Throttle, ThrottledReader, TieredStorageClient
 from scraper_common.types import (
     ChannelFeed,
     Cursor,
     KeywordFeed,
     MediaFeed,
     Platform,
+    RegistrationResult,
     Video,
 )
+from scraper_common.uploader import AsyncUploader
+from scraper_common.writebehind import WriteBehindQueue, drain_on_sigterm
 
 __all__ = [
+    "AsyncCoreAPIClient",
+    "AsyncUploader",
     "ChannelFeed",
+    "ContentHashIndex",
+    "CoordinationServer",
+    "CoordinationStore",
     "CoreAPIClient",
     "Cursor",
+    "DedupStorageClient",
     "DiskStorageClient",
+    "DownloadBuffers",
+    "FeedCache",
+    "GCSHashIndex",
     "GoogleCloudStorageClient",
+    "HTTPStore",
+    "HashingReader",
+    "IterableReader",
     "KeywordFeed",
+    "MemoryStore",
     "MediaFeed",
     "Platform",
     "ProxyConfig",
+    "ProxyPool",
+    "RateLimiter",
+    "RegistrationResult",
+    "SQLiteHashIndex",
+    "SQLiteStore",
+    "SeenVideoIndex",
+    "SpooledBuffer",
+    "StagedFile",
     "StorageClient",
+    "Throttle",
+    "ThrottledReader",
+    "TieredStorageClient",
+    "TokenBucket",
     "Video",
+    "WriteBehindQueue",
+    "coordination_store",
+    "download_buffers",
+    "drain_on_sigterm",
+    "is_proxy_failure",
+    "is_rate_limited",
     "proxy_config",
+    "rate_limiter",
+    "stored_ids",
+    "upload_async_chunks",
 ]
@@ -0,0 +1,453 @@
+import asyncio
+import contextlib
+import itertools
+from collections.abc import AsyncGenerator, AsyncIterator, Iterable
+from typing import Any
+from uuid import UUID
+
+import httpx
+import structlog
+
+from scraper_common.coreapi import (
+    CURSOR_PAGE_SIZE,
+    DEFAULT_TIMEOUT,
+    FEED_PAGE_SIZE,
+    RESCRAPE_LIMIT,
+    RESCRAPE_PAGE_SIZE,
+    VIDEO_LOOKUP_CHUNK_SIZE,
+    CoreAPIBase,
+    _Paging,
+)
+from scraper_common.feedcache import FeedCache
+from scraper_common.seen import SeenVideoIndex
+from scraper_common.types import (
+    ChannelFeed,
+    Cursor,
+    KeywordFeed,
+    Platform,
+    RegistrationResult,
+    Video,
+)
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+
+class AsyncCoreAPIClient(CoreAPIBase):
+    """Asyncio client for the Core API, with the same surface as CoreAPIClient.
+
+    Requests share one pooled httpx.AsyncClient, and at most `max_concurrency`
+    requests are in flight at a time, so core API calls can overlap with
+    downloads in an event loop without flooding the API. Use as an async context
+    manager, or call `aclose()` to commit pending cursors and close the pool when
+    finished.
+
+    Like CoreAPIClient, it can prefetch a platform's cursors, hold cursor updates
+    back with `cursor_flush_every`, and revalidate feed pages against a
+    `feed_cache`.
+
+    Args:
+        api_url: Base URL of the core API.
+        api_key: API token sent in the X-API-TOKEN header.
+        max_concurrency: Maximum number of requests in flight.
+        max_keepalive: Maximum number of idle connections kept alive.
+        timeout: Request timeout in seconds, or a (connect, read) tuple.
+        retries: Retries for failed connection attempts.
+        seen_index: Optional local index of known videos, consulted before
+            asking the API whether a video exists.
+        cursor_flush_every: Number of cursor updates to hold back before
+            committing them. 0 commits every update immediately.
+        feed_cache: Optional on-disk cache of channel and keyword feed pages.
+        transport: Optional httpx transport, mostly useful for testing.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        max_concurrency: int = 16,
+        max_keepalive: int = 16,
+        timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = 3,
+        seen_index: SeenVideoIndex | None = None,
+        cursor_flush_every: int = 0,
+        feed_cache: FeedCache | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        super().__init__(
+            api_url, api_key, timeout, seen_index, cursor_flush_every, feed_cache
+        )
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            httpx_timeout = httpx.Timeout(read, connect=connect)
+        else:
+            httpx_timeout = httpx.Timeout(timeout)
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.client = httpx.AsyncClient(
+            headers=self._headers,
+            timeout=httpx_timeout,
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_keepalive,
+            ),
+            transport=transport or httpx.AsyncHTTPTransport(retries=retries),
+        )
+
+    async def __aenter__(self) -> "AsyncCoreAPIClient":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Commit pending cursors and close the underlying connection pool."""
+        await self.flush_cursors()
+        await self.client.aclose()
+
+    async def _request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        async with self._semaphore:
+            return await self.client.request(method, url, **kwargs)
+
+    async def _get_page(
+        self, path: str, params: dict[str, Any], cached: bool = False
+    ) -> list[dict[str, Any]]:
+        """Fetch the "data" of a single page, going through the feed cache if asked."""
+        url = f"{self.api_url}{path}"
+        feed_cache = self.feed_cache
+        if not cached or feed_cache is None:
+            resp = await self._request("GET", url, params=params)
+            resp.raise_for_status()
+            return resp.json()["data"]
+
+        key, snapshot, headers = self._revalidation(feed_cache, url, params)
+        kwargs: dict[str, Any] = {"params": params, "headers": headers}
+        if snapshot is not None:
+            kwargs["timeout"] = httpx.Timeout(
+                feed_cache.timeout, connect=self._connect_timeout
+            )
+
+        log = logger.bind(path=path, params=params)
+        try:
+            resp = await self._request("GET", url, **kwargs)
+            if resp.status_code == 304 and snapshot is not None:
+                log.debug("feed page not modified, using cached snapshot")
+                return snapshot["data"]
+            resp.raise_for_status()
+            page = resp.json()["data"]
+        except (httpx.TransportError, httpx.HTTPStatusError) as ex:
+            status = (
+                ex.response.status_code
+                if isinstance(ex, httpx.HTTPStatusError)
+                else None
+            )
+            return self._fall_back_to_snapshot(ex, snapshot, status, log)
+
+        self._store_snapshot(feed_cache, key, page, resp.headers)
+        return page
+
+    async def _iter_pages(
+        self,
+        path: str,
+        page_size: int,
+        params: dict[str, Any] | None = None,
+        cached: bool = False,
+    ) -> AsyncGenerator[list[dict[str, Any]]]:
+        """Yield the "data" of each page of a limit/offset paginated endpoint."""
+        paging = _Paging(page_size, params)
+        while not paging.done:
+            page = await self._get_page(path, paging.params, cached=cached)
+            if paging.accept(page):
+                yield page
+
+    async def iter_channel_feeds(
+        self, page_size: int = FEED_PAGE_SIZE
+    ) -> AsyncIterator[ChannelFeed]:
+        """Iterates over channel feeds, fetching and parsing them a page at a time."""
+        pages = self._iter_pages("/media_feeds/channels", page_size, cached=True)
+        async with contextlib.aclosing(pages):
+            async for page in pages:
+                for feed in page:
+                    yield ChannelFeed(**feed)
+
+    async def iter_keyword_feeds(
+        self, page_size: int = FEED_PAGE_SIZE
+    ) -> AsyncIterator[KeywordFeed]:
+        """Iterates over keyword feeds, fetching and parsing them a page at a time."""
+        pages = self._iter_pages("/media_feeds/keywords", page_size, cached=True)
+        async with contextlib.aclosing(pages):
+            async for page in pages:
+                for feed in page:
+                    yield KeywordFeed(**feed)
+
+    async def fetch_channel_feeds(self) -> list[ChannelFeed]:
+        """Fetches channel feed data from the core API."""
+        return [feed async for feed in self.iter_channel_feeds()]
+
+    async def fetch_keyword_feeds(self) -> list[KeywordFeed]:
+        """Fetches keyword feed data from the core API."""
+        return [feed async for feed in self.iter_keyword_feeds()]
+
+    async def fetch_cursor(
+        self, target: str, platform: Platform
+    ) -> dict[str, Any] | None:
+        """Fetches the current cursor for a given target and platform.
+
+        Held-back updates and prefetched cursors are answered from memory.
+
+        Returns:
+            The cursor dict as stored in the API, or None if not found.
+        """
+        known, cursor = self._held_cursor(target, platform)
+        if known:
+            return cursor
+
+        resp = await self._request("GET", self._cursor_url(target, platform))
+        if resp.status_code == 404:
+            return None
+        resp.raise_for_status()
+        return Cursor(**resp.json()["data"]).cursor
+
+    async def update_cursor(
+        self, target: str, platform: Platform, cursor: dict[str, Any]
+    ) -> None:
+        """Updates the stored cursor for a given target and platform.
+
+        If `cursor_flush_every` is set, the update is held back and committed with
+        the next batch.
+        """
+        if not self.cursor_flush_every:
+            await self._post_cursor(target, platform, cursor)
+        elif self._hold_cursor(target, platform, cursor):
+            await self.flush_cursors()
+
+    async def _post_cursor(
+        self, target: str, platform: Platform, cursor: dict[str, Any]
+    ) -> None:
+        logger.debug("updating cursor", cursor=cursor, target=target)
+        resp = await self._request(
+            "POST", self._cursor_url(target, platform), json=cursor
+        )
+        resp.raise_for_status()
+
+    async def prefetch_cursors(
+        self, platform: Platform, page_size: int = CURSOR_PAGE_SIZE
+    ) -> int:
+        """Load every stored cursor for a platform into memory.
+
+        After a successful prefetch, `fetch_cursor` answers from memory for that
+        platform. If the API can't list cursors, cursors keep being fetched one at
+        a time.
+
+        Returns:
+            The number of cursors loaded.
+        """
+        cursors: dict[str, dict[str, Any]] = {}
+        seen: set[UUID] = set()
+        offset = 0
+        try:
+            while True:
+                resp = await self._request(
+                    "GET",
+                    f"{self.api_url}/media_feeds/cursors",
+                    params={"platform": platform, "limit": page_size, "offset": offset},
+                )
+                resp.raise_for_status()
+                data = resp.json()["data"]
+                if self._collect_cursors(data, platform, page_size, cursors, seen):
+                    break
+                offset += page_size
+        except httpx.HTTPStatusError as ex:
+            logger.warning(
+                "couldn't prefetch cursors, fetching them per target", exc_info=ex
+            )
+            return 0
+
+        return self._store_prefetched(platform, cursors)
+
+    async def flush_cursors(self) -> None:
+        """Commit all held-back cursor updates, concurrently.
+
+        Cursors that fail to commit stay pending and are retried on the next flush.
+        """
+        pending = self._take_pending_cursors()
+        results = await asyncio.gather(
+            *(
+                self._post_cursor(target, platform, cursor)
+                for (target, platform), cursor in pending.items()
+            ),
+            return_exceptions=True,
+        )
+
+        failed: dict[tuple[str, Platform], dict[str, Any]] = {}
+        for ((target, platform), cursor), result in zip(
+            pending.items(), results, strict=True
+        ):
+            if isinstance(result, Exception):
+                logger.error(f"couldn't commit cursor for {target}", exc_info=result)
+                failed[(target, platform)] = cursor
+        self._restore_pending_cursors(failed)
+
+    async def get_video(
+        self, platform_video_id: str, platform: Platform
+    ) -> dict[str, Any] | None:
+        """Check if a video entry already exists in the API."""
+        if self.seen_index is not None:
+            if cached := self.seen_index.get(platform, platform_video_id):
+                return cached
+
+        resp = await self._request(
+            "POST",
+            f"{self.api_url}/videos/filter",
+            json=self._video_filter_query([platform_video_id], platform),
+        )
+        return self._first_video(resp.json(), platform_video_id, platform)
+
+    async def get_videos(
+        self,
+        platform_video_ids: Iterable[str],
+        platform: Platform,
+        chunk_size: int = VIDEO_LOOKUP_CHUNK_SIZE,
+    ) -> dict[str, dict[str, Any] | None]:
+        """Look up many videos at once. Chunks are requested concurrently.
+
+        Returns:
+            A dict mapping every requested id to its video, or None if unknown.
+        """
+        ids = list(dict.fromkeys(platform_video_ids))
+        result, missing = self._cached_videos(ids, platform)
+
+        async def lookup(chunk: list[str]) -> list[dict[str, Any]]:
+            resp = await self._request(
+                "POST",
+                f"{self.api_url}/videos/filter",
+                json=self._video_filter_query(chunk, platform),
+            )
+            resp.raise_for_status()
+            return resp.json().get("data") or []
+
+        chunks = [
+            missing[start : start + chunk_size]
+            for start in range(0, len(missing), chunk_size)
+        ]
+        for videos in await asyncio.gather(*(lookup(chunk) for chunk in chunks)):
+            self._collect_videos(videos, platform, result)
+        return result
+
+    async def check_entry_exists(
+        self, platform_video_id: str, platform: Platform
+    ) -> bool:
+        """Check if a video entry already exists in the API."""
+        return await self.get_video(platform_video_id, platform) is not None
+
+    async def register_video(self, video: Video) -> RegistrationResult:
+        """Register a video entry with the API in a single request.
+
+        Returns:
+            CREATED, or EXISTED if the video was already registered.
+        """
+        data = self._build_api_payload(video)
+        log = logger.bind(video_data=data)
+        try:
+            resp = await self._request("POST", f"{self.api_url}/videos", json=data)
+            if resp.status_code == 409:
+                log.debug("video already exists, skipping")
+                return RegistrationResult.EXISTED
+            log.debug("registered video with API", data=data)
+            resp.raise_for_status()
+        except Exception as ex:
+            log.error("couldn't post to video api", exc_info=ex, data=data)
+            raise
+        if self.seen_index is not None:
+            with contextlib.suppress(ValueError):
+                self._remember_registered(video, resp.json())
+        return RegistrationResult.CREATED
+
+    async def update_video_stats(
+        self,
+        id: str,
+        views: int | None,
+        likes: int | None,
+        comments: int | None,
+        channel_followers: int | None,
+    ) -> None:
+        """Update the stats of a video entry with the API."""
+        data = self._stats_payload(views, likes, comments, channel_followers)
+        log = logger.bind(video_id=id)
+        try:
+            resp = await self._request(
+                "PATCH", f"{self.api_url}/videos/{id}", json=data
+            )
+            log.debug("updating video stats with API", data=data)
+            resp.raise_for_status()
+        except Exception as ex:
+            log.error("couldn't post to video stats api", exc_info=ex, data=data)
+            raise
+        self._remember_views(id, data)
+
+    async def register_video_entry(self, video: Video) -> RegistrationResult:
+        """Register a video, without raising.
+
+        Returns:
+            CREATED, EXISTED if the video was already registered, or FAILED.
+        """
+        log = logger.bind(
+            video_id=video.platform_video_id, destination_path=video.destination_path
+        )
+        try:
+            result = await self.register_video(video)
+            log.debug(f"registration of {video.platform_video_id} {result}")
+            return result
+        except Exception as ex:
+            log.error(
+                f"couldn't post to video api, video_id: {video.platform_video_id}",
+                exc_info=ex,
+            )
+            return RegistrationResult.FAILED
+
+    async def get_rescrape_targets(
+        self,
+        platform: Platform,
+        min_age_hours: int = 1,
+        limit: int = 20,
+    ) -> list[dict[str, Any]]:
+        """Get the highest priority videos for rescraping"""
+        resp = await self._request(
+            "GET",
+            f"{self.api_url}/videos/by-expected-views",
+            params={
+                "platform": platform,
+                "min_age_hours": min_age_hours,
+                "limit": limit,
+            },
+        )
+        return resp.json().get("data") or []
+
+    async def iter_rescrape_targets(
+        self,
+        platform: Platform,
+        min_age_hours: int = 1,
+        limit: int = RESCRAPE_LIMIT,
+        page_size: int = RESCRAPE_PAGE_SIZE,
+    ) -> AsyncIterator[dict[str, Any]]:
+        """Iterates over the `limit` videos most due for rescraping, highest first.
+
+        As with CoreAPIClient.iter_rescrape_targets, the targets are fetched
+        before the first is yielded, so rescraping can't shift the pages still to
+        be fetched, and are held in memory until the iteration is done. Targets
+        appearing on more than one page are yielded once.
+
+        Args:
+            platform: The platform (youtube, tiktok, instagram).
+            min_age_hours: Minimum hours since a video was last scraped.
+            limit: Maximum number of targets to fetch and yield.
+            page_size: Number of targets requested per page.
+        """
+        targets: dict[str, dict[str, Any]] = {}
+        params = {"platform": platform, "min_age_hours": min_age_hours}
+        pages = self._iter_pages("/videos/by-expected-views", page_size, params)
+        async with contextlib.aclosing(pages):
+            async for page in pages:
+                if self._collect_targets(targets, page, limit):
+                    break
+        for video in itertools.islice(targets.values(), limit):
+            yield video
@@ -0,0 +1,152 @@
+import io
+import os
+import tempfile
+import threading
+import time
+from typing import Any
+
+import structlog
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+MIB = 1024 * 1024
+
+
+class SpooledBuffer(tempfile.SpooledTemporaryFile[bytes]):
+    """A download buffer that gives its memory reservation back when closed."""
+
+    def __init__(self, owner: "DownloadBuffers", reserved: int, **kwargs: Any):
+        super().__init__(**kwargs)
+        self._owner = owner
+        self._reserved = reserved
+
+    def close(self) -> None:
+        super().close()
+        if self._reserved:
+            self._owner._release(self._reserved)
+            self._reserved = 0
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+
+class StagedFile(io.BufferedReader):
+    """A download written to a staging directory, read from where it was written.
+
+    Closing it removes the staging directory with the file, so whoever it's
+    handed to, e.g. the uploader, cleans up after the download.
+    """
+
+    def __init__(self, path: str, staging: tempfile.TemporaryDirectory[str]):
+        super().__init__(io.FileIO(path))
+        self._staging = staging
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._staging.cleanup()
+
+
+class DownloadBuffers:
+    """Hands out download buffers that spill to disk, within a memory budget.
+
+    Buffers are kept in memory up to `spool_threshold` bytes and moved to a
+    temporary file once they grow beyond it. Each buffer reserves the threshold
+    from `memory_budget` until it is closed, and new buffers wait while the
+    budget is used up, so the memory held by in-flight downloads stays bounded
+    however large or concurrent they are.
+
+    Environment variables (see `from_env`):
+        DOWNLOAD_SPOOL_THRESHOLD_MB: Size a buffer may reach before spilling to
+            disk (default: 32)
+        DOWNLOAD_MEMORY_BUDGET_MB: Memory shared by all buffers (default: 256)
+        DOWNLOAD_TMP_DIR: Directory for spilled buffers (default: system temp dir)
+
+    Args:
+        spool_threshold: Bytes a buffer holds in memory before spilling to disk.
+        memory_budget: Bytes of memory shared by all open buffers.
+        tmp_dir: Directory for spilled buffers.
+    """
+
+    def __init__(
+        self,
+        spool_threshold: int = 32 * MIB,
+        memory_budget: int = 256 * MIB,
+        tmp_dir: str | None = None,
+    ):
+        self.spool_threshold = spool_threshold
+        self.memory_budget = memory_budget
+        self.tmp_dir = tmp_dir
+        self._cond = threading.Condition()
+        self._reserved = 0
+
+    @classmethod
+    def from_env(cls) -> "DownloadBuffers":
+        """Create buffers configured from environment variables."""
+        return cls(
+            spool_threshold=int(
+                float(os.environ.get("DOWNLOAD_SPOOL_THRESHOLD_MB", 32)) * MIB
+            ),
+            memory_budget=int(
+                float(os.environ.get("DOWNLOAD_MEMORY_BUDGET_MB", 256)) * MIB
+            ),
+            tmp_dir=os.environ.get("DOWNLOAD_TMP_DIR") or None,
+        )
+
+    @property
+    def reserved(self) -> int:
+        """Bytes of the budget currently reserved by open buffers."""
+        return self._reserved
+
+    def acquire(self, timeout: float | None = None) -> SpooledBuffer:
+        """Get a new buffer, waiting until the memory budget allows it.
+
+        Close the buffer when done with it to return its reservation.
+
+        Args:
+            timeout: Maximum number of seconds to wait, or None to wait forever.
+
+        Raises:
+            TimeoutError: If the budget didn't allow a new buffer in time.
+        """
+        size = min(self.spool_threshold, self.memory_budget)
+        with self._cond:
+            if self._reserved + size > self.memory_budget:
+                logger.info(
+                    "waiting for download memory budget",
+                    reserved=self._reserved,
+                    memory_budget=self.memory_budget,
+                )
+                start = time.monotonic()
+                if not self._cond.wait_for(
+                    lambda: self._reserved + size <= self.memory_budget, timeout
+                ):
+                    raise TimeoutError("no download memory budget available")
+                logger.debug(
+                    f"waited {time.monotonic() - start:.1f}s for download memory"
+                )
+            self._reserved += size
+
+        return SpooledBuffer(
+            self, size, max_size=self.spool_threshold, dir=self.tmp_dir
+        )
+
+    def staging_dir(self) -> tempfile.TemporaryDirectory[str]:
+        """Create a directory of its own for a download to be written to.
+
+        For downloaders that write to files, which are then read in place as a
+        `StagedFile` rather than copied into a buffer. The directory is in
+        `tmp_dir` and is removed with its contents when used as a context
+        manager, or when the `StagedFile` is closed.
+        """
+        return tempfile.TemporaryDirectory(prefix="download-", dir=self.tmp_dir)
+
+    def _release(self, size: int) -> None:
+        with self._cond:
+            self._reserved -= size
+            self._cond.notify_all()
+
+
+# Default instance loaded from environment
+download_buffers = DownloadBuffers.from_env()
@@ -0,0 +1,296 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Protocol
+
+import requests
+import structlog
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+
+class CoordinationStore(Protocol):
+    """Leases and rate budgets shared by every scraper using the same store.
+
+    Leases are named, e.g. "proxy:12", held by one holder at a time and expire
+    after their ttl unless renewed. Rate budgets are token buckets kept in the
+    store, so all scrapers drawing from one together stay within its rate.
+    """
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        """Take or renew a lease for `ttl` seconds.
+
+        Returns:
+            False if another holder has the lease.
+        """
+        ...
+
+    def release_lease(self, name: str, holder: str) -> None:
+        """Give up a lease, if `holder` has it."""
+        ...
+
+    def reserve(self, name: str, rate: float, burst: int) -> float:
+        """Take a token from a shared bucket refilled at `rate` tokens/s.
+
+        Returns:
+            Seconds to wait before the reserved request may be made.
+        """
+        ...
+
+
+def _reserve(
+    tokens: float, updated_at: float, now: float, rate: float, burst: int
+) -> tuple[float, float]:
+    """New token count of a bucket after taking a token, and the wait for it."""
+    tokens = min(burst, tokens + (now - updated_at) * rate) - 1
+    return tokens, max(0.0, -tokens / rate)
+
+
+class MemoryStore:
+    """Coordination store in process memory, for a single process and tests."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # name -> (holder, expires_at)
+        self._leases: dict[str, tuple[str, float]] = {}
+        # name -> (tokens, updated_at)
+        self._budgets: dict[str, tuple[float, float]] = {}
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease[0] != holder and lease[1] > now:
+                return False
+            self._leases[name] = (holder, now + ttl)
+            return True
+
+    def release_lease(self, name: str, holder: str) -> None:
+        with self._lock:
+            lease = self._leases.get(name)
+            if lease is not None and lease[0] == holder:
+                del self._leases[name]
+
+    def reserve(self, name: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self._lock:
+            tokens, updated_at = self._budgets.get(name, (float(burst), now))
+            tokens, wait = _reserve(tokens, updated_at, now, rate, burst)
+            self._budgets[name] = (tokens, now)
+        return wait
+
+
+class SQLiteStore:
+    """Coordination store in a SQLite file, shared by the processes of one node.
+
+    Every operation runs in an immediate transaction, so SQLite's file lock
+    serializes them across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS budgets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )"""
+        )
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT holder, expires_at FROM leases WHERE name = ?", (name,)
+                ).fetchone()
+                if row is not None and row[0] != holder and row[1] > now:
+                    return False
+                self._conn.execute(
+                    """INSERT OR REPLACE INTO leases (name, holder, expires_at)
+                    VALUES (?, ?, ?)""",
+                    (name, holder, now + ttl),
+                )
+                return True
+            finally:
+                self._conn.execute("COMMIT")
+
+    def release_lease(self, name: str, holder: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder)
+            )
+
+    def reserve(self, name: str, rate: float, burst: int) -> float:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM budgets WHERE name = ?", (name,)
+                ).fetchone()
+                tokens, updated_at = row or (float(burst), now)
+                tokens, wait = _reserve(tokens, updated_at, now, rate, burst)
+                self._conn.execute(
+                    """INSERT OR REPLACE INTO budgets (name, tokens, updated_at)
+                    VALUES (?, ?, ?)""",
+                    (name, tokens, now),
+                )
+            finally:
+                self._conn.execute("COMMIT")
+        return wait
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class HTTPStore:
+    """Client of a coordination server shared by scrapers across nodes.
+
+    See `CoordinationServer`. If the server can't be reached, scrapers carry
+    on uncoordinated: leases are granted and budgets don't make them wait.
+
+    Args:
+        url: Base URL of the coordination server.
+        timeout: Timeout in seconds for requests to the server.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def _post(self, path: str, body: dict[str, Any]) -> dict[str, Any] | None:
+        try:
+            resp = self._session.post(
+                f"{self.url}{path}", json=body, timeout=self.timeout
+            )
+            resp.raise_for_status()
+            return resp.json()
+        except (requests.RequestException, ValueError) as ex:
+            logger.warning(
+                "coordination server unavailable, carrying on uncoordinated",
+                event_metric="coordination_failure",
+                exc_info=ex,
+            )
+            return None
+
+    def acquire_lease(self, name: str, holder: str, ttl: float) -> bool:
+        result = self._post(
+            "/leases/acquire", {"name": name, "holder": holder, "ttl": ttl}
+        )
+        return result is None or bool(result["acquired"])
+
+    def release_lease(self, name: str, holder: str) -> None:
+        self._post("/leases/release", {"name": name, "holder": holder})
+
+    def reserve(self, name: str, rate: float, burst: int) -> float:
+        result = self._post(
+            "/budgets/reserve", {"name": name, "rate": rate, "burst": burst}
+        )
+        return 0.0 if result is None else float(result["wait"])
+
+
+class CoordinationHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "CoordinationServer"
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def reply(self, status: int, body: dict[str, Any]) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self) -> None:
+        store = self.server.store
+        try:
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/leases/acquire":
+                acquired = store.acquire_lease(
+                    body["name"], body["holder"], float(body["ttl"])
+                )
+                return self.reply(200, {"acquired": acquired})
+            if self.path == "/leases/release":
+                store.release_lease(body["name"], body["holder"])
+                return self.reply(200, {})
+            if self.path == "/budgets/reserve":
+                wait = store.reserve(body["name"], float(body["rate"]), body["burst"])
+                return self.reply(200, {"wait": wait})
+        except (KeyError, TypeError, ValueError) as ex:
+            return self.reply(400, {"error": str(ex)})
+        self.reply(404, {"error": "not found"})
+
+
+class CoordinationServer(ThreadingHTTPServer):
+    """Serves a coordination store to `HTTPStore` clients on other nodes.
+
+    Args:
+        store: Store holding the leases and budgets, e.g. a `SQLiteStore`.
+        host: Address to listen on.
+        port: Port to listen on, 0 for any free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, store: CoordinationStore, host: str = "", port: int = 8080):
+        super().__init__((host, port), CoordinationHandler)
+        self.store = store
+
+
+def store_from_env() -> CoordinationStore | None:
+    """Coordination store configured by the environment, if any.
+
+    Environment variables:
+        COORDINATION_STORE: URL of a coordination server, or path of a SQLite
+            file for scrapers on a single node. Scrapers aren't coordinated if
+            unset.
+    """
+    location = os.environ.get("COORDINATION_STORE", "")
+    if not location:
+        return None
+    if location.startswith(("http://", "https://")):
+        return HTTPStore(location)
+    return SQLiteStore(location)
+
+
+# Default instance loaded from environment
+coordination_store = store_from_env()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a coordination store.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--db", help="SQLite file, in memory if not given")
+    args = parser.parse_args()
+
+    store: CoordinationStore = SQLiteStore(args.db) if args.db else MemoryStore()
+    server = CoordinationServer(store, port=args.port)
+    logger.info(f"coordination server listening on port {server.server_port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
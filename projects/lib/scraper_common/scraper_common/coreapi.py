@@ -1,49 +1,553 @@
+import contextlib
+import itertools
+import json
+import threading
 import urllib.parse
+from collections.abc import Iterable, Iterator, Mapping
 from typing import Any
+from uuid import UUID
 
 import requests
 import structlog
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
+from urllib3.util.retry import Retry
 
-from scraper_common.types import ChannelFeed, Cursor, KeywordFeed, Platform, Video
+from scraper_common.feedcache import FeedCache
+from scraper_common.seen import SeenVideoIndex
+from scraper_common.types import (
+    ChannelFeed,
+    Cursor,
+    KeywordFeed,
+    Platform,
+    RegistrationResult,
+    Video,
+)
+from scraper_common.writebehind import WriteBehindQueue
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5.0, 30.0)
 
-class CoreAPIClient:
-    """Client for interacting with the Core API for media feed and cursor management."""
+# number of ids resolved per /videos/filter request in get_videos
+VIDEO_LOOKUP_CHUNK_SIZE = 50
 
-    def __init__(self, api_url: str, api_key: str):
+# number of cursors requested per page in prefetch_cursors
+CURSOR_PAGE_SIZE = 500
+
+# number of feeds and rescrape targets requested per page by the iter_* methods
+FEED_PAGE_SIZE = 500
+RESCRAPE_PAGE_SIZE = 20
+
+# maximum number of rescrape targets held by iter_rescrape_targets
+RESCRAPE_LIMIT = 100
+
+
+class _Paging:
+    """Offset bookkeeping for walking a limit/offset paginated endpoint."""
+
+    def __init__(self, page_size: int, params: dict[str, Any] | None = None):
+        self.page_size = page_size
+        self.base_params = params or {}
+        self.offset = 0
+        self.done = False
+        self._first_id = None
+
+    @property
+    def params(self) -> dict[str, Any]:
+        """Query parameters for the next page."""
+        return {**self.base_params, "limit": self.page_size, "offset": self.offset}
+
+    def accept(self, page: list[dict[str, Any]]) -> bool:
+        """Advance past a fetched page.
+
+        Returns:
+            Whether the page is new, i.e. not the first page again from an API
+            that ignores paging.
+        """
+        if page and self.offset and page[0].get("id") == self._first_id:
+            self.done = True
+            return False
+        if page and not self.offset:
+            self._first_id = page[0].get("id")
+
+        if len(page) != self.page_size:
+            self.done = True
+        self.offset += self.page_size
+        return True
+
+
+class CoreAPIBase:
+    """Request building and response handling shared by the sync and async clients.
+
+    Subclasses only add the transport, so both clients send the same requests,
+    interpret the responses the same way, and hold back cursors and cache feed
+    pages alike.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+        seen_index: SeenVideoIndex | None = None,
+        cursor_flush_every: int = 0,
+        feed_cache: FeedCache | None = None,
+    ):
         self.api_url = api_url.rstrip("/")
         self.api_key = api_key
+        self.timeout = timeout
+        self.seen_index = seen_index
+        self.feed_cache = feed_cache
+
+        self.cursor_flush_every = cursor_flush_every
+        self._cursor_lock = threading.Lock()
+        self._cursors: dict[Platform, dict[str, dict[str, Any]]] = {}
+        self._pending_cursors: dict[tuple[str, Platform], dict[str, Any]] = {}
 
     @property
     def _headers(self) -> dict[str, str]:
         return {"X-API-TOKEN": self.api_key}
 
+    @property
+    def _connect_timeout(self) -> float:
+        return self.timeout[0] if isinstance(self.timeout, tuple) else self.timeout
+
+    def _held_cursor(
+        self, target: str, platform: Platform
+    ) -> tuple[bool, dict[str, Any] | None]:
+        """Look a cursor up among held-back updates and prefetched cursors.
+
+        Returns:
+            Whether the cursor is known without asking the API, and the cursor,
+            or None if the target has none.
+        """
+        key = self._cursor_key(target)
+        with self._cursor_lock:
+            if (key, platform) in self._pending_cursors:
+                return True, self._pending_cursors[(key, platform)]
+            if platform in self._cursors:
+                return True, self._cursors[platform].get(key)
+        return False, None
+
+    def _hold_cursor(
+        self, target: str, platform: Platform, cursor: dict[str, Any]
+    ) -> bool:
+        """Hold back a cursor update.
+
+        Returns:
+            Whether enough updates are held back to commit them.
+        """
+        with self._cursor_lock:
+            key = self._cursor_key(target)
+            self._pending_cursors[(key, platform)] = cursor
+            if platform in self._cursors:
+                self._cursors[platform][key] = cursor
+            return len(self._pending_cursors) >= self.cursor_flush_every
+
+    def _take_pending_cursors(self) -> dict[tuple[str, Platform], dict[str, Any]]:
+        with self._cursor_lock:
+            pending, self._pending_cursors = self._pending_cursors, {}
+        return pending
+
+    def _restore_pending_cursors(
+        self, failed: dict[tuple[str, Platform], dict[str, Any]]
+    ) -> None:
+        """Put cursors that failed to commit back, behind any newer updates."""
+        if failed:
+            with self._cursor_lock:
+                self._pending_cursors = failed | self._pending_cursors
+
+    def _collect_cursors(
+        self,
+        data: list[dict[str, Any]],
+        platform: Platform,
+        page_size: int,
+        cursors: dict[str, dict[str, Any]],
+        seen: set[UUID],
+    ) -> bool:
+        """Merge a page of /media_feeds/cursors into a prefetch.
+
+        Returns:
+            Whether it was the last page.
+        """
+        page = [Cursor(**c) for c in data]
+        # only the platform's own, as targets of different platforms can share a
+        # name
+        cursors.update(
+            (self._cursor_key(c.target), c.cursor)
+            for c in page
+            if c.platform == platform
+        )
+        # stop on a short page, or if the API ignores paging and keeps returning
+        # cursors we already have
+        ids = {c.id for c in page}
+        done = len(page) != page_size or ids <= seen
+        seen |= ids
+        return done
+
+    def _store_prefetched(
+        self, platform: Platform, cursors: dict[str, dict[str, Any]]
+    ) -> int:
+        with self._cursor_lock:
+            self._cursors[platform] = cursors
+        logger.info(f"prefetched {len(cursors)} cursors for {platform}")
+        return len(cursors)
+
+    @staticmethod
+    def _revalidation(
+        feed_cache: FeedCache, url: str, params: dict[str, Any]
+    ) -> tuple[str, dict[str, Any] | None, dict[str, str]]:
+        """Look up the snapshot of a feed page.
+
+        Returns:
+            The cache key, the snapshot if there is one, and the headers that
+            revalidate it.
+        """
+        key = feed_cache.key(url, params)
+        snapshot = feed_cache.get(key)
+        if snapshot is None:
+            return key, None, {}
+        return key, snapshot, feed_cache.conditional_headers(snapshot)
+
+    @staticmethod
+    def _fall_back_to_snapshot(
+        ex: Exception,
+        snapshot: dict[str, Any] | None,
+        status: int | None,
+        log: structlog.BoundLogger,
+    ) -> list[dict[str, Any]]:
+        """Answer a failed feed page request from its snapshot.
+
+        Raises:
+            The request's exception, if there is no snapshot or the API rejected
+            the request rather than being unavailable.
+        """
+        if snapshot is None or (status is not None and status < 500):
+            raise ex
+        log.warning(
+            "core api unavailable, using cached feed snapshot",
+            stored_at=snapshot.get("stored_at"),
+            exc_info=ex,
+        )
+        return snapshot["data"]
+
+    @staticmethod
+    def _store_snapshot(
+        feed_cache: FeedCache,
+        key: str,
+        page: list[dict[str, Any]],
+        headers: Mapping[str, str],
+    ) -> None:
+        feed_cache.put(
+            key,
+            page,
+            etag=headers.get("ETag"),
+            last_modified=headers.get("Last-Modified"),
+        )
+
+    @staticmethod
+    def _collect_targets(
+        targets: dict[str, dict[str, Any]],
+        page: list[dict[str, Any]],
+        limit: int,
+    ) -> bool:
+        """Add a page of rescrape targets to a snapshot, skipping repeats.
+
+        Returns:
+            Whether the snapshot holds `limit` targets.
+        """
+        for video in page:
+            targets.setdefault(video["id"], video)
+        return len(targets) >= limit
+
+    @staticmethod
+    def _cursor_key(target: str) -> str:
+        """Normalise a target the way the API stores it."""
+        return target.replace("/", "-").strip()
+
+    @classmethod
+    def _make_safe_cursor_target(cls, target: str) -> str:
+        """Make a target string safe for use in URLs."""
+        return urllib.parse.quote(cls._cursor_key(target), safe="")
+
+    def _cursor_url(self, target: str, platform: Platform) -> str:
+        safe_target = self._make_safe_cursor_target(target)
+        return f"{self.api_url}/media_feeds/cursors/{safe_target}/{platform}"
+
+    def _build_api_payload(self, video: Video) -> dict[str, Any]:
+        """Build the API payload from a Video, constructing metadata."""
+        data = video.model_dump(mode="json", exclude={"id", "platform_video_id", "org_ids"})
+        data["metadata"] = {
+            "for_organisation": [str(org_id) for org_id in video.org_ids],
+            f"{video.platform}_id": video.platform_video_id,
+        }
+        return data
+
+    @staticmethod
+    def _stats_payload(
+        views: int | None,
+        likes: int | None,
+        comments: int | None,
+        channel_followers: int | None,
+    ) -> dict[str, int]:
+        data = {}
+        if views:
+            data["views"] = views
+        if likes:
+            data["likes"] = likes
+        if comments:
+            data["comments"] = comments
+        if channel_followers:
+            data["channel_followers"] = channel_followers
+        return data
+
+    @staticmethod
+    def _video_filter_query(ids: list[str], platform: Platform) -> dict[str, str]:
+        """Build a /videos/filter query matching any of the given platform ids."""
+        id_field = f"{platform}_id"
+        return {
+            "metadata": " || ".join(f"$.{id_field} == {json.dumps(id)}" for id in ids)
+        }
+
+    def _first_video(
+        self, data: dict[str, Any], platform_video_id: str, platform: Platform
+    ) -> dict[str, Any] | None:
+        """Pick the video out of a single-id /videos/filter response."""
+        videos = data.get("data")
+        if not videos:
+            return None
+        if len(videos) > 1:
+            logger.warning(
+                f"found more than one ({len(videos)}) video for {platform}: {platform_video_id}"
+            )
+        if self.seen_index is not None:
+            self.seen_index.put(platform, platform_video_id, videos[0])
+        return videos[0]
+
+    def _cached_videos(
+        self, ids: list[str], platform: Platform
+    ) -> tuple[dict[str, dict[str, Any] | None], list[str]]:
+        """Resolve ids from the seen index.
+
+        Returns:
+            The partially filled result dict and the ids still to look up.
+        """
+        result: dict[str, dict[str, Any] | None] = dict.fromkeys(ids)
+        if self.seen_index is None:
+            return result, ids
+        for id in ids:
+            result[id] = self.seen_index.get(platform, id)
+        return result, [id for id in ids if result[id] is None]
+
+    def _collect_videos(
+        self,
+        videos: list[dict[str, Any]],
+        platform: Platform,
+        result: dict[str, dict[str, Any] | None],
+    ) -> None:
+        """Merge videos from a /videos/filter response into a get_videos result."""
+        id_field = f"{platform}_id"
+        for video in videos:
+            video_id = (video.get("metadata") or {}).get(id_field)
+            if video_id not in result:
+                continue
+            if result[video_id] is not None:
+                logger.warning(f"found more than one video for {platform}: {video_id}")
+                continue
+            result[video_id] = video
+            if self.seen_index is not None:
+                self.seen_index.put(platform, video_id, video)
+
+    def _remember_registered(self, video: Video, body: Any) -> None:
+        """Write a newly registered video through to the seen index."""
+        if self.seen_index is None or not isinstance(body, dict):
+            return
+        created = body.get("data")
+        if isinstance(created, dict):
+            self.seen_index.put(video.platform, video.platform_video_id, created)
+
+    def _remember_views(self, id: str, data: dict[str, int]) -> None:
+        if self.seen_index is not None and data.get("views"):
+            self.seen_index.update_views(id, data["views"])
+
+
+class CoreAPIClient(CoreAPIBase):
+    """Client for interacting with the Core API for media feed and cursor management.
+
+    All requests go through a single pooled, keep-alive session, so a scrape run
+    reuses a handful of connections instead of opening one per call. Writes made
+    through the `enqueue_*` methods are sent by a background write-behind queue.
+
+    Cursors for a whole platform can be loaded up front with `prefetch_cursors`,
+    and with `cursor_flush_every` set, cursor updates are held back and committed
+    in batches. The client can be used as a context manager to commit pending
+    cursors, drain the queue and close the pool when finished.
+
+    With a `feed_cache`, feed pages are kept on disk and revalidated with
+    conditional requests, and the cached snapshot is used if the API times out,
+    can't be reached or answers with a server error.
+
+    Args:
+        api_url: Base URL of the core API.
+        api_key: API token sent in the X-API-TOKEN header.
+        pool_connections: Number of per-host connection pools to cache.
+        pool_maxsize: Maximum number of connections kept alive per host.
+        timeout: Request timeout in seconds, or a (connect, read) tuple.
+        retries: Transport-level retries for connection errors and 502/503/504
+            responses. Only idempotent methods are retried.
+        backoff_factor: Backoff factor between transport retries.
+        seen_index: Optional local index of known videos, consulted before
+            asking the API whether a video exists.
+        write_batch_size: Number of queued writes that triggers a flush.
+        write_max_age: Maximum number of seconds a queued write waits.
+        cursor_flush_every: Number of cursor updates to hold back before
+            committing them. 0 commits every update immediately.
+        feed_cache: Optional on-disk cache of channel and keyword feed pages.
+    """
+
+    def __init__(
+        self,
+        api_url: str,
+        api_key: str,
+        pool_connections: int = 4,
+        pool_maxsize: int = 16,
+        timeout: float | tuple[float, float] = DEFAULT_TIMEOUT,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        seen_index: SeenVideoIndex | None = None,
+        write_batch_size: int = 50,
+        write_max_age: float = 5.0,
+        cursor_flush_every: int = 0,
+        feed_cache: FeedCache | None = None,
+    ):
+        super().__init__(
+            api_url, api_key, timeout, seen_index, cursor_flush_every, feed_cache
+        )
+        self.write_batch_size = write_batch_size
+        self.write_max_age = write_max_age
+        self._write_queue: WriteBehindQueue | None = None
+        self._write_queue_lock = threading.Lock()
+
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(502, 503, 504),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update(self._headers)
+
+    def __enter__(self) -> "CoreAPIClient":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Commit pending cursors, drain queued writes and close the connection pool."""
+        self.flush_cursors()
+        if self._write_queue is not None:
+            self._write_queue.close()
+            self._write_queue = None
+        self.session.close()
+
+    @property
+    def write_queue(self) -> WriteBehindQueue:
+        """The write-behind queue, started on first use."""
+        with self._write_queue_lock:
+            if self._write_queue is None:
+                self._write_queue = WriteBehindQueue(
+                    register=self._register_queued,
+                    update_stats=self._send_video_stats,
+                    max_batch=self.write_batch_size,
+                    max_age=self.write_max_age,
+                )
+            return self._write_queue
+
+    def _get_page(
+        self, path: str, params: dict[str, Any], cached: bool = False
+    ) -> list[dict[str, Any]]:
+        """Fetch the "data" of a single page, going through the feed cache if asked."""
+        url = f"{self.api_url}{path}"
+        feed_cache = self.feed_cache
+        if not cached or feed_cache is None:
+            with self.session.get(url, params=params, timeout=self.timeout) as resp:
+                resp.raise_for_status()
+                return resp.json()["data"]
+
+        key, snapshot, headers = self._revalidation(feed_cache, url, params)
+        timeout = self.timeout
+        if snapshot is not None:
+            timeout = (self._connect_timeout, feed_cache.timeout)
+
+        log = logger.bind(path=path, params=params)
+        try:
+            with self.session.get(
+                url, params=params, headers=headers, timeout=timeout
+            ) as resp:
+                if resp.status_code == 304 and snapshot is not None:
+                    log.debug("feed page not modified, using cached snapshot")
+                    return snapshot["data"]
+                resp.raise_for_status()
+                page = resp.json()["data"]
+        except (requests.ConnectionError, requests.Timeout, HTTPError) as ex:
+            response = ex.response if isinstance(ex, HTTPError) else None
+            status = response.status_code if response is not None else None
+            return self._fall_back_to_snapshot(ex, snapshot, status, log)
+
+        self._store_snapshot(feed_cache, key, page, resp.headers)
+        return page
+
+    def _iter_pages(
+        self,
+        path: str,
+        page_size: int,
+        params: dict[str, Any] | None = None,
+        cached: bool = False,
+    ) -> Iterator[list[dict[str, Any]]]:
+        """Yield the "data" of each page of a limit/offset paginated endpoint."""
+        paging = _Paging(page_size, params)
+        while not paging.done:
+            page = self._get_page(path, paging.params, cached=cached)
+            if paging.accept(page):
+                yield page
+
+    def iter_channel_feeds(
+        self, page_size: int = FEED_PAGE_SIZE
+    ) -> Iterator[ChannelFeed]:
+        """Iterates over channel feeds, fetching and parsing them a page at a time."""
+        for page in self._iter_pages("/media_feeds/channels", page_size, cached=True):
+            yield from (ChannelFeed(**feed) for feed in page)
+
+    def iter_keyword_feeds(
+        self, page_size: int = FEED_PAGE_SIZE
+    ) -> Iterator[KeywordFeed]:
+        """Iterates over keyword feeds, fetching and parsing them a page at a time."""
+        for page in self._iter_pages("/media_feeds/keywords", page_size, cached=True):
+            yield from (KeywordFeed(**feed) for feed in page)
+
     def fetch_channel_feeds(self) -> list[ChannelFeed]:
         """Fetches channel feed data from the core API."""
-        with requests.get(
-            f"{self.api_url}/media_feeds/channels",
-            headers=self._headers,
-        ) as resp:
-            resp.raise_for_status()
-            data = resp.json()["data"]
-            return [ChannelFeed(**feed) for feed in data]
+        return list(self.iter_channel_feeds())
 
     def fetch_keyword_feeds(self) -> list[KeywordFeed]:
         """Fetches keyword feed data from the core API."""
-        with requests.get(
-            f"{self.api_url}/media_feeds/keywords",
-            headers=self._headers,
-        ) as resp:
-            resp.raise_for_status()
-            data = resp.json()["data"]
-            return [KeywordFeed(**feed) for feed in data]
+        return list(self.iter_keyword_feeds())
 
     def fetch_cursor(self, target: str, platform: Platform) -> dict[str, Any] | None:
         """Fetches the current cursor for a given target and platform.
 
+        Held-back updates and prefetched cursors are answered from memory.
+
         Args:
             target: The channel or keyword identifier.
             platform: The platform (youtube, tiktok, instagram).
@@ -51,84 +555,197 @@ class CoreAPIClient:
         Returns:
             The cursor dict as stored in the API, or None if not found.
         """
+        known, cursor = self._held_cursor(target, platform)
+        if known:
+            return cursor
+
         try:
-            safe_target = self._make_safe_cursor_target(target)
-            with requests.get(
-                f"{self.api_url}/media_feeds/cursors/{safe_target}/{platform}",
-                headers=self._headers,
+            with self.session.get(
+                self._cursor_url(target, platform),
+                timeout=self.timeout,
             ) as resp:
                 resp.raise_for_status()
                 data = resp.json()["data"]
-                cursor = Cursor(**data)
-                return cursor.cursor
+                return Cursor(**data).cursor
         except HTTPError as ex:
-            if ex.response.status_code == 404:
+            if ex.response is not None and ex.response.status_code == 404:
                 return None
             raise ex
 
     def update_cursor(self, target: str, platform: Platform, cursor: dict[str, Any]) -> None:
         """Updates the stored cursor for a given target and platform.
 
+        If `cursor_flush_every` is set, the update is held back and committed with
+        the next batch.
+
         Args:
             target: The channel or keyword identifier.
             platform: The platform (youtube, tiktok, instagram).
             cursor: The cursor dict to store.
         """
+        if not self.cursor_flush_every:
+            self._post_cursor(target, platform, cursor)
+            return
+
+        if self._hold_cursor(target, platform, cursor):
+            self.flush_cursors()
+
+    def _post_cursor(
+        self, target: str, platform: Platform, cursor: dict[str, Any]
+    ) -> None:
         log = logger.bind()
-        safe_target = self._make_safe_cursor_target(target)
         log.debug("updating cursor", cursor=cursor, target=target)
 
-        with requests.post(
-            url=f"{self.api_url}/media_feeds/cursors/{safe_target}/{platform}",
+        with self.session.post(
+            url=self._cursor_url(target, platform),
             json=cursor,
-            headers=self._headers,
+            timeout=self.timeout,
         ) as resp:
             resp.raise_for_status()
 
+    def prefetch_cursors(
+        self, platform: Platform, page_size: int = CURSOR_PAGE_SIZE
+    ) -> int:
+        """Load every stored cursor for a platform into memory.
+
+        After a successful prefetch, `fetch_cursor` answers from memory for that
+        platform, including returning None for targets without a cursor. If the
+        API can't list cursors, cursors keep being fetched one at a time.
+
+        Args:
+            platform: The platform (youtube, tiktok, instagram).
+            page_size: Number of cursors requested per page.
+
+        Returns:
+            The number of cursors loaded.
+        """
+        cursors: dict[str, dict[str, Any]] = {}
+        seen: set[UUID] = set()
+        offset = 0
+        try:
+            while True:
+                with self.session.get(
+                    f"{self.api_url}/media_feeds/cursors",
+                    params={"platform": platform, "limit": page_size, "offset": offset},
+                    timeout=self.timeout,
+                ) as resp:
+                    resp.raise_for_status()
+                    data = resp.json()["data"]
+                if self._collect_cursors(data, platform, page_size, cursors, seen):
+                    break
+                offset += page_size
+        except HTTPError as ex:
+            logger.warning(
+                "couldn't prefetch cursors, fetching them per target", exc_info=ex
+            )
+            return 0
+
+        return self._store_prefetched(platform, cursors)
+
+    def flush_cursors(self) -> None:
+        """Commit all held-back cursor updates.
+
+        Cursors that fail to commit stay pending and are retried on the next flush.
+        """
+        pending = self._take_pending_cursors()
+        failed: dict[tuple[str, Platform], dict[str, Any]] = {}
+        for (target, platform), cursor in pending.items():
+            try:
+                self._post_cursor(target, platform, cursor)
+            except Exception as ex:
+                logger.error(f"couldn't commit cursor for {target}", exc_info=ex)
+                failed[(target, platform)] = cursor
+        self._restore_pending_cursors(failed)
+
     def get_video(self, platform_video_id: str, platform: Platform) -> dict[str, Any] | None:
-        """Check if a video entry already exists in the API."""
-        id_field = f"{platform}_id"
-        query = {"metadata": f'$.{id_field} == "{platform_video_id}"'}
-        with requests.post(
+        """Check if a video entry already exists in the API.
+
+        If a seen index is configured it is consulted first, in which case only
+        the "id", "views" and "uploaded_at" fields of the video are returned.
+        """
+        if self.seen_index is not None:
+            if cached := self.seen_index.get(platform, platform_video_id):
+                return cached
+
+        with self.session.post(
             f"{self.api_url}/videos/filter",
-            json=query,
-            headers=self._headers,
+            json=self._video_filter_query([platform_video_id], platform),
+            timeout=self.timeout,
         ) as resp:
-            data = resp.json()
-            videos = data.get("data")
-            if not videos:
-                return None
-            if len(videos) > 1:
-                logger.warning(
-                    f"found more than one ({len(videos)}) video for {platform}: {platform_video_id}"
-                )
-            return videos[0]
+            return self._first_video(resp.json(), platform_video_id, platform)
+
+    def get_videos(
+        self,
+        platform_video_ids: Iterable[str],
+        platform: Platform,
+        chunk_size: int = VIDEO_LOOKUP_CHUNK_SIZE,
+    ) -> dict[str, dict[str, Any] | None]:
+        """Look up many videos at once, in as few requests as possible.
+
+        Ids are resolved in chunks of `chunk_size`, each chunk being a single
+        /videos/filter request with an OR-ed JSONPath predicate. Ids found in the
+        seen index, if configured, are not sent to the API.
+
+        Args:
+            platform_video_ids: The platform ids to look up.
+            platform: The platform (youtube, tiktok, instagram).
+            chunk_size: Maximum number of ids per request.
+
+        Returns:
+            A dict mapping every requested id to its video, or None if unknown.
+
+        Raises:
+            HTTPError: If a lookup request fails, so that a failed lookup isn't
+                mistaken for a listing full of new videos.
+        """
+        ids = list(dict.fromkeys(platform_video_ids))
+        result, missing = self._cached_videos(ids, platform)
+
+        for start in range(0, len(missing), chunk_size):
+            chunk = missing[start : start + chunk_size]
+            with self.session.post(
+                f"{self.api_url}/videos/filter",
+                json=self._video_filter_query(chunk, platform),
+                timeout=self.timeout,
+            ) as resp:
+                resp.raise_for_status()
+                self._collect_videos(resp.json().get("data") or [], platform, result)
+
+        return result
 
     def check_entry_exists(self, platform_video_id: str, platform: Platform) -> bool:
         """Check if a video entry already exists in the API."""
         return self.get_video(platform_video_id, platform) is not None
 
-    def _build_api_payload(self, video: Video) -> dict[str, Any]:
-        """Build the API payload from a Video, constructing metadata."""
-        data = video.model_dump(mode="json", exclude={"id", "platform_video_id", "org_ids"})
-        data["metadata"] = {
-            "for_organisation": [str(org_id) for org_id in video.org_ids],
-            f"{video.platform}_id": video.platform_video_id,
-        }
-        return data
+    def register_video(self, video: Video) -> RegistrationResult:
+        """Register a video entry with the API in a single request.
+
+        The API answers 409 Conflict for a video it already has, which is treated
+        as success rather than retried.
 
-    def register_video(self, video: Video) -> None:
-        """Register a video entry with the API."""
+        Returns:
+            CREATED, or EXISTED if the video was already registered.
+
+        Raises:
+            RequestException: If the API couldn't register the video.
+        """
         data = self._build_api_payload(video)
         log = logger.bind(video_data=data)
         try:
-            with requests.post(
+            with self.session.post(
                 f"{self.api_url}/videos",
                 json=data,
-                headers=self._headers,
+                timeout=self.timeout,
             ) as resp:
+                if resp.status_code == 409:
+                    log.debug("video already exists, skipping")
+                    return RegistrationResult.EXISTED
                 log.debug("registered video with API", data=data)
                 resp.raise_for_status()
+                if self.seen_index is not None:
+                    with contextlib.suppress(ValueError):
+                        self._remember_registered(video, resp.json())
+                return RegistrationResult.CREATED
         except Exception as ex:
             log.error("couldn't post to video api", exc_info=ex, data=data)
             raise
@@ -141,58 +758,74 @@ class CoreAPIClient:
         comments: int | None,
         channel_followers: int | None,
     ) -> None:
-        """Register a video entry with the API."""
+        """Update the stats of a video entry with the API."""
+        self._send_video_stats(
+            id, self._stats_payload(views, likes, comments, channel_followers)
+        )
+
+    def enqueue_video_stats(
+        self,
+        id: str,
+        views: int | None,
+        likes: int | None,
+        comments: int | None,
+        channel_followers: int | None,
+    ) -> None:
+        """Queue a stats update to be sent by the write-behind queue.
+
+        Pending updates for the same video are merged into a single request.
+        """
+        self.write_queue.put_stats(
+            id, self._stats_payload(views, likes, comments, channel_followers)
+        )
+
+    def _send_video_stats(self, id: str, data: dict[str, int]) -> None:
         log = logger.bind(video_id=id)
-        data = {}
-        if views:
-            data["views"] = views
-        if likes:
-            data["likes"] = likes
-        if comments:
-            data["comments"] = comments
-        if channel_followers:
-            data["channel_followers"] = channel_followers
         try:
-            with requests.patch(
+            with self.session.patch(
                 f"{self.api_url}/videos/{id}",
                 json=data,
-                headers=self._headers,
+                timeout=self.timeout,
             ) as resp:
                 log.debug("updating video stats with API", data=data)
                 resp.raise_for_status()
+            self._remember_views(id, data)
         except Exception as ex:
             log.error("couldn't post to video stats api", exc_info=ex, data=data)
             raise
 
-    def register_video_entry(self, video: Video) -> bool:
-        """Check if video exists and register if not."""
+    def register_video_entry(self, video: Video) -> RegistrationResult:
+        """Register a video, without raising.
+
+        Returns:
+            CREATED, EXISTED if the video was already registered, or FAILED.
+        """
         log = logger.bind(
             video_id=video.platform_video_id, destination_path=video.destination_path
         )
-
-        try:
-            if self.check_entry_exists(video.platform_video_id, video.platform):
-                log.debug("video already exists, skipping")
-                return False
-        except Exception:
-            log.warning(f"couldn't check if id exists {video.platform_video_id}")
-
         try:
-            self.register_video(video)
-            log.debug(f"registered {video.platform_video_id} with API")
-            return True
+            result = self.register_video(video)
+            log.debug(f"registration of {video.platform_video_id} {result}")
+            return result
         except Exception as ex:
             log.error(
                 f"couldn't post to video api, video_id: {video.platform_video_id}",
                 exc_info=ex,
             )
-            return False
+            return RegistrationResult.FAILED
 
-    @staticmethod
-    def _make_safe_cursor_target(target: str) -> str:
-        """Make a target string safe for use in URLs."""
-        target = target.replace("/", "-").strip()
-        return urllib.parse.quote(target, safe="")
+    def enqueue_video_entry(self, video: Video) -> None:
+        """Queue a video to be registered by the write-behind queue."""
+        self.write_queue.put_registration(video)
+
+    def _register_queued(self, video: Video) -> None:
+        """Register a video from the write-behind queue, raising so it is retried."""
+        result = self.register_video(video)
+        logger.info(
+            f"video registration {result}",
+            video_id=video.platform_video_id,
+            event_metric=f"registration_{result}",
+        )
 
     def get_rescrape_targets(
         self,
@@ -201,9 +834,9 @@ class CoreAPIClient:
         limit: int = 20,
     ) -> list[dict[str, Any]]:
         """Get the highest priority videos for rescraping"""
-        with requests.get(
+        with self.session.get(
             f"{self.api_url}/videos/by-expected-views",
-            headers=self._headers,
+            timeout=self.timeout,
             params={
                 "platform": platform,
                 "min_age_hours": min_age_hours,
@@ -215,3 +848,32 @@ class CoreAPIClient:
             if not videos:
                 return []
             return videos
+
+    def iter_rescrape_targets(
+        self,
+        platform: Platform,
+        min_age_hours: int = 1,
+        limit: int = RESCRAPE_LIMIT,
+        page_size: int = RESCRAPE_PAGE_SIZE,
+    ) -> Iterator[dict[str, Any]]:
+        """Iterates over the `limit` videos most due for rescraping, highest first.
+
+        Rescraped videos drop out of the ordering as their stats land, which
+        shifts the pages after them back, so paging while rescraping would skip
+        targets. The targets are therefore fetched, a page at a time, before the
+        first is yielded, and held in memory until the iteration is done, which
+        is why there is always a limit. Rescrape the next batch with another
+        call. Targets appearing on more than one page are yielded once.
+
+        Args:
+            platform: The platform (youtube, tiktok, instagram).
+            min_age_hours: Minimum hours since a video was last scraped.
+            limit: Maximum number of targets to fetch and yield.
+            page_size: Number of targets requested per page.
+        """
+        targets: dict[str, dict[str, Any]] = {}
+        params = {"platform": platform, "min_age_hours": min_age_hours}
+        for page in self._iter_pages("/videos/by-expected-views", page_size, params):
+            if self._collect_targets(targets, page, limit):
+                break
+        yield from itertools.islice(targets.values(), limit)
@@ -0,0 +1,192 @@
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import time
+from typing import IO, Protocol
+
+import structlog
+from google.api_core.exceptions import PreconditionFailed
+from google.cloud import storage
+
+from scraper_common.storage import COPY_CHUNK_SIZE, StorageClient
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+
+class ContentHashIndex(Protocol):
+    """Maps content hashes to the path of a blob holding that content."""
+
+    def get(self, digest: str) -> str | None:
+        """Look up the blob path stored for a sha256 hex digest."""
+        ...
+
+    def put(self, digest: str, blob_path: str) -> None:
+        """Record the blob path for a digest, keeping any existing entry."""
+        ...
+
+
+class SQLiteHashIndex:
+    """Content hash index kept in a local SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS content_hashes (
+                digest TEXT PRIMARY KEY,
+                blob_path TEXT NOT NULL,
+                stored_at REAL NOT NULL
+            )"""
+        )
+
+    def get(self, digest: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT blob_path FROM content_hashes WHERE digest = ?", (digest,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, digest: str, blob_path: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR IGNORE INTO content_hashes (digest, blob_path, stored_at)
+                VALUES (?, ?, ?)""",
+                (digest, blob_path, time.time()),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class GCSHashIndex:
+    """Content hash index kept in a GCS bucket, shared by every scraper.
+
+    Each digest is an empty marker object named `{prefix}/{digest}`, with the path
+    of the blob holding the content in its `blob_path` metadata.
+    """
+
+    def __init__(self, bucket_name: str, prefix: str = "content-hashes"):
+        self.prefix = prefix
+        self.client = storage.Client()
+        self.bucket = self.client.bucket(bucket_name)
+
+    def get(self, digest: str) -> str | None:
+        marker = self.bucket.get_blob(f"{self.prefix}/{digest}")
+        if marker is None:
+            return None
+        return (marker.metadata or {}).get("blob_path")
+
+    def put(self, digest: str, blob_path: str) -> None:
+        marker = self.bucket.blob(f"{self.prefix}/{digest}")
+        marker.metadata = {"blob_path": blob_path}
+        try:
+            # only the first upload of some content gets a marker
+            marker.upload_from_string(b"", if_generation_match=0)
+        except PreconditionFailed:
+            pass
+
+
+class HashingReader(io.RawIOBase):
+    """Readable binary stream computing the sha256 of what is read through it."""
+
+    def __init__(self, raw: IO[bytes]):
+        self._raw = raw
+        self._hash = hashlib.sha256()
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, b: bytearray | memoryview) -> int:  # type: ignore[override]
+        data = self._raw.read(len(b))
+        n = len(data)
+        b[:n] = data
+        self._hash.update(data)
+        self._position += n
+        return n
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class DedupStorageClient:
+    """Storage client skipping uploads of content that is already stored.
+
+    The sha256 of every blob is recorded in `index`. When a seekable stream, like
+    a download buffer, is uploaded, it is hashed first and the upload is skipped
+    if the index already has the content, returning the path of the existing
+    blob. Other streams are hashed while they are uploaded, so their content is
+    recognised when it comes up again.
+
+    Environment variables (see `from_env`):
+        CONTENT_HASH_INDEX: Path of a SQLite file, or `gs://bucket/prefix` for an
+            index shared in GCS. Deduplication is disabled if unset.
+
+    Args:
+        storage_client: Storage the blobs are uploaded to.
+        index: Index of the content already stored.
+    """
+
+    def __init__(self, storage_client: StorageClient, index: ContentHashIndex):
+        self.storage_client = storage_client
+        self.index = index
+
+    @classmethod
+    def from_env(cls, storage_client: StorageClient) -> StorageClient:
+        """Wrap a storage client if deduplication is enabled by the environment."""
+        location = os.environ.get("CONTENT_HASH_INDEX", "")
+        if not location:
+            return storage_client
+        index: ContentHashIndex
+        if location.startswith("gs://"):
+            bucket_name, _, prefix = location.removeprefix("gs://").partition("/")
+            index = GCSHashIndex(bucket_name, prefix or "content-hashes")
+        else:
+            index = SQLiteHashIndex(location)
+        return cls(storage_client, index)
+
+    def blob_path(self, blob_name: str) -> str:
+        return self.storage_client.blob_path(blob_name)
+
+    def exists(self, blob_name: str) -> bool:
+        return self.storage_client.exists(blob_name)
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        return self.storage_client.list_blobs(prefix)
+
+    def upload_blob(
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
+    ) -> str:
+        log = logger.bind(blob_name=blob_name)
+        if buf.seekable():
+            start = buf.tell()
+            digest = hashlib.sha256()
+            while chunk := buf.read(COPY_CHUNK_SIZE):
+                digest.update(chunk)
+            existing = self.index.get(digest.hexdigest())
+            if existing is not None:
+                log.info(
+                    f"content already stored at {existing}, skipping upload",
+                    event_metric="upload_deduplicated",
+                )
+                return existing
+            buf.seek(start)
+            blob_path = self.storage_client.upload_blob(blob_name, buf, content_type)
+            self.index.put(digest.hexdigest(), blob_path)
+        else:
+            reader = HashingReader(buf)
+            blob_path = self.storage_client.upload_blob(
+                blob_name, io.BufferedReader(reader, COPY_CHUNK_SIZE), content_type
+            )
+            self.index.put(reader.hexdigest(), blob_path)
+        return blob_path
@@ -0,0 +1,102 @@
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Any
+
+import structlog
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+
+class FeedCache:
+    """On-disk snapshots of core API feed pages, revalidated with conditional requests.
+
+    Each page is stored as a JSON file together with the ETag and Last-Modified
+    validators the API sent with it. On the next run the page is requested with
+    If-None-Match/If-Modified-Since, so an unchanged feed costs a 304 and no body,
+    and if the API is slow or unavailable the snapshot is used as-is.
+
+    Environment variables (see `from_env`):
+        FEED_CACHE_DIR: Directory the snapshots are kept in, e.g. a mounted
+            volume. The cache is disabled if unset.
+        FEED_CACHE_TIMEOUT: Read timeout in seconds for revalidating a cached
+            page, after which the snapshot is used (default: 5)
+
+    Args:
+        directory: Directory the snapshots are kept in. Created if missing.
+        timeout: Read timeout in seconds for revalidating a cached page.
+    """
+
+    def __init__(self, directory: str, timeout: float = 5.0):
+        self.directory = directory
+        self.timeout = timeout
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "FeedCache | None":
+        """Create a cache configured from environment variables, if enabled."""
+        directory = os.environ.get("FEED_CACHE_DIR", "")
+        if not directory:
+            return None
+        return cls(directory, timeout=float(os.environ.get("FEED_CACHE_TIMEOUT", 5)))
+
+    @staticmethod
+    def key(url: str, params: dict[str, Any] | None = None) -> str:
+        """Cache key for a request, stable across runs."""
+        query = json.dumps(params or {}, sort_keys=True)
+        return hashlib.sha256(f"{url}?{query}".encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> dict[str, Any] | None:
+        """Load a snapshot, with its "data", "etag", "last_modified" and "stored_at".
+
+        Returns:
+            The snapshot, or None if there is none or it can't be read.
+        """
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as ex:
+            logger.warning("couldn't read feed snapshot", key=key, exc_info=ex)
+            return None
+
+    def put(
+        self,
+        key: str,
+        data: Any,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        """Store a snapshot, replacing any previous one atomically."""
+        snapshot = {
+            "data": data,
+            "etag": etag,
+            "last_modified": last_modified,
+            "stored_at": time.time(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp_path, self._path(key))
+        except OSError as ex:
+            logger.warning("couldn't write feed snapshot", key=key, exc_info=ex)
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+    @staticmethod
+    def conditional_headers(snapshot: dict[str, Any]) -> dict[str, str]:
+        """Request headers that revalidate a snapshot."""
+        headers = {}
+        if snapshot.get("etag"):
+            headers["If-None-Match"] = snapshot["etag"]
+        if snapshot.get("last_modified"):
+            headers["If-Modified-Since"] = snapshot["last_modified"]
+        return headers
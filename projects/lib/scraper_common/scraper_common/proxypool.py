@@ -0,0 +1,389 @@
+import atexit
+import contextlib
+import json
+import os
+import random
+import re
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+
+import httpx
+import requests
+import structlog
+
+from scraper_common.coordination import CoordinationStore, coordination_store
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+# statuses with which sites tell us a proxy is rate limited or banned
+BLOCKED_STATUSES = frozenset({403, 429})
+
+# how quickly success rate and latency follow new outcomes, from 0 to 1
+EWMA_ALPHA = 0.2
+# latency in seconds at which a proxy's weight is halved
+LATENCY_SCALE = 10.0
+# seconds a 429/403 counts against a proxy's score
+BLOCK_WINDOW = 600.0
+# minimum weight, so a proxy that had bad luck is still tried now and then
+MIN_WEIGHT = 0.01
+# seconds between writes of the scores to the state file
+SAVE_INTERVAL = 30.0
+
+HTTP_ERROR = re.compile(r"HTTP Error (\d{3})")
+# what yt-dlp errors and platform responses say when we're rate limited or
+# suspected to be a bot
+RATE_LIMITED = re.compile(
+    r"not a bot|rate.?limit|too many requests|wait a few minutes|captcha"
+    r"|checkpoint_required|login_required",
+    re.IGNORECASE,
+)
+# what yt-dlp errors say when a request didn't get through to the site
+NETWORK_ERROR = re.compile(
+    r"timed out|connection (?:refused|reset|aborted)|unable to connect"
+    r"|tunnel connection failed|proxy|remote end closed|name resolution"
+    r"|network is unreachable",
+    re.IGNORECASE,
+)
+# errors raised when a request didn't get through to the site
+NETWORK_EXCEPTIONS = (
+    ConnectionError,
+    TimeoutError,
+    socket.gaierror,
+    requests.ConnectionError,
+    requests.Timeout,
+    httpx.TransportError,
+)
+
+
+def status_of(ex: BaseException) -> int | None:
+    """HTTP status of a failed request, from a requests-style or yt-dlp error."""
+    status = getattr(getattr(ex, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status
+    if match := HTTP_ERROR.search(str(ex)):
+        return int(match[1])
+    return None
+
+
+def is_proxy_failure(ex: BaseException) -> bool:
+    """Whether a request failed because of the proxy it was made through.
+
+    Network and proxy errors and 403/429 responses say the proxy is down or
+    blocked, while e.g. a video that's private, gone or age-gated, or a bad id,
+    says nothing about it.
+    """
+    status = status_of(ex)
+    if status is not None:
+        # 407: the proxy refused our credentials
+        return status in BLOCKED_STATUSES or status == 407
+    if isinstance(ex, NETWORK_EXCEPTIONS):
+        return True
+    message = str(ex)
+    return bool(RATE_LIMITED.search(message) or NETWORK_ERROR.search(message))
+
+
+class ProxyHealth:
+    """Outcomes of the requests made through one proxy."""
+
+    def __init__(self) -> None:
+        # optimistic, so new proxies get tried
+        self.success_rate = 1.0
+        self.latency: float | None = None
+        self.blocks: deque[float] = deque()
+        self.failures = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+
+    def weight(self, now: float) -> float:
+        while self.blocks and self.blocks[0] < now - BLOCK_WINDOW:
+            self.blocks.popleft()
+        weight = self.success_rate * 0.5 ** len(self.blocks)
+        if self.latency is not None:
+            weight /= 1 + self.latency / LATENCY_SCALE
+        return max(weight, MIN_WEIGHT)
+
+    def to_dict(self) -> dict:
+        return {
+            "success_rate": self.success_rate,
+            "latency": self.latency,
+            "blocks": list(self.blocks),
+            "quarantines": self.quarantines,
+            "quarantined_until": self.quarantined_until,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ProxyHealth":
+        health = cls()
+        health.success_rate = float(d["success_rate"])
+        health.latency = d["latency"]
+        health.blocks = deque(d["blocks"])
+        health.quarantines = int(d["quarantines"])
+        health.quarantined_until = float(d["quarantined_until"])
+        return health
+
+
+class ProxyPool:
+    """Picks proxies by their health, as scored from the outcomes reported.
+
+    Each proxy is scored by its success rate and latency, both exponentially
+    weighted moving averages, and halved for every 429/403 in the last
+    `BLOCK_WINDOW` seconds. Proxies are picked at random, weighted by score.
+
+    A proxy answering with a 429/403, or failing `failure_threshold` times in a
+    row, is quarantined for `cooloff` seconds, doubling each time it's
+    quarantined again before succeeding, up to `max_cooloff`. If every proxy is
+    quarantined, the one whose quarantine ends first is used.
+
+    A proxy picked for a holder is leased to it until it picks another one,
+    and proxies leased to other holders are skipped, unless every proxy is
+    leased. With a coordination `store`, the leases are kept in the store, so
+    scrapers sharing it use different proxies too.
+
+    Environment variables (see `from_env`):
+        PROXY_POOL_STATE: JSON file the scores are kept in across runs. Scores
+            only last for the run if unset.
+        PROXY_COOLOFF: Seconds a proxy is first quarantined for (default: 300)
+        PROXY_LEASE_TTL: Seconds a proxy stays leased to a holder that doesn't
+            pick again, e.g. because it crashed (default: 300)
+
+    Args:
+        size: Number of proxies, with ids 1 to `size`.
+        cooloff: Seconds a proxy is first quarantined for.
+        max_cooloff: Maximum seconds a proxy is quarantined for.
+        failure_threshold: Consecutive failures after which a proxy is
+            quarantined.
+        state_path: JSON file the scores are loaded from and saved to.
+        store: Coordination store proxies are leased through.
+        lease_ttl: Seconds a proxy stays leased to a holder that doesn't pick
+            again.
+    """
+
+    def __init__(
+        self,
+        size: int,
+        cooloff: float = 300.0,
+        max_cooloff: float = 3600.0,
+        failure_threshold: int = 3,
+        state_path: str | None = None,
+        store: CoordinationStore | None = None,
+        lease_ttl: float = 300.0,
+    ):
+        self.size = size
+        self.cooloff = cooloff
+        self.max_cooloff = max_cooloff
+        self.failure_threshold = failure_threshold
+        self.state_path = state_path
+        self.store = store
+        self.lease_ttl = lease_ttl
+        # holder -> proxy id leased to it
+        self._leases: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._health = {proxy_id: ProxyHealth() for proxy_id in range(1, size + 1)}
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        if state_path:
+            self._load(state_path)
+            atexit.register(self.save)
+        if store is not None:
+            atexit.register(self.release_all)
+
+    @classmethod
+    def from_env(cls, size: int) -> "ProxyPool":
+        """Create a pool of `size` proxies configured from environment variables."""
+        return cls(
+            size,
+            cooloff=float(os.environ.get("PROXY_COOLOFF", 300)),
+            state_path=os.environ.get("PROXY_POOL_STATE") or None,
+            store=coordination_store,
+            lease_ttl=float(os.environ.get("PROXY_LEASE_TTL", 300)),
+        )
+
+    def pick(self, holder: str | None = None) -> int:
+        """Id of the proxy to use for the next request.
+
+        Args:
+            holder: Who the proxy is leased to, releasing the proxy leased to
+                them before. The proxy isn't leased if None.
+        """
+        now = time.time()
+        with self._lock:
+            healthy = [
+                (proxy_id, health.weight(now))
+                for proxy_id, health in self._health.items()
+                if health.quarantined_until <= now
+            ]
+            if not healthy:
+                proxy_id = min(
+                    self._health, key=lambda i: self._health[i].quarantined_until
+                )
+                logger.warning("all proxies are quarantined", proxy_id=proxy_id)
+                healthy = [(proxy_id, 1.0)]
+        if holder is None:
+            ids, weights = zip(*healthy, strict=True)
+            return random.choices(ids, weights)[0]
+
+        # weighted random order (Efraimidis-Spirakis), to try leasing in
+        # order of preference
+        candidates = sorted(
+            healthy, key=lambda c: random.random() ** (1 / c[1]), reverse=True
+        )
+        with self._lock:
+            previous = self._leases.get(holder)
+        for proxy_id, _ in candidates:
+            with self._lock:
+                if any(
+                    leased == proxy_id and other != holder
+                    for other, leased in self._leases.items()
+                ):
+                    continue
+                self._leases[holder] = proxy_id
+            if self.store is None or self.store.acquire_lease(
+                f"proxy:{proxy_id}", holder, self.lease_ttl
+            ):
+                break
+        else:
+            proxy_id = candidates[0][0]
+            logger.warning("all proxies are leased, sharing one", proxy_id=proxy_id)
+            with self._lock:
+                self._leases[holder] = proxy_id
+        if self.store is not None and previous is not None and previous != proxy_id:
+            self.store.release_lease(f"proxy:{previous}", holder)
+        return proxy_id
+
+    def renew(self, holder: str) -> int | None:
+        """Renew the lease of the proxy leased to a holder.
+
+        Returns:
+            The proxy, or None if it's no longer the holder's to use, because
+            it's quarantined or leased to someone else.
+        """
+        with self._lock:
+            proxy_id = self._leases.get(holder)
+            if (
+                proxy_id is None
+                or self._health[proxy_id].quarantined_until > time.time()
+            ):
+                return None
+        if self.store is not None and not self.store.acquire_lease(
+            f"proxy:{proxy_id}", holder, self.lease_ttl
+        ):
+            return None
+        return proxy_id
+
+    def release(self, holder: str) -> None:
+        """Release the proxy leased to a holder, if any."""
+        with self._lock:
+            proxy_id = self._leases.pop(holder, None)
+        if proxy_id is not None and self.store is not None:
+            self.store.release_lease(f"proxy:{proxy_id}", holder)
+
+    def release_all(self) -> None:
+        """Release every proxy leased through this pool."""
+        with self._lock:
+            holders = list(self._leases)
+        for holder in holders:
+            self.release(holder)
+
+    def report(
+        self,
+        proxy_id: int,
+        ok: bool,
+        latency: float | None = None,
+        status: int | None = None,
+    ) -> None:
+        """Record the outcome of a request made through a proxy.
+
+        Args:
+            proxy_id: Proxy the request was made through.
+            ok: Whether the request succeeded.
+            latency: Seconds the request took, if known.
+            status: HTTP status of a failed request, if known.
+        """
+        now = time.time()
+        with self._lock:
+            health = self._health.get(proxy_id)
+            if health is None:
+                return
+            if ok:
+                health.success_rate += EWMA_ALPHA * (1 - health.success_rate)
+                if latency is not None:
+                    health.latency = (
+                        latency
+                        if health.latency is None
+                        else health.latency + EWMA_ALPHA * (latency - health.latency)
+                    )
+                health.failures = 0
+                health.quarantines = 0
+            else:
+                health.success_rate -= EWMA_ALPHA * health.success_rate
+                health.failures += 1
+                blocked = status in BLOCKED_STATUSES
+                if blocked:
+                    health.blocks.append(now)
+                if blocked or health.failures >= self.failure_threshold:
+                    cooloff = min(
+                        self.cooloff * 2**health.quarantines, self.max_cooloff
+                    )
+                    health.quarantined_until = now + cooloff
+                    health.quarantines += 1
+                    health.failures = 0
+                    logger.warning(
+                        f"quarantining proxy for {cooloff:.0f}s",
+                        event_metric="proxy_quarantined",
+                        proxy_id=proxy_id,
+                        status=status,
+                    )
+            self._dirty = True
+            save = bool(self.state_path) and (
+                time.monotonic() - self._saved_at >= SAVE_INTERVAL
+            )
+        if save:
+            self.save()
+
+    def scores(self) -> dict[int, float]:
+        """Current weight of every proxy, 0 for quarantined ones."""
+        now = time.time()
+        with self._lock:
+            return {
+                proxy_id: health.weight(now) if health.quarantined_until <= now else 0.0
+                for proxy_id, health in self._health.items()
+            }
+
+    def save(self) -> None:
+        """Write the scores to the state file, replacing it atomically."""
+        if not self.state_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {
+                str(proxy_id): health.to_dict()
+                for proxy_id, health in self._health.items()
+            }
+            self._dirty = False
+            self._saved_at = time.monotonic()
+        directory = os.path.dirname(os.path.abspath(self.state_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as ex:
+            logger.warning("couldn't write proxy scores", exc_info=ex)
+            with contextlib.suppress(OSError):
+                os.unlink(tmp_path)
+
+    def _load(self, path: str) -> None:
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            for key, d in state.items():
+                if int(key) in self._health:
+                    self._health[int(key)] = ProxyHealth.from_dict(d)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, KeyError, TypeError) as ex:
+            logger.warning("couldn't read proxy scores", path=path, exc_info=ex)
@@ -0,0 +1,277 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+
+import structlog
+
+from scraper_common.coordination import CoordinationStore, coordination_store
+from scraper_common.proxy import current_proxy_id
+from scraper_common.proxypool import BLOCKED_STATUSES, RATE_LIMITED, status_of
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+# endpoint classes, each paced by its own buckets
+LISTING = "listing"
+VIDEO = "video"
+
+# requests per minute per proxy, close to the old fixed sleeps between requests
+DEFAULT_LIMITS = {LISTING: 4.0, VIDEO: 6.0}
+
+type BucketKey = tuple[str, int | None, str]
+
+# bucket acquired last in the current context, which feedback applies to
+_current_bucket: ContextVar[BucketKey | None] = ContextVar(
+    "current_bucket", default=None
+)
+# buckets acquired during the innermost tracked call, the first of which its
+# outcome applies to
+_tracked: ContextVar[list[BucketKey] | None] = ContextVar("tracked", default=None)
+
+
+def is_rate_limited(ex: BaseException) -> bool:
+    """Whether a request failed because the platform is rate limiting us."""
+    return status_of(ex) in BLOCKED_STATUSES or bool(RATE_LIMITED.search(str(ex)))
+
+
+class TokenBucket:
+    """Allows `rate` requests per second on average, in bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def reserve(self, n: int = 1) -> float:
+        """Take `n` tokens, ahead of time if need be.
+
+        Returns:
+            Seconds to wait before the reserved requests may be made.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            self._tokens -= n
+            return max(0.0, -self._tokens / self.rate)
+
+
+class RateLimiter:
+    """Paces requests with a token bucket per (platform, proxy, endpoint class).
+
+    Each proxy gets its own budget, so the more proxies there are, the more
+    requests can be made, while no proxy exceeds the rate a site tolerates
+    from one address. Requests without a proxy share a single budget.
+
+    Rates adapt to what the platforms tolerate (AIMD): every successful request
+    adds `increase` requests per minute to its bucket's rate, up to
+    `max_factor` times the limit, and every request that's rate limited or
+    bot-checked multiplies it by `decrease`, down to `min_limit`. The outcomes
+    are reported with the `track` decorator or `feedback`. By default rates
+    only recover up to the limits, which are never exceeded.
+
+    With a coordination `store`, the buckets are kept in the store instead, so
+    scrapers sharing it together stay within each proxy's rate. Each scraper
+    still adapts the rate it draws from the shared bucket at on its own.
+
+    Environment variables (see `from_env`):
+        RATE_LIMIT_LISTING: Requests per minute per proxy to channel, search
+            and profile pages (default: 4)
+        RATE_LIMIT_VIDEO: Requests per minute per proxy for video details and
+            downloads (default: 6)
+        RATE_LIMIT_BURST: Requests a proxy may make in a row after being idle
+            (default: 1)
+        RATE_LIMIT_INCREASE: Requests per minute added to a rate after each
+            successful request (default: 0.5)
+        RATE_LIMIT_DECREASE: Factor a rate is multiplied with when rate limited
+            (default: 0.5)
+        RATE_LIMIT_MAX_FACTOR: Maximum rate, as a multiple of the limit
+            (default: 1)
+
+    Args:
+        limits: Requests per minute per proxy, by endpoint class. Endpoint
+            classes without a limit, or with a limit of 0, aren't paced.
+        burst: Requests a proxy may make in a row after being idle.
+        jitter: Fraction of the interval between requests added at random to
+            each wait, so requests don't come at exact intervals.
+        increase: Requests per minute added to a rate after a successful request.
+        decrease: Factor a rate is multiplied with when rate limited.
+        max_factor: Maximum rate, as a multiple of the limit.
+        min_limit: Minimum rate in requests per minute.
+        store: Coordination store the buckets are shared through.
+    """
+
+    def __init__(
+        self,
+        limits: dict[str, float],
+        burst: int = 1,
+        jitter: float = 0.5,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        max_factor: float = 1.0,
+        min_limit: float = 0.5,
+        store: CoordinationStore | None = None,
+    ):
+        self.limits = limits
+        self.burst = burst
+        self.jitter = jitter
+        self.increase = increase
+        self.decrease = decrease
+        self.max_factor = max_factor
+        self.min_limit = min_limit
+        self.store = store
+        self._lock = threading.Lock()
+        self._buckets: dict[BucketKey, TokenBucket] = {}
+
+    @classmethod
+    def from_env(cls) -> "RateLimiter":
+        """Create a rate limiter configured from environment variables."""
+        limits = {
+            endpoint: float(os.environ.get(f"RATE_LIMIT_{endpoint.upper()}", limit))
+            for endpoint, limit in DEFAULT_LIMITS.items()
+        }
+        return cls(
+            limits,
+            burst=int(os.environ.get("RATE_LIMIT_BURST", 1)),
+            increase=float(os.environ.get("RATE_LIMIT_INCREASE", 0.5)),
+            decrease=float(os.environ.get("RATE_LIMIT_DECREASE", 0.5)),
+            max_factor=float(os.environ.get("RATE_LIMIT_MAX_FACTOR", 1)),
+            store=coordination_store,
+        )
+
+    def bucket(
+        self, platform: str, endpoint: str, proxy_id: int | None
+    ) -> TokenBucket | None:
+        """The bucket pacing a proxy's requests, None if they aren't paced."""
+        limit = self.limits.get(endpoint)
+        if not limit:
+            return None
+        key = (platform, proxy_id, endpoint)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(limit / 60, self.burst)
+            return bucket
+
+    def acquire(
+        self, platform: str, endpoint: str, proxy_id: int | None = None
+    ) -> float:
+        """Wait until a request may be made.
+
+        Args:
+            platform: Platform the request is made to.
+            endpoint: Endpoint class of the request, e.g. `LISTING` or `VIDEO`.
+            proxy_id: Proxy the request is made through. Defaults to the proxy
+                picked last in the current context.
+
+        Returns:
+            Seconds waited.
+        """
+        if proxy_id is None:
+            proxy_id = current_proxy_id()
+        bucket = self.bucket(platform, endpoint, proxy_id)
+        if bucket is None:
+            _current_bucket.set(None)
+            return 0.0
+        key = (platform, proxy_id, endpoint)
+        _current_bucket.set(key)
+        if (acquired := _tracked.get()) is not None:
+            acquired.append(key)
+        if self.store is not None:
+            wait = self.store.reserve(
+                f"rate:{platform}:{proxy_id}:{endpoint}", bucket.rate, bucket.burst
+            )
+        else:
+            wait = bucket.reserve()
+        if wait <= 0:
+            return 0.0
+        wait += random.uniform(0, self.jitter / bucket.rate)
+        logger.debug(
+            f"waiting {wait:.1f}s for rate limit",
+            endpoint=endpoint,
+            proxy_id=proxy_id,
+            rate=bucket.rate * 60,
+        )
+        time.sleep(wait)
+        return wait
+
+    def rate(self, platform: str, endpoint: str, proxy_id: int | None = None) -> float:
+        """Current rate of a proxy in requests per minute, 0 if it isn't paced.
+
+        Defaults to the proxy picked last in the current context.
+        """
+        if proxy_id is None:
+            proxy_id = current_proxy_id()
+        bucket = self.bucket(platform, endpoint, proxy_id)
+        return bucket.rate * 60 if bucket else 0.0
+
+    def feedback(self, rate_limited: bool) -> None:
+        """Adapt the rate of the bucket acquired last in the current context.
+
+        Args:
+            rate_limited: Whether the request was rate limited or bot-checked,
+                rather than successful.
+        """
+        if (key := _current_bucket.get()) is not None:
+            self._adapt(key, rate_limited)
+
+    def _adapt(self, key: BucketKey, rate_limited: bool) -> None:
+        platform, proxy_id, endpoint = key
+        bucket = self.bucket(platform, endpoint, proxy_id)
+        if bucket is None:
+            return
+        limit = self.limits[endpoint]
+        with self._lock:
+            if rate_limited:
+                rate = max(bucket.rate * 60 * self.decrease, self.min_limit)
+            else:
+                rate = min(bucket.rate * 60 + self.increase, limit * self.max_factor)
+            bucket.rate = rate / 60
+        if rate_limited:
+            logger.warning(
+                f"rate limited, slowing down to {rate:.1f} requests/min",
+                event_metric="rate_limited",
+                platform=platform,
+                endpoint=endpoint,
+                proxy_id=proxy_id,
+                rate=rate,
+            )
+
+    def track[**P, R](self, fn: Callable[P, R]) -> Callable[P, R]:
+        """Decorator adapting the rate to the outcome of each call.
+
+        The outcome applies to the first bucket the call acquires, not to those
+        acquired by tracked calls it makes itself. A call that returns speeds
+        the bucket up, one that raises a rate limit or bot-check error slows it
+        down, and other errors leave it as it is. Put it below any retry
+        decorator, so every attempt is counted.
+        """
+
+        @functools.wraps(fn)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            acquired: list[BucketKey] = []
+            token = _tracked.set(acquired)
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as ex:
+                if acquired and is_rate_limited(ex):
+                    self._adapt(acquired[0], rate_limited=True)
+                raise
+            finally:
+                _tracked.reset(token)
+            if acquired:
+                self._adapt(acquired[0], rate_limited=False)
+            return result
+
+        return wrapper
+
+
+# Default instance loaded from environment
+rate_limiter = RateLimiter.from_env()
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from typing import Any
+
+import structlog
+
+from scraper_common.types import Platform
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+# how many writes happen between checks of the index size
+EVICT_EVERY = 100
+
+
+class SeenVideoIndex:
+    """Persistent local index of videos already registered with the core API.
+
+    Maps (platform, platform_video_id) to the core video id, the last known view
+    count and upload time, and when the entry was last checked against the API.
+    Entries older than `ttl` are ignored, and the least recently used entries are
+    evicted once the index grows beyond `max_entries`.
+
+    Environment variables (see `from_env`):
+        SEEN_INDEX_PATH: Path of the SQLite file. The index is disabled if unset.
+        SEEN_INDEX_TTL_HOURS: How long an entry is trusted (default: 24)
+        SEEN_INDEX_MAX_ENTRIES: Maximum number of entries kept (default: 100000)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl: timedelta = timedelta(hours=24),
+        max_entries: int = 100_000,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS seen_videos (
+                platform TEXT NOT NULL,
+                platform_video_id TEXT NOT NULL,
+                video_id TEXT NOT NULL,
+                views INTEGER,
+                uploaded_at TEXT,
+                checked_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (platform, platform_video_id)
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS seen_videos_accessed ON seen_videos (accessed_at)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS seen_videos_video_id ON seen_videos (video_id)"
+        )
+        with self._lock:
+            self._evict()
+
+    @classmethod
+    def from_env(cls) -> "SeenVideoIndex | None":
+        """Create an index configured from environment variables, if enabled."""
+        path = os.environ.get("SEEN_INDEX_PATH", "")
+        if not path:
+            return None
+        return cls(
+            path,
+            ttl=timedelta(hours=float(os.environ.get("SEEN_INDEX_TTL_HOURS", 24))),
+            max_entries=int(os.environ.get("SEEN_INDEX_MAX_ENTRIES", 100_000)),
+        )
+
+    def get(self, platform: Platform, platform_video_id: str) -> dict[str, Any] | None:
+        """Look up a video in the index.
+
+        Returns:
+            A partial video record with "id", "views" and "uploaded_at" keys, or
+            None if the video is unknown or its entry has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """SELECT video_id, views, uploaded_at FROM seen_videos
+                WHERE platform = ? AND platform_video_id = ? AND checked_at >= ?""",
+                (platform, platform_video_id, now - self.ttl.total_seconds()),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                """UPDATE seen_videos SET accessed_at = ?
+                WHERE platform = ? AND platform_video_id = ?""",
+                (now, platform, platform_video_id),
+            )
+        return {"id": row[0], "views": row[1], "uploaded_at": row[2]}
+
+    def put(
+        self, platform: Platform, platform_video_id: str, video: dict[str, Any]
+    ) -> None:
+        """Record a video as it was returned by the core API."""
+        if not video.get("id"):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO seen_videos
+                (platform, platform_video_id, video_id, views, uploaded_at,
+                 checked_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (
+                    platform,
+                    platform_video_id,
+                    str(video["id"]),
+                    video.get("views"),
+                    video.get("uploaded_at"),
+                    now,
+                    now,
+                ),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def update_views(self, video_id: str, views: int) -> None:
+        """Update the last known view count for a core video id."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE seen_videos SET views = ? WHERE video_id = ?",
+                (views, str(video_id)),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Drop the least recently used entries beyond max_entries."""
+        cur = self._conn.execute(
+            """DELETE FROM seen_videos WHERE rowid IN (
+                SELECT rowid FROM seen_videos ORDER BY accessed_at DESC
+                LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,),
+        )
+        if cur.rowcount > 0:
+            logger.debug(f"evicted {cur.rowcount} entries from seen video index")
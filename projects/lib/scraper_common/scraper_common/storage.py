@@ -1,25 +1,72 @@
+import asyncio
+import base64
+import contextlib
+import errno
 import io
+import os
+import queue
+import shutil
+import stat
+import tempfile
+import threading
+import uuid
+from collections.abc import AsyncIterable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from os import path
 from pathlib import Path
-from typing import Protocol
+from typing import IO, Protocol
 
+import google_crc32c
 import structlog
 from google.cloud import storage
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
+# size of the chunks streams are copied in
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# size of each request of a resumable GCS upload, must be a multiple of 256 KiB
+GCS_UPLOAD_CHUNK_SIZE = int(os.environ.get("GCS_UPLOAD_CHUNK_SIZE", 8 * 1024 * 1024))
+
+# blobs of at least this many bytes are uploaded as parallel parts, 0 disables it
+GCS_PARALLEL_UPLOAD_THRESHOLD = int(
+    os.environ.get("GCS_PARALLEL_UPLOAD_THRESHOLD", 64 * 1024 * 1024)
+)
+GCS_PARALLEL_UPLOAD_PART_SIZE = int(
+    os.environ.get("GCS_PARALLEL_UPLOAD_PART_SIZE", 16 * 1024 * 1024)
+)
+GCS_PARALLEL_UPLOAD_WORKERS = int(os.environ.get("GCS_PARALLEL_UPLOAD_WORKERS", 4))
+
+# where the parts of parallel uploads are kept until they are composed
+GCS_PARTS_PREFIX = ".parts"
+
+# maximum number of source objects of a single GCS compose request
+MAX_COMPOSE_SOURCES = 32
+
+# when DiskStorageClient syncs blobs to disk: "none", "file" or "full"
+DISK_STORAGE_FSYNC = os.environ.get("DISK_STORAGE_FSYNC", "none")
+
+# suffix of blobs DiskStorageClient is still writing
+PARTIAL_SUFFIX = ".partial"
+
+# errors of copy_file_range and sendfile for files they can't copy between
+ZERO_COPY_UNSUPPORTED = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP}
+
 
 class StorageClient(Protocol):
     """Protocol for storage clients."""
 
     def upload_blob(
-        self, blob_name: str, buf: io.BytesIO, content_type: str = "video/mp4"
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
     ) -> str:
         """Upload a blob to storage.
 
+        The data is read from `buf` incrementally, so it can be any readable
+        binary stream, not just an in-memory buffer.
+
         Args:
             blob_name: Name/path of the blob.
-            buf: BytesIO buffer containing the data.
+            buf: Readable binary stream containing the data.
             content_type: MIME type of the content.
 
         Returns:
@@ -27,36 +74,403 @@ class StorageClient(Protocol):
         """
         ...
 
+    def blob_path(self, blob_name: str) -> str:
+        """The path a blob is stored at, as returned by `upload_blob`."""
+        ...
+
+    def exists(self, blob_name: str) -> bool:
+        """Check whether a blob is stored, without reading it."""
+        ...
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        """Names of all stored blobs starting with `prefix`, in a single listing.
+
+        Cheaper than calling `exists` for every blob of e.g. a whole channel.
+        """
+        ...
+
+
+def stored_ids(storage_client: StorageClient, prefix: str) -> dict[str, str]:
+    """Map the ids of blobs named `{prefix}{id}.{ext}` to their blob names.
+
+    Lets a scraper look up which of a channel's videos are already stored with
+    a single listing, without knowing their extensions.
+    """
+    return {
+        name.removeprefix(prefix).rsplit(".", 1)[0]: name
+        for name in storage_client.list_blobs(prefix)
+    }
+
+
+class IterableReader(io.RawIOBase):
+    """Readable binary stream over an iterable of byte chunks.
+
+    Lets a chunked source, like `iter_content` of a streamed HTTP response, be
+    passed to `StorageClient.upload_blob` without collecting it in memory first.
+    """
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks: Iterator[bytes] = iter(chunks)
+        self._pending = b""
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def readinto(self, b: bytearray | memoryview) -> int:  # type: ignore[override]
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = chunk
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        self._position += n
+        return n
+
+
+async def upload_async_chunks(
+    storage_client: StorageClient,
+    blob_name: str,
+    chunks: AsyncIterable[bytes],
+    content_type: str = "video/mp4",
+    max_pending: int = 8,
+) -> str:
+    """Upload an async iterator of byte chunks, e.g. a streamed httpx response.
+
+    The upload runs in a worker thread, and at most `max_pending` chunks are held
+    between the iterator and the upload, so memory stays bounded.
+
+    Returns:
+        The path where the blob was stored.
+    """
+    pending: queue.Queue[bytes | BaseException | None] = queue.Queue(max_pending)
+
+    def read_pending() -> Iterator[bytes]:
+        while (chunk := pending.get()) is not None:
+            if isinstance(chunk, BaseException):
+                raise OSError("upload source failed") from chunk
+            yield chunk
+
+    upload = asyncio.create_task(
+        asyncio.to_thread(
+            storage_client.upload_blob,
+            blob_name,
+            io.BufferedReader(IterableReader(read_pending())),
+            content_type,
+        )
+    )
+
+    async def put(item: bytes | BaseException | None) -> bool:
+        while not upload.done():
+            try:
+                pending.put_nowait(item)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.01)
+        return False
+
+    try:
+        async for chunk in chunks:
+            if not await put(chunk):
+                # the upload failed early, its exception is raised below
+                break
+    except BaseException as ex:
+        # fail the upload rather than store a truncated blob
+        await put(ex)
+        with contextlib.suppress(Exception):
+            await upload
+        raise
+    await put(None)
+    return await upload
+
+
+def _remaining_size(buf: IO[bytes]) -> int | None:
+    """Bytes left to read from a seekable stream, None if it isn't seekable."""
+    if not buf.seekable():
+        return None
+    position = buf.tell()
+    end = buf.seek(0, os.SEEK_END)
+    buf.seek(position)
+    return end - position
+
+
+def _file_descriptor(buf: IO[bytes]) -> int | None:
+    """Descriptor of the regular file behind a stream, if there is one."""
+    # asking a spooled file that is still in memory for its descriptor would move
+    # it to disk
+    if isinstance(buf, tempfile.SpooledTemporaryFile) and isinstance(
+        buf._file, io.BytesIO
+    ):
+        return None
+    try:
+        fd = buf.fileno()
+    except (AttributeError, OSError):
+        return None
+    return fd if stat.S_ISREG(os.fstat(fd).st_mode) else None
+
+
+def _copy_file_range(src: int, dst: int, offset: int, count: int) -> int:
+    copied = 0
+    while copied < count:
+        n = os.copy_file_range(src, dst, count - copied, offset + copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _sendfile(src: int, dst: int, offset: int, count: int) -> int:
+    copied = 0
+    while copied < count:
+        n = os.sendfile(dst, src, offset + copied, count - copied)
+        if n == 0:
+            break
+        copied += n
+    return copied
+
+
+def _zero_copy(src: int, dst: int, offset: int, count: int) -> int:
+    """Copy between files within the kernel.
+
+    Returns:
+        The number of bytes copied, 0 if neither copy_file_range nor sendfile
+        can copy between these files.
+    """
+    for copy in (_copy_file_range, _sendfile):
+        if copy is _copy_file_range and not hasattr(os, "copy_file_range"):
+            continue
+        try:
+            return copy(src, dst, offset, count)
+        except OSError as ex:
+            # only fall back if nothing has been written yet
+            if ex.errno not in ZERO_COPY_UNSUPPORTED or os.lseek(dst, 0, os.SEEK_CUR):
+                raise
+    return 0
+
 
 class DiskStorageClient:
-    """Store blobs locally. This is intended mostly for testing purposes."""
+    """Store blobs locally, e.g. for local runs or on a mounted volume.
+
+    Blobs are written to a temporary file next to their final path and renamed
+    into place once complete, so a crash never leaves a truncated blob behind.
+    Streams backed by a regular file are copied within the kernel, with
+    copy_file_range or sendfile.
 
-    def __init__(self, folder: str):
+    The fsync policy sets how much is synced to disk before a blob is reported
+    as stored: "none" leaves it to the OS, "file" syncs the blob's data before
+    it is renamed, and "full" also syncs the directory, making the rename itself
+    durable.
+
+    Environment variables:
+        DISK_STORAGE_FSYNC: Default fsync policy (default: none)
+
+    Args:
+        folder: Directory the blobs are stored in.
+        fsync: Fsync policy, one of "none", "file" or "full".
+    """
+
+    def __init__(self, folder: str, fsync: str = DISK_STORAGE_FSYNC):
+        if fsync not in ("none", "file", "full"):
+            raise ValueError(f"unknown fsync policy: {fsync}")
         self.folder = folder
+        self.fsync = fsync
+        self._directories: set[str] = set()
+
+    def blob_path(self, blob_name: str) -> str:
+        return path.join(self.folder, blob_name)
 
-    def upload_blob(self, blob_name: str, buf: io.BytesIO, content_type: str = "") -> str:
-        blob_path = path.join(self.folder, blob_name)
-        Path(blob_path).parent.mkdir(parents=True, exist_ok=True)
-        with open(blob_path, "wb") as f:
-            f.write(buf.getbuffer())
+    def exists(self, blob_name: str) -> bool:
+        return path.isfile(self.blob_path(blob_name))
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        root = Path(self.folder)
+        directory = root / path.dirname(prefix)
+        if not directory.is_dir():
+            return []
+        names = (f.relative_to(root).as_posix() for f in directory.rglob("*"))
+        return sorted(
+            name
+            for name in names
+            if name.startswith(prefix)
+            and not name.endswith(PARTIAL_SUFFIX)
+            and (root / name).is_file()
+        )
+
+    def upload_blob(self, blob_name: str, buf: IO[bytes], content_type: str = "") -> str:
+        blob_path = self.blob_path(blob_name)
+        directory, name = path.split(blob_path)
+        if directory not in self._directories:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            self._directories.add(directory)
+
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=f".{name}.", suffix=PARTIAL_SUFFIX, dir=directory
+        )
+        try:
+            with open(fd, "wb") as f:
+                os.fchmod(fd, 0o644)
+                self._copy(buf, f)
+                if self.fsync != "none":
+                    f.flush()
+                    os.fsync(fd)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+
+        if self.fsync == "full":
+            dir_fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
         return blob_path
 
+    @staticmethod
+    def _copy(buf: IO[bytes], f: IO[bytes]) -> None:
+        src = _file_descriptor(buf)
+        if src is not None:
+            # the descriptor has to see everything written through the stream
+            buf.flush()
+            position = buf.tell()
+            size = os.fstat(src).st_size
+            copied = _zero_copy(src, f.fileno(), position, size - position)
+            buf.seek(position + copied)
+            if copied:
+                return
+        shutil.copyfileobj(buf, f, COPY_CHUNK_SIZE)
+
 
 class GoogleCloudStorageClient:
-    """Store blobs in Google Cloud Storage."""
+    """Store blobs in Google Cloud Storage.
 
-    def __init__(self, bucket_name: str, path_prefix: str = ""):
+    Blobs are sent with chunked resumable uploads, reading `chunk_size` bytes from
+    the stream at a time, so the whole blob is never held in memory.
+
+    Seekable streams of at least `parallel_threshold` bytes are instead split into
+    parts of `part_size` bytes, uploaded by `parallel_workers` threads and then
+    composed into the blob. The CRC32C of the whole blob is computed while the
+    parts are read, and checked against the one GCS reports for the composed
+    blob. Parts are kept under `.parts/` until then; a lifecycle rule deleting
+    old objects there cleans up after uploads that were interrupted.
+
+    Environment variables:
+        GCS_UPLOAD_CHUNK_SIZE: Bytes per upload request, a multiple of 256 KiB
+            (default: 8 MiB)
+        GCS_PARALLEL_UPLOAD_THRESHOLD: Size from which blobs are uploaded in
+            parallel parts, 0 to disable (default: 64 MiB)
+        GCS_PARALLEL_UPLOAD_PART_SIZE: Bytes per part (default: 16 MiB)
+        GCS_PARALLEL_UPLOAD_WORKERS: Parts uploaded at once (default: 4)
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        path_prefix: str = "",
+        chunk_size: int = GCS_UPLOAD_CHUNK_SIZE,
+        parallel_threshold: int = GCS_PARALLEL_UPLOAD_THRESHOLD,
+        part_size: int = GCS_PARALLEL_UPLOAD_PART_SIZE,
+        parallel_workers: int = GCS_PARALLEL_UPLOAD_WORKERS,
+    ):
         self.bucket_name = bucket_name
         self.path_prefix = path_prefix
+        self.chunk_size = chunk_size
+        self.parallel_threshold = parallel_threshold
+        self.part_size = part_size
+        self.parallel_workers = parallel_workers
         self.client = storage.Client()
         self.bucket = self.client.bucket(bucket_name)
 
+    def blob_path(self, blob_name: str) -> str:
+        return path.join(self.path_prefix, blob_name) if self.path_prefix else blob_name
+
+    def exists(self, blob_name: str) -> bool:
+        return bool(self.bucket.blob(self.blob_path(blob_name)).exists())
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        # only ask for the names, a channel can hold many blobs
+        blobs = self.client.list_blobs(
+            self.bucket,
+            prefix=self.blob_path(prefix),
+            fields="items(name),nextPageToken",
+        )
+        strip = f"{self.path_prefix}/" if self.path_prefix else ""
+        return [blob.name.removeprefix(strip) for blob in blobs]
+
     def upload_blob(
-        self, blob_name: str, buf: io.BytesIO, content_type: str = "video/mp4"
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
     ) -> str:
-        blob_path = path.join(self.path_prefix, blob_name) if self.path_prefix else blob_name
+        blob_path = self.blob_path(blob_name)
         log = logger.bind(blob_path=blob_path)
+        size = _remaining_size(buf)
+        if self.parallel_threshold and (size or 0) >= self.parallel_threshold:
+            log.debug(f"uploading {size} bytes to path {blob_path} in parallel parts")
+            self._upload_parts(blob_path, buf, content_type)
+            return blob_path
+
         log.debug(f"uploading blob to path {blob_path}")
-        blob = self.bucket.blob(blob_path)
+        blob = self.bucket.blob(blob_path, chunk_size=self.chunk_size)
         blob.upload_from_file(buf, content_type=content_type)
         return blob_path
+
+    def _upload_parts(self, blob_path: str, buf: IO[bytes], content_type: str) -> None:
+        """Upload a blob as parallel parts, composed once they are all uploaded."""
+        parts_prefix = self.blob_path(f"{GCS_PARTS_PREFIX}/{uuid.uuid4().hex}")
+        checksum = google_crc32c.Checksum()
+        # bounds the parts held in memory to one per worker
+        slots = threading.BoundedSemaphore(self.parallel_workers)
+        failed = threading.Event()
+        parts: list[storage.Blob] = []
+        uploads: list[Future[None]] = []
+
+        def upload_part(part: storage.Blob, data: bytes) -> None:
+            try:
+                part.upload_from_string(
+                    data, content_type=content_type, checksum="crc32c"
+                )
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                slots.release()
+
+        try:
+            with ThreadPoolExecutor(
+                self.parallel_workers, thread_name_prefix="gcs-part"
+            ) as pool:
+                while not failed.is_set():
+                    slots.acquire()
+                    data = buf.read(self.part_size)
+                    if not data:
+                        slots.release()
+                        break
+                    checksum.update(data)
+                    part = self.bucket.blob(f"{parts_prefix}/{len(parts):05d}")
+                    parts.append(part)
+                    uploads.append(pool.submit(upload_part, part, data))
+            for upload in uploads:
+                upload.result()
+
+            destination = self.bucket.blob(blob_path)
+            destination.content_type = content_type
+            destination.compose(parts[:MAX_COMPOSE_SOURCES])
+            # the blob composed so far is one of the sources of the next compose
+            step = MAX_COMPOSE_SOURCES - 1
+            for i in range(MAX_COMPOSE_SOURCES, len(parts), step):
+                destination.compose([destination, *parts[i : i + step]])
+        finally:
+            self.bucket.delete_blobs(parts, on_error=lambda _: None)
+
+        expected = base64.b64encode(checksum.digest()).decode()
+        if destination.crc32c != expected:
+            destination.delete()
+            raise OSError(
+                f"crc32c mismatch for {blob_path}: "
+                f"sent {expected}, stored {destination.crc32c}"
+            )
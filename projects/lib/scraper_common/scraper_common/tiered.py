@@ -0,0 +1,321 @@
+import atexit
+import io
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import suppress
+from typing import IO, Any
+
+import structlog
+
+from scraper_common.storage import COPY_CHUNK_SIZE, DiskStorageClient, StorageClient
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+MIB = 1024 * 1024
+
+
+class Throttle:
+    """Limits the combined rate of the streams sharing it to `rate` bytes/s."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def consume(self, n: int) -> None:
+        """Account for `n` bytes, waiting until the rate allows sending them."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(self._next, now) + n / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+
+class ThrottledReader(io.RawIOBase):
+    """Readable binary stream over a file, read no faster than a throttle allows."""
+
+    def __init__(self, raw: io.RawIOBase, throttle: Throttle):
+        self._raw = raw
+        self._throttle = throttle
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._raw.tell()
+
+    def readinto(self, b: bytearray | memoryview) -> int:  # type: ignore[override]
+        n = self._raw.readinto(memoryview(b)[:COPY_CHUNK_SIZE]) or 0
+        self._throttle.consume(n)
+        return n
+
+
+class TieredStorageClient:
+    """Stages blobs on local disk and replicates them to remote storage.
+
+    `upload_blob` only writes the blob to the staging directory and records it
+    in a journal there, then returns the path the blob will have remotely.
+    Worker threads replicate staged blobs to `remote` in the background,
+    retrying with exponential backoff, and delete them once they are stored.
+    The journal is a SQLite file and staged blobs are synced to disk, so blobs
+    that weren't replicated yet, e.g. after a crash, are picked up again by the
+    next client using the same staging directory.
+
+    `close()` waits up to `drain_timeout` seconds for the staged blobs to be
+    replicated before stopping the workers, and also runs at interpreter exit.
+
+    Environment variables (see `from_env`):
+        STAGING_DIR: Staging directory. Staging is disabled if unset.
+        STAGING_WORKERS: Number of concurrent replications (default: 2)
+        STAGING_BANDWIDTH_MB: Combined replication bandwidth in MiB/s, unlimited
+            if unset.
+        STAGING_DRAIN_TIMEOUT: Seconds `close()` waits for replication
+            (default: 60)
+
+    Args:
+        remote: Storage the blobs are replicated to.
+        staging_dir: Directory holding staged blobs and the journal.
+        workers: Number of concurrent replications.
+        bandwidth: Combined replication bandwidth in bytes/s, None for unlimited.
+        drain_timeout: Seconds `close()` waits for staged blobs to be replicated.
+        backoff: Base delay in seconds for exponential backoff between attempts.
+        max_backoff: Maximum delay in seconds between attempts.
+    """
+
+    def __init__(
+        self,
+        remote: StorageClient,
+        staging_dir: str,
+        workers: int = 2,
+        bandwidth: float | None = None,
+        drain_timeout: float = 60.0,
+        backoff: float = 1.0,
+        max_backoff: float = 300.0,
+    ):
+        self.remote = remote
+        self.staging_dir = staging_dir
+        self.drain_timeout = drain_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self._staging = DiskStorageClient(
+            os.path.join(staging_dir, "blobs"), fsync="full"
+        )
+        self._throttle = Throttle(bandwidth) if bandwidth else None
+
+        os.makedirs(staging_dir, exist_ok=True)
+        self._cond = threading.Condition()
+        self._inflight: set[str] = set()
+        self._stopping = False
+        self._conn = sqlite3.connect(
+            os.path.join(staging_dir, "journal.db"),
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS replications (
+                blob_name TEXT PRIMARY KEY,
+                staged_name TEXT NOT NULL,
+                content_type TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL
+            )"""
+        )
+        if pending := self.pending():
+            logger.info(f"resuming replication of {pending} staged blobs")
+            # a restart is a good time to try again, whatever the backoff was
+            self._conn.execute(
+                "UPDATE replications SET next_attempt_at = ?", (time.time(),)
+            )
+
+        self._workers = [
+            threading.Thread(target=self._run, name=f"replicator-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, remote: StorageClient) -> StorageClient:
+        """Put a staging tier in front of `remote` if enabled by the environment."""
+        staging_dir = os.environ.get("STAGING_DIR", "")
+        if not staging_dir:
+            return remote
+        bandwidth = os.environ.get("STAGING_BANDWIDTH_MB")
+        return cls(
+            remote,
+            staging_dir,
+            workers=int(os.environ.get("STAGING_WORKERS", 2)),
+            bandwidth=float(bandwidth) * MIB if bandwidth else None,
+            drain_timeout=float(os.environ.get("STAGING_DRAIN_TIMEOUT", 60)),
+        )
+
+    def blob_path(self, blob_name: str) -> str:
+        return self.remote.blob_path(blob_name)
+
+    def exists(self, blob_name: str) -> bool:
+        with self._cond:
+            staged = self._conn.execute(
+                "SELECT 1 FROM replications WHERE blob_name = ?", (blob_name,)
+            ).fetchone()
+        return staged is not None or self.remote.exists(blob_name)
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        with self._cond:
+            staged = [
+                row[0]
+                for row in self._conn.execute(
+                    """SELECT blob_name FROM replications
+                    WHERE substr(blob_name, 1, ?) = ?""",
+                    (len(prefix), prefix),
+                )
+            ]
+        return sorted(set(self.remote.list_blobs(prefix)).union(staged))
+
+    def upload_blob(
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
+    ) -> str:
+        with self._cond:
+            if self._stopping:
+                raise RuntimeError("tiered storage client is closed")
+        # staged under a name of its own, so staging a blob again never touches
+        # a file that is being replicated
+        staged_name = uuid.uuid4().hex
+        self._staging.upload_blob(staged_name, buf)
+        with self._cond:
+            replaced = self._conn.execute(
+                "SELECT staged_name FROM replications WHERE blob_name = ?",
+                (blob_name,),
+            ).fetchone()
+            self._conn.execute(
+                """INSERT OR REPLACE INTO replications
+                (blob_name, staged_name, content_type, attempts, next_attempt_at)
+                VALUES (?, ?, ?, 0, ?)""",
+                (blob_name, staged_name, content_type, time.time()),
+            )
+            self._cond.notify()
+        if replaced:
+            self._unstage(replaced[0])
+        return self.remote.blob_path(blob_name)
+
+    def pending(self) -> int:
+        """Number of staged blobs not replicated yet."""
+        with self._cond:
+            return self._count()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Wait until every staged blob is replicated.
+
+        Returns:
+            False if blobs were still staged after `timeout` seconds.
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._count() == 0, timeout)
+
+    def close(self) -> None:
+        """Wait for replication up to `drain_timeout`, then stop the workers.
+
+        Blobs that are still staged are replicated by the next client.
+        """
+        with self._cond:
+            if self._stopping:
+                return
+        if not self.flush(self.drain_timeout):
+            logger.warning(
+                f"{self.pending()} staged blobs left for the next run to replicate"
+            )
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+        self._conn.close()
+        atexit.unregister(self.close)
+
+    def _count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM replications").fetchone()[0]
+
+    def _next_job(self) -> tuple[Any, ...] | None:
+        """The replication due first that no worker is busy with."""
+        exclude = ",".join("?" * len(self._inflight))
+        return self._conn.execute(
+            f"""SELECT blob_name, staged_name, content_type, attempts, next_attempt_at
+            FROM replications WHERE blob_name NOT IN ({exclude})
+            ORDER BY next_attempt_at LIMIT 1""",
+            tuple(self._inflight),
+        ).fetchone()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    job = self._next_job()
+                    if job is not None and job[4] <= time.time():
+                        break
+                    self._cond.wait(job[4] - time.time() if job else None)
+                self._inflight.add(job[0])
+            try:
+                self._replicate(*job[:4])
+            finally:
+                with self._cond:
+                    self._inflight.discard(job[0])
+                    self._cond.notify_all()
+
+    def _replicate(
+        self, blob_name: str, staged_name: str, content_type: str, attempts: int
+    ) -> None:
+        log = logger.bind(blob_name=blob_name)
+        try:
+            f = open(self._staging.blob_path(staged_name), "rb", buffering=0)
+        except FileNotFoundError:
+            log.error("staged blob is missing, dropping it from the journal")
+            self._done(blob_name, staged_name)
+            return
+
+        try:
+            with f:
+                raw: io.RawIOBase = f
+                if self._throttle is not None:
+                    raw = ThrottledReader(f, self._throttle)
+                self.remote.upload_blob(
+                    blob_name, io.BufferedReader(raw, COPY_CHUNK_SIZE), content_type
+                )
+        except Exception as ex:
+            delay = min(self.backoff * 2**attempts, self.max_backoff)
+            log.warning(
+                f"replication failed, retrying in {delay:.0f}s",
+                event_metric="replication_failure",
+                attempt=attempts + 1,
+                exc_info=ex,
+            )
+            with self._cond:
+                self._conn.execute(
+                    """UPDATE replications SET attempts = ?, next_attempt_at = ?
+                    WHERE blob_name = ? AND staged_name = ?""",
+                    (attempts + 1, time.time() + delay, blob_name, staged_name),
+                )
+            return
+
+        self._done(blob_name, staged_name)
+        self._unstage(staged_name)
+        log.debug(f"replicated blob after {attempts + 1} attempts")
+
+    def _done(self, blob_name: str, staged_name: str) -> None:
+        """Remove a replication from the journal, unless it was staged again."""
+        with self._cond:
+            self._conn.execute(
+                "DELETE FROM replications WHERE blob_name = ? AND staged_name = ?",
+                (blob_name, staged_name),
+            )
+
+    def _unstage(self, staged_name: str) -> None:
+        with suppress(FileNotFoundError):
+            os.unlink(self._staging.blob_path(staged_name))
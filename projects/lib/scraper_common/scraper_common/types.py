@@ -1,5 +1,6 @@
 import abc
 from datetime import datetime
+from enum import StrEnum
 from typing import Literal
 from uuid import UUID
 
@@ -35,6 +36,12 @@ class Cursor(BaseModel):
     updated_at: datetime | None = None
 
 
+class RegistrationResult(StrEnum):
+    CREATED = "created"
+    EXISTED = "existed"
+    FAILED = "failed"
+
+
 class Video(BaseModel):
     id: UUID | None = None
     platform: Platform
@@ -0,0 +1,154 @@
+import atexit
+import contextvars
+import os
+import queue
+import threading
+from collections.abc import Callable
+from typing import IO, Any
+
+import structlog
+
+from scraper_common.storage import StorageClient
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+type UploadCallback = Callable[[str], None]
+type _UploadJob = tuple[str, IO[bytes], str, UploadCallback | None, contextvars.Context]
+
+
+class AsyncUploader:
+    """Uploads blobs in the background on a pool of worker threads.
+
+    `submit` hands a buffer over to the uploader and returns as soon as there is
+    room in the queue, so the next download can start while earlier ones are
+    still being uploaded. When the queue is full, `submit` blocks, which keeps
+    the number of finished downloads waiting in memory or on disk bounded.
+
+    The uploader owns submitted buffers and closes them once their upload is
+    done, whether it succeeded or not. After a successful upload, the job's
+    `on_complete` callback is called with the path the blob was stored at. It
+    runs on the worker thread, with the context variables (and so the structlog
+    context) of the submitting thread. `close()` waits for submits under way,
+    drains the queue, and also runs at interpreter exit.
+
+    Environment variables (see `from_env`):
+        UPLOAD_WORKERS: Number of concurrent uploads (default: 4)
+        UPLOAD_QUEUE_SIZE: Number of uploads that may wait for a worker (default: 8)
+
+    Args:
+        storage_client: Storage the blobs are uploaded to.
+        workers: Number of concurrent uploads.
+        max_pending: Number of uploads that may wait for a worker.
+    """
+
+    def __init__(
+        self, storage_client: StorageClient, workers: int = 4, max_pending: int = 8
+    ):
+        self.storage_client = storage_client
+        self._queue: queue.Queue[_UploadJob | None] = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._closed = False
+        # submits past the closed check, which close waits for
+        self._submitting = 0
+        self._submits_done = threading.Condition(self._lock)
+        self._workers = [
+            threading.Thread(target=self._run, name=f"uploader-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def from_env(cls, storage_client: StorageClient) -> "AsyncUploader":
+        """Create an uploader configured from environment variables."""
+        return cls(
+            storage_client,
+            workers=int(os.environ.get("UPLOAD_WORKERS", 4)),
+            max_pending=int(os.environ.get("UPLOAD_QUEUE_SIZE", 8)),
+        )
+
+    def __enter__(self) -> "AsyncUploader":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.close()
+
+    def submit(
+        self,
+        blob_name: str,
+        buf: IO[bytes],
+        on_complete: UploadCallback | None = None,
+        content_type: str = "video/mp4",
+    ) -> None:
+        """Queue a buffer for upload, waiting while the queue is full.
+
+        Once this returns, the uploader owns `buf` and closes it when done.
+
+        Args:
+            blob_name: Name/path of the blob.
+            buf: Readable binary stream containing the data.
+            on_complete: Called with the stored path after a successful upload.
+            content_type: MIME type of the content.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("uploader is closed")
+            self._submitting += 1
+        try:
+            context = contextvars.copy_context()
+            self._queue.put((blob_name, buf, content_type, on_complete, context))
+        finally:
+            with self._lock:
+                self._submitting -= 1
+                self._submits_done.notify_all()
+
+    def flush(self) -> None:
+        """Wait until every submitted upload is done."""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Finish all submitted uploads and stop the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            # a submit waiting for room must get its job in ahead of the workers'
+            # stop signals, or it is never uploaded
+            self._submits_done.wait_for(lambda: not self._submitting)
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while (job := self._queue.get()) is not None:
+            try:
+                blob_name, buf, content_type, on_complete, context = job
+                context.run(self._upload, blob_name, buf, content_type, on_complete)
+            finally:
+                self._queue.task_done()
+        self._queue.task_done()
+
+    def _upload(
+        self,
+        blob_name: str,
+        buf: IO[bytes],
+        content_type: str,
+        on_complete: UploadCallback | None,
+    ) -> None:
+        log = logger.bind(blob_name=blob_name)
+        try:
+            path = self.storage_client.upload_blob(blob_name, buf, content_type)
+        except Exception as ex:
+            log.error("upload failed", event_metric="upload_failure", exc_info=ex)
+            return
+        finally:
+            buf.close()
+
+        if on_complete is not None:
+            try:
+                on_complete(path)
+            except Exception as ex:
+                log.error("upload completion callback failed", exc_info=ex)
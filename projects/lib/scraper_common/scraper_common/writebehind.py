@@ -0,0 +1,321 @@
+import atexit
+import signal
+import sys
+import threading
+import time
+from collections.abc import Callable
+from typing import Any
+
+import requests
+import structlog
+
+from scraper_common.types import Video
+
+logger: structlog.BoundLogger = structlog.get_logger(__name__)
+
+type StatsWriter = Callable[[str, dict[str, int]], None]
+type RegistrationWriter = Callable[[Video], None]
+
+
+def is_transient(ex: BaseException) -> bool:
+    """Whether a failed write may succeed if it's retried.
+
+    Connection errors, timeouts, 429s and server errors are transient. Other
+    client errors, like a failed validation, fail the same way every time.
+    """
+    if isinstance(ex, requests.HTTPError):
+        status = getattr(ex.response, "status_code", None)
+        return status is None or status == 429 or status >= 500
+    return isinstance(
+        ex, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)
+    )
+
+
+class WriteBehindQueue:
+    """Background writer for video registrations and stats updates.
+
+    Writes are queued and sent from a worker thread, so core API latency is kept
+    out of the scrape loop. Stats updates for the same video id are coalesced,
+    with later values overriding earlier ones. The queue is flushed once it holds
+    `max_batch` writes or its oldest write is `max_age` seconds old, and is
+    drained by `close()`, which also runs at interpreter exit.
+
+    Writes failing transiently (see `is_transient`) are retried with exponential
+    backoff, while the writes behind them go ahead. Other failed writes are
+    dropped, as retrying them can't help.
+
+    At most `max_pending` writes are held, counting those waiting to be retried.
+    Once that many are, producers wait for room, so an outage of the core API
+    slows the scrape down instead of growing the queue without bound. Writes
+    that couldn't be sent within `drain_timeout` seconds of closing the queue
+    are dropped, so that draining fits in the grace period of a stopped pod.
+
+    Args:
+        register: Sends a single registration, raising on failure.
+        update_stats: Sends a single stats update, raising on failure.
+        max_batch: Number of pending writes that triggers a flush.
+        max_age: Maximum number of seconds a write waits before being flushed.
+        max_attempts: Attempts per write before it is dropped.
+        backoff: Base delay in seconds for exponential backoff between attempts.
+        max_pending: Maximum number of writes held before producers wait.
+        drain_timeout: Maximum number of seconds `close()` spends sending the
+            writes still pending.
+    """
+
+    def __init__(
+        self,
+        register: RegistrationWriter,
+        update_stats: StatsWriter,
+        max_batch: int = 50,
+        max_age: float = 5.0,
+        max_attempts: int = 5,
+        backoff: float = 1.0,
+        max_pending: int = 1000,
+        drain_timeout: float = 20.0,
+    ):
+        self._register = register
+        self._update_stats = update_stats
+        self.max_batch = max_batch
+        self.max_age = max_age
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_pending = max(max_pending, max_batch)
+        self.drain_timeout = drain_timeout
+
+        self._cond = threading.Condition()
+        self._registrations: list[Video] = []
+        self._stats: dict[str, dict[str, int]] = {}
+        # writes waiting to be retried, with the time they're due and the
+        # number of their next attempt
+        self._retry_registrations: list[tuple[float, int, Video]] = []
+        self._retry_stats: dict[str, tuple[float, int, dict[str, int]]] = {}
+        self._oldest: float | None = None
+        self._inflight = 0
+        self._flush_requested = False
+        self._closed = False
+        self._deadline: float | None = None
+
+        self._thread = threading.Thread(
+            target=self._run, name="core-api-write-behind", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put_registration(self, video: Video) -> None:
+        """Queue a video for registration, waiting while the queue is full."""
+        with self._cond:
+            self._wait_for_room()
+            self._check_open()
+            self._registrations.append(video)
+            self._added()
+
+    def put_stats(self, video_id: str, stats: dict[str, int]) -> None:
+        """Queue a stats update, merging it with any pending update for the video.
+
+        Waits while the queue is full, unless the update is merged.
+        """
+        with self._cond:
+            if video_id not in self._stats and video_id not in self._retry_stats:
+                self._wait_for_room()
+            self._check_open()
+            if (retry := self._retry_stats.get(video_id)) is not None:
+                retry[2].update(stats)
+                return
+            self._stats.setdefault(video_id, {}).update(stats)
+            self._added()
+
+    def flush(self) -> None:
+        """Send all pending writes now and wait until they are done.
+
+        Writes waiting to be retried are waited for too.
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._size())
+
+    def close(self) -> None:
+        """Drain pending writes, for up to `drain_timeout`, and stop the worker."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._deadline = time.monotonic() + self.drain_timeout
+            self._cond.notify_all()
+        self._thread.join(timeout=self.drain_timeout)
+        if self._thread.is_alive():
+            logger.warning("core api write still in flight after the drain timeout")
+        atexit.unregister(self.close)
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("write-behind queue is closed")
+
+    def _wait_for_room(self) -> None:
+        if self._size() < self.max_pending:
+            return
+        logger.warning(
+            "write-behind queue is full, waiting for core api writes",
+            pending=self._size(),
+        )
+        self._cond.wait_for(lambda: self._closed or self._size() < self.max_pending)
+
+    def _added(self) -> None:
+        if self._oldest is None:
+            self._oldest = time.monotonic()
+        self._cond.notify_all()
+
+    def _pending(self) -> int:
+        return len(self._registrations) + len(self._stats)
+
+    def _size(self) -> int:
+        """Number of writes held, whether pending, in flight or to be retried."""
+        retries = len(self._retry_registrations) + len(self._retry_stats)
+        return self._pending() + retries + self._inflight
+
+    def _expired(self) -> bool:
+        return self._deadline is not None and time.monotonic() >= self._deadline
+
+    def _next_retry(self) -> float | None:
+        dues = [due for due, _, _ in self._retry_registrations]
+        dues += [due for due, _, _ in self._retry_stats.values()]
+        return min(dues, default=None)
+
+    def _due(self) -> bool:
+        if self._expired():
+            return False
+        if (retry := self._next_retry()) is not None and retry <= time.monotonic():
+            return True
+        if not self._pending():
+            return False
+        if self._closed or self._flush_requested or self._pending() >= self.max_batch:
+            return True
+        return time.monotonic() - (self._oldest or 0) >= self.max_age
+
+    def _wait_timeout(self) -> float | None:
+        wakeups = [self._next_retry(), self._deadline]
+        if self._oldest is not None:
+            wakeups.append(self._oldest + self.max_age)
+        wakeup = min((w for w in wakeups if w is not None), default=None)
+        return None if wakeup is None else max(0.0, wakeup - time.monotonic())
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._due():
+                    if self._closed and (not self._size() or self._expired()):
+                        self._drop_all()
+                        return
+                    if self._flush_requested and not self._size():
+                        self._flush_requested = False
+                        self._cond.notify_all()
+                    self._cond.wait(timeout=self._wait_timeout())
+
+                now = time.monotonic()
+                registrations = [(video, 1) for video in self._registrations]
+                registrations += [
+                    (video, attempt)
+                    for due, attempt, video in self._retry_registrations
+                    if due <= now
+                ]
+                self._retry_registrations = [
+                    r for r in self._retry_registrations if r[0] > now
+                ]
+                stats = [(id, s, 1) for id, s in self._stats.items()]
+                for id, (due, attempt, s) in list(self._retry_stats.items()):
+                    if due <= now:
+                        stats.append((id, s, attempt))
+                        del self._retry_stats[id]
+                self._registrations, self._stats = [], {}
+                self._oldest = None
+                self._inflight = len(registrations) + len(stats)
+
+            logger.debug(
+                "flushing write-behind queue",
+                registrations=len(registrations),
+                stats_updates=len(stats),
+            )
+            for video, attempt in registrations:
+                delay = self._attempt(self._register, video, attempt=attempt)
+                with self._cond:
+                    if delay is not None:
+                        retry = (time.monotonic() + delay, attempt + 1, video)
+                        self._retry_registrations.append(retry)
+                    self._sent()
+            for video_id, video_stats, attempt in stats:
+                delay = self._attempt(
+                    self._update_stats, video_id, video_stats, attempt=attempt
+                )
+                with self._cond:
+                    if delay is not None:
+                        # updates queued since are newer, so they take precedence
+                        video_stats.update(self._stats.pop(video_id, {}))
+                        due = time.monotonic() + delay
+                        self._retry_stats[video_id] = (due, attempt + 1, video_stats)
+                    self._sent()
+
+    def _sent(self) -> None:
+        self._inflight -= 1
+        self._cond.notify_all()
+
+    def _attempt(
+        self, fn: Callable[..., None], *args: Any, attempt: int
+    ) -> float | None:
+        """Make a write.
+
+        Returns:
+            Seconds after which to retry the write, or None if it's done with,
+            because it succeeded or is dropped.
+        """
+        if self._expired():
+            # not made, but kept to be dropped with the other writes left
+            return 0.0
+        try:
+            fn(*args)
+            return None
+        except Exception as ex:
+            if not is_transient(ex):
+                logger.error(
+                    "core api rejected write, dropping it",
+                    event_metric="write_dropped",
+                    exc_info=ex,
+                )
+                return None
+            if attempt >= self.max_attempts:
+                logger.error(
+                    f"giving up on core api write after {attempt} attempts",
+                    event_metric="write_dropped",
+                    exc_info=ex,
+                )
+                return None
+            delay = self.backoff * 2 ** (attempt - 1)
+            logger.warning(
+                f"core api write failed, retrying in {delay:.1f}s", exc_info=ex
+            )
+            return delay
+
+    def _drop_all(self) -> None:
+        if dropped := self._size():
+            logger.error(
+                f"dropping {dropped} core api writes not sent within the drain timeout",
+                event_metric="write_dropped",
+            )
+        self._registrations, self._stats = [], {}
+        self._retry_registrations, self._retry_stats = [], {}
+        self._oldest = None
+        self._cond.notify_all()
+
+
+def drain_on_sigterm() -> None:
+    """Turn SIGTERM into a normal interpreter exit.
+
+    Python doesn't run atexit handlers or unwind context managers when killed by
+    SIGTERM, which is how Kubernetes stops pods. Raising SystemExit instead lets
+    pending core API writes drain before the process exits.
+    """
+
+    def _exit(signum: int, _: Any) -> None:
+        logger.info("received SIGTERM, shutting down")
+        sys.exit(128 + signum)
+
+    signal.signal(signal.SIGTERM, _exit)
@@ -0,0 +1,198 @@
+import asyncio
+import json
+from collections.abc import Callable
+from typing import Any
+from uuid import uuid4
+
+import httpx
+import pytest
+from scraper_common import (
+    AsyncCoreAPIClient,
+    CoreAPIClient,
+    FeedCache,
+    RegistrationResult,
+    SeenVideoIndex,
+    Video,
+)
+
+CORE_API = "http://core-api.test"
+
+
+def _client(handler: Callable[..., Any], **kwargs: Any) -> AsyncCoreAPIClient:
+    return AsyncCoreAPIClient(
+        CORE_API, "abc123", transport=httpx.MockTransport(handler), **kwargs
+    )
+
+
+@pytest.mark.asyncio
+async def test_fetch_cursor():
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["X-API-TOKEN"] == "abc123"
+        if request.url.path == "/media_feeds/cursors/user-name/tiktok":
+            return httpx.Response(
+                200,
+                json={
+                    "data": {
+                        "id": "00000000-0000-0000-0000-000000000001",
+                        "target": "user-name",
+                        "platform": "tiktok",
+                        "cursor": {"last_video_datetime": "2025-01-01T00:00:00"},
+                    }
+                },
+            )
+        return httpx.Response(404)
+
+    async with _client(handler) as client:
+        assert await client.fetch_cursor("user/name", "tiktok") == {
+            "last_video_datetime": "2025-01-01T00:00:00"
+        }
+        assert await client.fetch_cursor("other", "tiktok") is None
+
+
+@pytest.mark.asyncio
+async def test_requests_match_sync_client():
+    """Both clients must send identical payloads for the same call."""
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        return httpx.Response(200, json={"data": []})
+
+    async with _client(handler) as client:
+        await client.update_video_stats("core-1", 10, None, 2, None)
+        await client.get_videos(["a", "b"], "youtube")
+
+    sync = CoreAPIClient(CORE_API, "abc123")
+    assert bodies == [
+        sync._stats_payload(10, None, 2, None),
+        sync._video_filter_query(["a", "b"], "youtube"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_limited():
+    in_flight = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"data": []})
+
+    async with _client(handler, max_concurrency=2) as client:
+        result = await client.get_videos([str(i) for i in range(10)], "youtube", 1)
+
+    assert result == {str(i): None for i in range(10)}
+    assert peak == 2
+
+
+def _cursor(target: str, value: str) -> dict:
+    return {
+        "id": str(uuid4()),
+        "target": target,
+        "platform": "tiktok",
+        "cursor": {"last_video_datetime": value},
+    }
+
+
+@pytest.mark.asyncio
+async def test_prefetched_and_held_back_cursors():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/media_feeds/cursors":
+            offset = request.url.params["offset"]
+            page = [_cursor("@a", "1"), _cursor("@b", "2")] if offset == "0" else []
+            return httpx.Response(200, json={"data": page})
+        return httpx.Response(200)
+
+    async with _client(handler, cursor_flush_every=2) as client:
+        assert await client.prefetch_cursors("tiktok", page_size=2) == 2
+        assert await client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "1"}
+        assert await client.fetch_cursor("@unknown", "tiktok") is None
+
+        await client.update_cursor("@a", "tiktok", {"last_video_datetime": "3"})
+        assert await client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "3"}
+        assert all(method == "GET" for method, _ in calls)
+        await client.update_cursor("@c", "tiktok", {"last_video_datetime": "4"})
+
+    assert sorted(path for method, path in calls if method == "POST") == [
+        "/media_feeds/cursors/@a/tiktok",
+        "/media_feeds/cursors/@c/tiktok",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_feed_pages_are_revalidated_and_fall_back_to_the_snapshot(tmp_path):
+    feeds = [
+        {
+            "id": str(uuid4()),
+            "organisation_id": str(uuid4()),
+            "is_archived": False,
+            "platform": "youtube",
+            "channel": "chan",
+        }
+    ]
+    responses = iter(
+        [
+            httpx.Response(200, json={"data": feeds}, headers={"ETag": '"v1"'}),
+            httpx.Response(304),
+            httpx.Response(503),
+        ]
+    )
+    etags = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        etags.append(request.headers.get("If-None-Match"))
+        return next(responses)
+
+    for _ in range(3):
+        async with _client(handler, feed_cache=FeedCache(str(tmp_path))) as client:
+            channels = await client.fetch_channel_feeds()
+        assert [str(feed.id) for feed in channels] == [feeds[0]["id"]]
+    assert etags == [None, '"v1"', '"v1"']
+
+
+@pytest.mark.asyncio
+async def test_iter_rescrape_targets_pages_before_yielding():
+    pages = {"0": ["v1", "v2"], "2": ["v2", "v3"], "4": []}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        ids = pages.pop(request.url.params["offset"])
+        return httpx.Response(200, json={"data": [{"id": id} for id in ids]})
+
+    async with _client(handler) as client:
+        targets = client.iter_rescrape_targets("youtube", page_size=2)
+        assert (await anext(targets))["id"] == "v1"
+        assert not pages
+        assert [t["id"] async for t in targets] == ["v2", "v3"]
+
+
+@pytest.mark.asyncio
+async def test_register_video_tolerates_an_empty_body(tmp_path):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(201)
+
+    index = SeenVideoIndex(str(tmp_path / "seen.db"))
+    video = Video(
+        platform="youtube",
+        platform_video_id="abc",
+        title=None,
+        description=None,
+        source_url=None,
+        org_ids=[],
+        channel=None,
+        channel_followers=None,
+        views=None,
+        comments=None,
+        likes=None,
+        destination_path="chan/abc.mp4",
+        uploaded_at=None,
+    )
+    async with _client(handler, seen_index=index) as client:
+        assert await client.register_video(video) == RegistrationResult.CREATED
+    assert index.get("youtube", "abc") is None
@@ -0,0 +1,75 @@
+import io
+import os
+import threading
+
+import pytest
+from scraper_common import DownloadBuffers, StagedFile
+
+
+def test_buffer_spills_to_disk_above_threshold(tmp_path):
+    buffers = DownloadBuffers(spool_threshold=10, tmp_dir=str(tmp_path))
+
+    with buffers.acquire() as buf:
+        buf.write(b"x" * 10)
+        assert isinstance(buf._file, io.BytesIO)
+        buf.write(b"y")
+        assert not isinstance(buf._file, io.BytesIO)
+        buf.seek(0)
+        assert buf.read() == b"x" * 10 + b"y"
+
+
+def test_budget_is_reserved_until_buffers_are_closed():
+    buffers = DownloadBuffers(spool_threshold=10, memory_budget=20)
+    first = buffers.acquire()
+    second = buffers.acquire()
+    assert buffers.reserved == 20
+
+    acquired = threading.Event()
+
+    def acquire_third():
+        buffers.acquire().close()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire_third)
+    thread.start()
+    assert not acquired.wait(timeout=0.1)
+
+    first.close()
+    assert acquired.wait(timeout=5)
+    thread.join()
+
+    second.close()
+    second.close()
+    assert buffers.reserved == 0
+
+
+def test_acquire_times_out_when_budget_is_used_up():
+    buffers = DownloadBuffers(spool_threshold=10, memory_budget=10)
+
+    with buffers.acquire():
+        with pytest.raises(TimeoutError):
+            buffers.acquire(timeout=0.01)
+    assert buffers.reserved == 0
+
+
+def test_staging_dirs_are_separate_and_removed(tmp_path):
+    buffers = DownloadBuffers(tmp_dir=str(tmp_path))
+
+    with buffers.staging_dir() as first, buffers.staging_dir() as second:
+        assert first != second
+        assert os.path.dirname(first) == str(tmp_path)
+
+    assert os.listdir(tmp_path) == []
+
+
+def test_staged_file_removes_its_staging_dir_when_closed(tmp_path):
+    buffers = DownloadBuffers(tmp_dir=str(tmp_path))
+    staging = buffers.staging_dir()
+    path = os.path.join(staging.name, "video.mp4")
+    with open(path, "wb") as f:
+        f.write(b"video")
+
+    with StagedFile(path, staging) as staged:
+        assert staged.read() == b"video"
+
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,92 @@
+import threading
+
+import pytest
+from scraper_common import (
+    CoordinationServer,
+    HTTPStore,
+    MemoryStore,
+    ProxyPool,
+    RateLimiter,
+    SQLiteStore,
+)
+
+
+@pytest.fixture
+def server():
+    server = CoordinationServer(MemoryStore(), host="127.0.0.1", port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["memory", "sqlite", "http"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    if request.param == "sqlite":
+        return SQLiteStore(str(tmp_path / "coordination.db"))
+    server = request.getfixturevalue("server")
+    return HTTPStore(f"http://127.0.0.1:{server.server_port}")
+
+
+def test_leases_are_exclusive_until_released_or_expired(store):
+    assert store.acquire_lease("proxy:1", "a", ttl=60)
+    assert store.acquire_lease("proxy:1", "a", ttl=60)
+    assert not store.acquire_lease("proxy:1", "b", ttl=60)
+
+    store.release_lease("proxy:1", "b")
+    assert not store.acquire_lease("proxy:1", "b", ttl=60)
+    store.release_lease("proxy:1", "a")
+    assert store.acquire_lease("proxy:1", "b", ttl=0)
+    # expired
+    assert store.acquire_lease("proxy:1", "a", ttl=60)
+
+
+def test_budgets_are_shared(store):
+    assert store.reserve("rate:youtube:1:video", rate=1, burst=1) == 0
+    assert 0.9 <= store.reserve("rate:youtube:1:video", rate=1, burst=1) <= 1
+    assert store.reserve("rate:youtube:2:video", rate=1, burst=1) == 0
+
+
+def test_sqlite_store_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "coordination.db")
+    first, second = SQLiteStore(path), SQLiteStore(path)
+
+    assert first.acquire_lease("proxy:1", "a", ttl=60)
+    assert not second.acquire_lease("proxy:1", "b", ttl=60)
+    first.reserve("rate:tiktok:1:listing", rate=1, burst=1)
+    assert second.reserve("rate:tiktok:1:listing", rate=1, burst=1) > 0
+
+
+def test_http_store_carries_on_when_server_is_down():
+    store = HTTPStore("http://127.0.0.1:9", timeout=1)
+
+    assert store.acquire_lease("proxy:1", "a", ttl=60)
+    assert store.reserve("rate:youtube:1:video", rate=1, burst=1) == 0
+
+
+def test_pools_sharing_a_store_split_proxies():
+    store = MemoryStore()
+    pools = [ProxyPool(3, store=store) for _ in range(3)]
+
+    picked = [pool.pick(f"pod-{i}") for i, pool in enumerate(pools)]
+
+    assert sorted(picked) == [1, 2, 3]
+    # picking again releases the proxy leased before
+    pools[0].release("pod-0")
+    assert ProxyPool(3, store=store).pick("pod-3") == picked[0]
+
+
+def test_rate_limiters_sharing_a_store_share_budgets(monkeypatch):
+    waits: list[float] = []
+    monkeypatch.setattr("scraper_common.ratelimit.time.sleep", waits.append)
+    store = MemoryStore()
+    first = RateLimiter({"video": 60.0}, jitter=0, store=store)
+    second = RateLimiter({"video": 60.0}, jitter=0, store=store)
+
+    first.acquire("youtube", "video", 1)
+    second.acquire("youtube", "video", 1)
+
+    assert len(waits) == 1
+    assert 0.9 <= waits[0] <= 1
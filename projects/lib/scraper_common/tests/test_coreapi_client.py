@@ -0,0 +1,209 @@
+import json
+from typing import Any, cast
+from uuid import uuid4
+
+import pytest
+import requests
+import responses
+from requests.adapters import HTTPAdapter
+from responses import matchers
+from scraper_common import CoreAPIClient, RegistrationResult, Video
+
+CORE_API = "http://core-api.test"
+
+
+@responses.activate
+def test_requests_share_a_pooled_session():
+    _ = responses.add(
+        responses.POST, f"{CORE_API}/videos/filter", json={"data": []}, status=200
+    )
+    client = CoreAPIClient(CORE_API, "abc123", pool_maxsize=8, timeout=3.0)
+
+    assert client.get_video("vid1", "youtube") is None
+    assert client.get_video("vid2", "youtube") is None
+
+    assert len(responses.calls) == 2
+    for call in responses.calls:
+        assert call.request.headers["X-API-TOKEN"] == "abc123"
+        # req_kwargs is recorded by responses
+        assert call.request.req_kwargs["timeout"] == 3.0  # type: ignore[attr-defined]
+
+    adapter = cast(HTTPAdapter, client.session.get_adapter(CORE_API))
+    assert adapter._pool_maxsize == 8
+    assert adapter.max_retries.total == 3
+
+
+def test_context_manager_closes_session():
+    with CoreAPIClient(CORE_API, "abc123") as client:
+        adapter = cast(HTTPAdapter, client.session.get_adapter(CORE_API))
+        _ = adapter.poolmanager.connection_from_url(CORE_API)
+        assert len(adapter.poolmanager.pools) == 1
+
+    assert len(adapter.poolmanager.pools) == 0
+
+
+def _make_video(id: str) -> Video:
+    return Video(
+        platform="youtube",
+        platform_video_id=id,
+        title=None,
+        description=None,
+        source_url=None,
+        org_ids=[],
+        channel=None,
+        channel_followers=None,
+        views=None,
+        comments=None,
+        likes=None,
+        destination_path=f"chan/{id}.mp4",
+        uploaded_at=None,
+    )
+
+
+@pytest.mark.parametrize(
+    "status, expected",
+    [
+        (201, RegistrationResult.CREATED),
+        (409, RegistrationResult.EXISTED),
+        (400, RegistrationResult.FAILED),
+    ],
+)
+@responses.activate
+def test_register_video_entry_is_a_single_request(status, expected):
+    _ = responses.add(responses.POST, f"{CORE_API}/videos", status=status)
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    assert client.register_video_entry(_make_video("vid1")) == expected
+    assert len(responses.calls) == 1
+    assert responses.calls[0].request.url == f"{CORE_API}/videos"
+
+
+@responses.activate
+def test_get_videos_resolves_ids_in_chunks():
+    def filter_callback(request):
+        predicate = json.loads(request.body)["metadata"]
+        data: list[dict[str, Any]] = [
+            {"id": "core-b", "metadata": {"youtube_id": "b"}},
+            {"id": "core-d", "metadata": {"youtube_id": "d"}},
+        ]
+        found = [v for v in data if f'"{v["metadata"]["youtube_id"]}"' in predicate]
+        return 200, {}, json.dumps({"data": found})
+
+    responses.add_callback(
+        responses.POST, f"{CORE_API}/videos/filter", callback=filter_callback
+    )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    result = client.get_videos(["a", "b", "c", "d", "a"], "youtube", chunk_size=2)
+
+    assert len(responses.calls) == 2
+    assert json.loads(cast(bytes, responses.calls[0].request.body)) == {
+        "metadata": '$.youtube_id == "a" || $.youtube_id == "b"'
+    }
+    assert result == {
+        "a": None,
+        "b": {"id": "core-b", "metadata": {"youtube_id": "b"}},
+        "c": None,
+        "d": {"id": "core-d", "metadata": {"youtube_id": "d"}},
+    }
+
+
+@responses.activate
+def test_get_videos_raises_on_failed_lookup():
+    _ = responses.add(responses.POST, f"{CORE_API}/videos/filter", status=500)
+    client = CoreAPIClient(CORE_API, "abc123", retries=0)
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        _ = client.get_videos(["a"], "youtube")
+
+
+def _channel_feed(channel: str) -> dict:
+    return {
+        "id": str(uuid4()),
+        "organisation_id": str(uuid4()),
+        "channel": channel,
+        "platform": "youtube",
+    }
+
+
+@responses.activate
+def test_iter_channel_feeds_pages_lazily():
+    for offset, channels in [(0, ["a", "b"]), (2, ["c"])]:
+        _ = responses.add(
+            responses.GET,
+            f"{CORE_API}/media_feeds/channels",
+            json={"data": [_channel_feed(c) for c in channels]},
+            match=[matchers.query_param_matcher({"limit": "2", "offset": str(offset)})],
+        )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    feeds = client.iter_channel_feeds(page_size=2)
+    assert next(feeds).channel == "a"
+    assert len(responses.calls) == 1
+
+    assert [feed.channel for feed in feeds] == ["b", "c"]
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_iter_channel_feeds_stops_if_api_ignores_paging():
+    _ = responses.add(
+        responses.GET,
+        f"{CORE_API}/media_feeds/channels",
+        json={"data": [_channel_feed("a"), _channel_feed("b")]},
+    )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    assert [feed.channel for feed in client.iter_channel_feeds(page_size=2)] == [
+        "a",
+        "b",
+    ]
+
+
+@responses.activate
+def test_iter_rescrape_targets_skips_repeats_and_honours_limit():
+    for offset, ids in [(0, ["v1", "v2"]), (2, ["v2", "v3"]), (4, ["v4"])]:
+        _ = responses.add(
+            responses.GET,
+            f"{CORE_API}/videos/by-expected-views",
+            json={"data": [{"id": id} for id in ids]},
+            match=[
+                matchers.query_param_matcher(
+                    {
+                        "platform": "youtube",
+                        "min_age_hours": "1",
+                        "limit": "2",
+                        "offset": str(offset),
+                    }
+                )
+            ],
+        )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    targets = client.iter_rescrape_targets("youtube", limit=3, page_size=2)
+
+    assert [t["id"] for t in targets] == ["v1", "v2", "v3"]
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_iter_rescrape_targets_are_fetched_before_rescraping():
+    for offset, ids in [(0, ["v1", "v2"]), (2, ["v3", "v4"]), (4, ["v5"])]:
+        _ = responses.add(
+            responses.GET,
+            f"{CORE_API}/videos/by-expected-views",
+            json={"data": [{"id": id} for id in ids]},
+            match=[
+                matchers.query_param_matcher(
+                    {"offset": str(offset)}, strict_match=False
+                )
+            ],
+        )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    targets = client.iter_rescrape_targets("youtube", page_size=2)
+
+    # rescraping the first target mustn't shift the pages still to be fetched
+    assert next(targets)["id"] == "v1"
+    assert len(responses.calls) == 3
+    assert [t["id"] for t in targets] == ["v2", "v3", "v4", "v5"]
@@ -0,0 +1,113 @@
+import json
+from typing import cast
+from uuid import uuid4
+
+import responses
+from responses import matchers
+from scraper_common import CoreAPIClient
+
+CORE_API = "http://core-api.test"
+
+
+def _cursor(target: str, value: str, platform: str = "tiktok") -> dict:
+    return {
+        "id": str(uuid4()),
+        "target": target,
+        "platform": platform,
+        "cursor": {"last_video_datetime": value},
+    }
+
+
+def _add_cursor_page(offset: int, cursors: list[dict]) -> None:
+    _ = responses.add(
+        responses.GET,
+        f"{CORE_API}/media_feeds/cursors",
+        json={"data": cursors},
+        match=[
+            matchers.query_param_matcher(
+                {"platform": "tiktok", "limit": "2", "offset": str(offset)}
+            )
+        ],
+    )
+
+
+@responses.activate
+def test_prefetch_pages_through_cursors():
+    _add_cursor_page(0, [_cursor("@a", "1"), _cursor("user-b", "2")])
+    _add_cursor_page(2, [_cursor("@c", "3")])
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    assert client.prefetch_cursors("tiktok", page_size=2) == 3
+    assert len(responses.calls) == 2
+
+    assert client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "1"}
+    assert client.fetch_cursor("user/b", "tiktok") == {"last_video_datetime": "2"}
+    assert client.fetch_cursor("@unknown", "tiktok") is None
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_prefetch_keeps_only_the_platforms_cursors():
+    _add_cursor_page(0, [_cursor("@a", "1", "youtube"), _cursor("@b", "2", "youtube")])
+    _add_cursor_page(2, [_cursor("@a", "3")])
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    assert client.prefetch_cursors("tiktok", page_size=2) == 1
+    assert client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "3"}
+    assert client.fetch_cursor("@b", "tiktok") is None
+
+
+@responses.activate
+def test_prefetch_falls_back_to_per_target_fetches():
+    _ = responses.add(responses.GET, f"{CORE_API}/media_feeds/cursors", status=404)
+    _ = responses.add(
+        responses.GET, f"{CORE_API}/media_feeds/cursors/%40a/tiktok", status=404
+    )
+    client = CoreAPIClient(CORE_API, "abc123")
+
+    assert client.prefetch_cursors("tiktok") == 0
+    assert client.fetch_cursor("@a", "tiktok") is None
+    assert (
+        responses.calls[-1].request.url == f"{CORE_API}/media_feeds/cursors/%40a/tiktok"
+    )
+
+
+@responses.activate
+def test_cursor_updates_are_committed_in_batches():
+    for target in ["%40a", "%40b", "%40c"]:
+        _ = responses.add(
+            responses.POST, f"{CORE_API}/media_feeds/cursors/{target}/tiktok"
+        )
+    client = CoreAPIClient(CORE_API, "abc123", cursor_flush_every=2)
+
+    client.update_cursor("@a", "tiktok", {"last_video_datetime": "1"})
+    assert len(responses.calls) == 0
+    assert client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "1"}
+
+    client.update_cursor("@b", "tiktok", {"last_video_datetime": "2"})
+    assert len(responses.calls) == 2
+
+    client.update_cursor("@c", "tiktok", {"last_video_datetime": "3"})
+    assert len(responses.calls) == 2
+    client.close()
+    assert len(responses.calls) == 3
+    assert json.loads(cast(bytes, responses.calls[2].request.body)) == {
+        "last_video_datetime": "3"
+    }
+
+
+@responses.activate
+def test_failed_cursor_commits_stay_pending():
+    _ = responses.add(
+        responses.POST, f"{CORE_API}/media_feeds/cursors/%40a/tiktok", status=400
+    )
+    _ = responses.add(responses.POST, f"{CORE_API}/media_feeds/cursors/%40a/tiktok")
+    client = CoreAPIClient(CORE_API, "abc123", cursor_flush_every=5)
+
+    client.update_cursor("@a", "tiktok", {"last_video_datetime": "1"})
+    client.flush_cursors()
+    assert client.fetch_cursor("@a", "tiktok") == {"last_video_datetime": "1"}
+
+    client.flush_cursors()
+    assert len(responses.calls) == 2
+    assert client._pending_cursors == {}
@@ -0,0 +1,89 @@
+import hashlib
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+from google.api_core.exceptions import PreconditionFailed
+from scraper_common import (
+    DedupStorageClient,
+    DiskStorageClient,
+    GCSHashIndex,
+    IterableReader,
+    SQLiteHashIndex,
+)
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = SQLiteHashIndex(str(tmp_path / "hashes.db"))
+    yield idx
+    idx.close()
+
+
+def test_duplicate_content_is_not_uploaded_again(tmp_path, index):
+    client = DedupStorageClient(DiskStorageClient(str(tmp_path / "blobs")), index)
+
+    first = client.upload_blob("chan1/a.mp4", io.BytesIO(b"video"))
+    second = client.upload_blob("chan2/b.mp4", io.BytesIO(b"video"))
+    other = client.upload_blob("chan2/c.mp4", io.BytesIO(b"other video"))
+
+    assert second == first
+    assert other != first
+    assert not (tmp_path / "blobs/chan2/b.mp4").exists()
+    assert (tmp_path / "blobs/chan2/c.mp4").read_bytes() == b"other video"
+
+
+def test_uploads_from_the_current_position(tmp_path, index):
+    client = DedupStorageClient(DiskStorageClient(str(tmp_path)), index)
+    buf = io.BytesIO(b"headervideo")
+    buf.seek(6)
+
+    blob_path = client.upload_blob("a.mp4", buf)
+
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"video"
+    assert index.get(hashlib.sha256(b"video").hexdigest()) == blob_path
+
+
+def test_unseekable_streams_are_hashed_while_uploaded(tmp_path, index):
+    client = DedupStorageClient(DiskStorageClient(str(tmp_path)), index)
+    stream = io.BufferedReader(IterableReader([b"vi", b"deo"]))
+
+    blob_path = client.upload_blob("a.mp4", stream)
+
+    assert index.get(hashlib.sha256(b"video").hexdigest()) == blob_path
+    assert client.upload_blob("b.mp4", io.BytesIO(b"video")) == blob_path
+
+
+def test_from_env_leaves_client_unwrapped_by_default(monkeypatch, tmp_path):
+    monkeypatch.delenv("CONTENT_HASH_INDEX", raising=False)
+    storage_client = DiskStorageClient(str(tmp_path))
+    assert DedupStorageClient.from_env(storage_client) is storage_client
+
+    monkeypatch.setenv("CONTENT_HASH_INDEX", str(tmp_path / "hashes.db"))
+    wrapped = DedupStorageClient.from_env(storage_client)
+    assert isinstance(wrapped, DedupStorageClient)
+    assert isinstance(wrapped.index, SQLiteHashIndex)
+
+
+@patch("scraper_common.dedup.storage")
+def test_gcs_index_keeps_blob_path_in_marker_metadata(mock_storage):
+    index = GCSHashIndex("bucket")
+    bucket = mock_storage.Client.return_value.bucket.return_value
+
+    bucket.get_blob.return_value = None
+    assert index.get("abc") is None
+    bucket.get_blob.assert_called_once_with("content-hashes/abc")
+
+    index.put("abc", "chan/a.mp4")
+    marker = bucket.blob.return_value
+    bucket.blob.assert_called_once_with("content-hashes/abc")
+    assert marker.metadata == {"blob_path": "chan/a.mp4"}
+    marker.upload_from_string.assert_called_once_with(b"", if_generation_match=0)
+
+    # a marker that already exists is kept
+    marker.upload_from_string.side_effect = PreconditionFailed("exists")
+    index.put("abc", "chan/b.mp4")
+
+    bucket.get_blob.return_value = MagicMock(metadata={"blob_path": "chan/a.mp4"})
+    assert index.get("abc") == "chan/a.mp4"
@@ -0,0 +1,87 @@
+from pathlib import Path
+from uuid import uuid4
+
+import pytest
+import requests
+import responses
+from scraper_common import CoreAPIClient, FeedCache
+
+CORE_API = "http://core-api.test"
+FEEDS_URL = f"{CORE_API}/media_feeds/channels"
+
+
+def _feeds() -> list[dict]:
+    return [
+        {
+            "id": str(uuid4()),
+            "organisation_id": str(uuid4()),
+            "is_archived": False,
+            "platform": "youtube",
+            "channel": "chan",
+        }
+    ]
+
+
+def _client(tmp_path: Path) -> CoreAPIClient:
+    return CoreAPIClient(
+        CORE_API, "abc123", retries=0, feed_cache=FeedCache(str(tmp_path))
+    )
+
+
+@responses.activate
+def test_feeds_are_revalidated_with_conditional_requests(tmp_path):
+    feeds = _feeds()
+    _ = responses.add(
+        responses.GET,
+        FEEDS_URL,
+        json={"data": feeds},
+        headers={"ETag": '"v1"', "Last-Modified": "Wed, 14 Oct 2026 10:00:00 GMT"},
+    )
+    _ = responses.add(responses.GET, FEEDS_URL, status=304)
+
+    first = _client(tmp_path).fetch_channel_feeds()
+    second = _client(tmp_path).fetch_channel_feeds()
+
+    assert first == second
+    assert [str(feed.id) for feed in second] == [feeds[0]["id"]]
+    headers = responses.calls[1].request.headers
+    assert headers["If-None-Match"] == '"v1"'
+    assert headers["If-Modified-Since"] == "Wed, 14 Oct 2026 10:00:00 GMT"
+
+
+@pytest.mark.parametrize(
+    "failure",
+    [
+        {"status": 503},
+        {"body": requests.ConnectionError("core api down")},
+        {"body": requests.ReadTimeout("core api slow")},
+    ],
+)
+@responses.activate
+def test_cached_snapshot_is_used_when_api_is_unavailable(tmp_path, failure):
+    feeds = _feeds()
+    _ = responses.add(responses.GET, FEEDS_URL, json={"data": feeds})
+    _ = responses.add(responses.GET, FEEDS_URL, **failure)
+
+    _ = _client(tmp_path).fetch_channel_feeds()
+    cached = _client(tmp_path).fetch_channel_feeds()
+
+    assert [str(feed.id) for feed in cached] == [feeds[0]["id"]]
+
+
+@responses.activate
+def test_client_errors_are_not_masked_by_the_cache(tmp_path):
+    _ = responses.add(responses.GET, FEEDS_URL, json={"data": _feeds()})
+    _ = responses.add(responses.GET, FEEDS_URL, status=403)
+
+    _ = _client(tmp_path).fetch_channel_feeds()
+    with pytest.raises(requests.HTTPError):
+        _ = _client(tmp_path).fetch_channel_feeds()
+
+
+@responses.activate
+def test_failure_without_snapshot_raises(tmp_path):
+    _ = responses.add(responses.GET, FEEDS_URL, status=503)
+
+    with pytest.raises(requests.HTTPError):
+        _ = _client(tmp_path).fetch_channel_feeds()
@@ -0,0 +1,204 @@
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+from scraper_common import ProxyConfig, ProxyPool
+
+
+def test_quarantined_proxies_are_not_picked():
+    pool = ProxyPool(3)
+
+    pool.report(2, ok=False, status=429)
+
+    assert {pool.pick() for _ in range(200)} == {1, 3}
+    assert pool.scores()[2] == 0.0
+
+
+def test_consecutive_failures_quarantine_with_growing_cooloff(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr("scraper_common.proxypool.time.time", lambda: now)
+    pool = ProxyPool(2, cooloff=10, failure_threshold=2)
+
+    pool.report(1, ok=False)
+    assert pool.scores()[1] > 0
+    pool.report(1, ok=False)
+    assert pool.scores()[1] == 0.0
+
+    now += 10
+    assert pool.scores()[1] > 0
+    pool.report(1, ok=False, status=403)
+    now += 10
+    # the second quarantine in a row lasts twice as long
+    assert pool.scores()[1] == 0.0
+
+
+def test_slow_and_failing_proxies_are_picked_less(monkeypatch):
+    pool = ProxyPool(3)
+    pool.report(1, ok=True, latency=1)
+    pool.report(2, ok=True, latency=30)
+    pool.report(3, ok=False)
+
+    scores = pool.scores()
+
+    assert scores[1] > scores[2]
+    assert scores[1] > scores[3]
+
+
+def test_all_quarantined_uses_the_one_released_first():
+    pool = ProxyPool(2, cooloff=100)
+    pool.report(1, ok=False, status=429)
+    pool.report(1, ok=False, status=429)
+    pool.report(2, ok=False, status=429)
+
+    assert pool.pick() == 2
+
+
+def test_scores_persist_across_runs(tmp_path):
+    state_path = str(tmp_path / "proxies.json")
+    pool = ProxyPool(2, state_path=state_path)
+    pool.report(1, ok=False, status=429)
+    pool.save()
+
+    pool = ProxyPool(2, state_path=state_path)
+
+    assert pool.scores()[1] == 0.0
+    assert pool.scores()[2] > 0
+
+
+def test_track_reports_outcomes_to_the_picked_proxy(monkeypatch):
+    monkeypatch.setenv("PROXY_COUNT", "2")
+    monkeypatch.setenv("PROXY_USERNAME", "user")
+    monkeypatch.setenv("PROXY_PASSWORD", "pass")
+    monkeypatch.delenv("PROXY_POOL_STATE", raising=False)
+    config = ProxyConfig()
+
+    @config.track
+    def fetch():
+        config.get_proxy_details()
+        raise RuntimeError("ERROR: [youtube] abc: HTTP Error 429: Too Many Requests")
+
+    with pytest.raises(RuntimeError):
+        fetch()
+
+    assert sorted(config.pool.scores().values())[0] == 0.0
+    assert config.get_proxy_details()[0].startswith("http://user-")
+
+
+def test_track_only_reports_proxy_failures(monkeypatch):
+    monkeypatch.setenv("PROXY_COUNT", "1")
+    monkeypatch.setenv("PROXY_USERNAME", "user")
+    monkeypatch.setenv("PROXY_PASSWORD", "pass")
+    monkeypatch.delenv("PROXY_POOL_STATE", raising=False)
+    config = ProxyConfig()
+    reports = []
+
+    def report(proxy_id, ok, latency=None, status=None):
+        reports.append((ok, status))
+
+    monkeypatch.setattr(config.pool, "report", report)
+
+    @config.track
+    def fetch(ex):
+        config.get_proxy_details()
+        raise ex
+
+    for ex in [
+        RuntimeError("ERROR: [youtube] abc: Video unavailable"),
+        RuntimeError("ERROR: [youtube] abc: Private video"),
+        RuntimeError("ERROR: [youtube] abc: HTTP Error 404: Not Found"),
+        requests.ConnectionError("Tunnel connection failed: 502"),
+        TimeoutError("timed out"),
+        RuntimeError("ERROR: Unable to download webpage: <urlopen error timed out>"),
+        RuntimeError("ERROR: [youtube] abc: Sign in to confirm you're not a bot"),
+        RuntimeError("ERROR: [youtube] abc: HTTP Error 403: Forbidden"),
+    ]:
+        with pytest.raises(type(ex)):
+            fetch(ex)
+
+    assert reports == [
+        (False, None),
+        (False, None),
+        (False, None),
+        (False, None),
+        (False, 403),
+    ]
+
+
+def test_nested_tracked_calls_report_to_their_own_proxy(monkeypatch):
+    monkeypatch.setenv("PROXY_COUNT", "2")
+    monkeypatch.setenv("PROXY_USERNAME", "user")
+    monkeypatch.setenv("PROXY_PASSWORD", "pass")
+    monkeypatch.delenv("PROXY_POOL_STATE", raising=False)
+    config = ProxyConfig()
+    picks = iter([1, 2])
+    monkeypatch.setattr(config.pool, "pick", lambda holder=None: next(picks))
+    reports = []
+
+    def report(proxy_id, ok, latency=None, status=None):
+        reports.append((proxy_id, ok))
+
+    monkeypatch.setattr(config.pool, "report", report)
+
+    @config.track
+    def download():
+        config.get_proxy_details()
+        raise RuntimeError("HTTP Error 403: Forbidden")
+
+    @config.track
+    def fetch_with_session():
+        # picks no proxy of its own, so uses the current one
+        pass
+
+    @config.track
+    def listing():
+        config.get_proxy_details()
+        with pytest.raises(RuntimeError):
+            download()
+        fetch_with_session()
+
+    listing()
+
+    assert reports == [(2, False), (2, True), (1, True)]
+
+
+def test_holders_lease_different_proxies():
+    pool = ProxyPool(3)
+
+    picked = {pool.pick(holder) for holder in "abc"}
+    assert picked == {1, 2, 3}
+
+    # released proxies can be leased again
+    released = pool.pick("a")
+    pool.release("a")
+    assert pool.pick("d") == released
+
+
+def test_pinned_contexts_keep_their_own_proxy(monkeypatch):
+    monkeypatch.setenv("PROXY_COUNT", "3")
+    monkeypatch.setenv("PROXY_USERNAME", "user")
+    monkeypatch.setenv("PROXY_PASSWORD", "pass")
+    monkeypatch.delenv("PROXY_POOL_STATE", raising=False)
+    config = ProxyConfig()
+
+    both_pinned = threading.Barrier(2)
+
+    def worker():
+        with config.pinned():
+            ids = {config.get_proxy_details()[1] for _ in range(10)}
+            both_pinned.wait(5)
+            assert len(ids) == 1
+            return ids.pop()
+
+    with ThreadPoolExecutor(2) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, worker) for _ in range(2)
+        ]
+        assert futures[0].result() != futures[1].result()
+
+    with config.pinned():
+        pinned = config.get_proxy_details()[1]
+        config.pool.report(pinned, ok=False, status=429)
+        # a quarantined proxy is replaced
+        assert config.get_proxy_details()[1] != pinned
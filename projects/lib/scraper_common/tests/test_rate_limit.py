@@ -0,0 +1,134 @@
+import time
+
+import pytest
+from scraper_common import RateLimiter, TokenBucket, is_rate_limited
+
+
+def _bucket(limiter: RateLimiter, platform: str, endpoint: str) -> TokenBucket:
+    bucket = limiter.bucket(platform, endpoint, 1)
+    assert bucket is not None
+    return bucket
+
+
+def test_bucket_allows_burst_then_paces():
+    bucket = TokenBucket(rate=10, burst=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.09 <= bucket.reserve() <= 0.1
+    # reservations queue up behind each other
+    assert 0.19 <= bucket.reserve() <= 0.2
+
+
+def test_each_proxy_has_its_own_budget():
+    limiter = RateLimiter({"video": 60.0}, jitter=0)
+
+    start = time.monotonic()
+    for proxy_id in range(1, 6):
+        limiter.acquire("youtube", "video", proxy_id)
+    assert time.monotonic() - start < 0.1
+
+    limiter.acquire("youtube", "video", 1)
+    assert time.monotonic() - start >= 0.9
+
+
+def test_platforms_and_endpoints_are_paced_separately():
+    limiter = RateLimiter({"video": 60.0, "listing": 60.0})
+
+    limiter.acquire("youtube", "video", 1)
+    assert _bucket(limiter, "youtube", "listing").reserve() == 0
+    assert _bucket(limiter, "tiktok", "video").reserve() == 0
+    assert _bucket(limiter, "youtube", "video").reserve() > 0
+
+
+def test_unlimited_endpoints_are_not_paced():
+    limiter = RateLimiter({"video": 0})
+
+    assert limiter.bucket("youtube", "video", 1) is None
+    assert limiter.bucket("youtube", "listing", 1) is None
+    assert limiter.acquire("youtube", "video") == 0
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_VIDEO", "30")
+    monkeypatch.setenv("RATE_LIMIT_BURST", "3")
+
+    limiter = RateLimiter.from_env()
+
+    assert limiter.limits == {"listing": 4.0, "video": 30.0}
+    bucket = limiter.bucket("youtube", "video", None)
+    assert bucket is not None
+    assert bucket.burst == 3
+    assert limiter.max_factor == 1.0
+
+
+def test_rate_increases_additively_and_backs_off_multiplicatively(monkeypatch):
+    monkeypatch.setattr("scraper_common.ratelimit.time.sleep", lambda _: None)
+    limiter = RateLimiter({"video": 6.0}, increase=1.0, decrease=0.5, max_factor=2)
+
+    @limiter.track
+    def fetch(error=None):
+        limiter.acquire("youtube", "video", 1)
+        if error:
+            raise error
+
+    fetch()
+    fetch()
+    assert limiter.rate("youtube", "video", 1) == 8.0
+
+    with pytest.raises(RuntimeError):
+        fetch(RuntimeError("ERROR: Sign in to confirm you're not a bot"))
+    assert limiter.rate("youtube", "video", 1) == 4.0
+    # other errors don't say anything about the rate
+    with pytest.raises(ValueError):
+        fetch(ValueError("Empty info dict"))
+    assert limiter.rate("youtube", "video", 1) == 4.0
+    # other proxies keep their own rate
+    assert limiter.rate("youtube", "video", 2) == 6.0
+
+    for _ in range(10):
+        fetch()
+    assert limiter.rate("youtube", "video", 1) == 12.0
+
+
+def test_rate_stays_within_the_limit_by_default(monkeypatch):
+    monkeypatch.setattr("scraper_common.ratelimit.time.sleep", lambda _: None)
+    limiter = RateLimiter({"video": 6.0}, increase=1.0)
+
+    for _ in range(10):
+        limiter.acquire("youtube", "video", 1)
+        limiter.feedback(rate_limited=False)
+    assert limiter.rate("youtube", "video", 1) == 6.0
+
+    limiter.feedback(rate_limited=True)
+    assert limiter.rate("youtube", "video", 1) == 3.0
+    for _ in range(10):
+        limiter.feedback(rate_limited=False)
+    assert limiter.rate("youtube", "video", 1) == 6.0
+
+
+def test_outcomes_apply_to_the_first_bucket_a_call_acquires(monkeypatch):
+    monkeypatch.setattr("scraper_common.ratelimit.time.sleep", lambda _: None)
+    limiter = RateLimiter({"listing": 4.0, "video": 6.0}, jitter=0, max_factor=2)
+
+    @limiter.track
+    def video():
+        limiter.acquire("tiktok", "video", 1)
+        raise RuntimeError("HTTP Error 429: Too Many Requests")
+
+    @limiter.track
+    def listing():
+        limiter.acquire("tiktok", "listing", 1)
+        with pytest.raises(RuntimeError):
+            video()
+
+    listing()
+
+    assert limiter.rate("tiktok", "video", 1) == 3.0
+    assert limiter.rate("tiktok", "listing", 1) == 4.5
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(RuntimeError("HTTP Error 403: Forbidden"))
+    assert is_rate_limited(RuntimeError("Please wait a few minutes"))
+    assert not is_rate_limited(RuntimeError("HTTP Error 404: Not Found"))
@@ -0,0 +1,127 @@
+import json
+from datetime import timedelta
+from typing import Any, cast
+from unittest.mock import patch
+
+import pytest
+import responses
+from scraper_common import CoreAPIClient, SeenVideoIndex, Video
+
+CORE_API = "http://core-api.test"
+
+
+def _id(video: dict[str, Any] | None) -> str | None:
+    return video["id"] if video else None
+
+
+@pytest.fixture
+def index(tmp_path):
+    idx = SeenVideoIndex(str(tmp_path / "seen.db"))
+    yield idx
+    idx.close()
+
+
+def test_put_and_get(index):
+    index.put("youtube", "abc", {"id": "core-1", "views": 10, "uploaded_at": "2025"})
+
+    assert index.get("youtube", "abc") == {
+        "id": "core-1",
+        "views": 10,
+        "uploaded_at": "2025",
+    }
+    assert index.get("tiktok", "abc") is None
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    index = SeenVideoIndex(str(tmp_path / "seen.db"), ttl=timedelta(hours=1))
+    with patch("scraper_common.seen.time.time", return_value=1000.0):
+        index.put("youtube", "abc", {"id": "core-1"})
+    with patch("scraper_common.seen.time.time", return_value=1000.0 + 3599):
+        assert index.get("youtube", "abc") is not None
+    with patch("scraper_common.seen.time.time", return_value=1000.0 + 3601):
+        assert index.get("youtube", "abc") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    path = str(tmp_path / "seen.db")
+    index = SeenVideoIndex(path, max_entries=2)
+    for i, id in enumerate(["a", "b", "c"]):
+        with patch("scraper_common.seen.time.time", return_value=1000.0 + i):
+            index.put("youtube", id, {"id": f"core-{id}"})
+    with patch("scraper_common.seen.time.time", return_value=2000.0):
+        assert index.get("youtube", "a") is not None
+    index.close()
+
+    # eviction also runs when the index is opened
+    index = SeenVideoIndex(path, max_entries=2)
+    with patch("scraper_common.seen.time.time", return_value=2001.0):
+        assert index.get("youtube", "a") is not None
+        assert index.get("youtube", "b") is None
+        assert index.get("youtube", "c") is not None
+
+
+def test_persists_across_instances(tmp_path):
+    path = str(tmp_path / "seen.db")
+    SeenVideoIndex(path).put("youtube", "abc", {"id": "core-1"})
+
+    assert SeenVideoIndex(path).get("youtube", "abc") == {
+        "id": "core-1",
+        "views": None,
+        "uploaded_at": None,
+    }
+
+
+@responses.activate
+def test_client_consults_index_before_api(index):
+    _ = responses.add(
+        responses.POST,
+        f"{CORE_API}/videos/filter",
+        json={"data": [{"id": "core-b", "metadata": {"youtube_id": "b"}}]},
+    )
+    index.put("youtube", "a", {"id": "core-a", "views": 5})
+    client = CoreAPIClient(CORE_API, "abc123", seen_index=index)
+
+    assert _id(client.get_video("a", "youtube")) == "core-a"
+    assert len(responses.calls) == 0
+
+    result = client.get_videos(["a", "b"], "youtube")
+    assert _id(result["a"]) == "core-a"
+    assert _id(result["b"]) == "core-b"
+    assert len(responses.calls) == 1
+    assert json.loads(cast(bytes, responses.calls[0].request.body)) == {
+        "metadata": '$.youtube_id == "b"'
+    }
+    assert index.get("youtube", "b")["id"] == "core-b"
+
+
+@responses.activate
+def test_registration_writes_through_to_index(index):
+    _ = responses.add(
+        responses.POST,
+        f"{CORE_API}/videos",
+        json={"data": {"id": "core-new", "views": 3}},
+        status=201,
+    )
+    _ = responses.add(responses.PATCH, f"{CORE_API}/videos/core-new", status=200)
+    client = CoreAPIClient(CORE_API, "abc123", seen_index=index)
+    video = Video(
+        platform="youtube",
+        platform_video_id="new",
+        title=None,
+        description=None,
+        source_url=None,
+        org_ids=[],
+        channel=None,
+        channel_followers=None,
+        views=3,
+        comments=None,
+        likes=None,
+        destination_path="chan/new.mp4",
+        uploaded_at=None,
+    )
+
+    client.register_video(video)
+    assert index.get("youtube", "new")["id"] == "core-new"
+
+    client.update_video_stats("core-new", 50, None, None, None)
+    assert index.get("youtube", "new")["views"] == 50
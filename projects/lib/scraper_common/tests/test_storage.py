@@ -0,0 +1,279 @@
+import base64
+import errno
+import io
+import os
+import tempfile
+from collections.abc import AsyncIterator
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import google_crc32c
+import pytest
+from scraper_common import (
+    DiskStorageClient,
+    GoogleCloudStorageClient,
+    IterableReader,
+    stored_ids,
+    upload_async_chunks,
+)
+
+
+def test_iterable_reader_reads_across_chunks():
+    reader = io.BufferedReader(IterableReader([b"ab", b"", b"cde", b"f"]))
+
+    assert reader.read(3) == b"abc"
+    assert reader.read() == b"def"
+    assert reader.read() == b""
+
+
+def test_disk_client_streams_to_file(tmp_path):
+    client = DiskStorageClient(str(tmp_path))
+    chunks = (bytes([i]) * 1000 for i in range(10))
+
+    stream = io.BufferedReader(IterableReader(chunks))
+    blob_path = client.upload_blob("chan/vid.mp4", stream)
+
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"".join(bytes([i]) * 1000 for i in range(10))
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_uses_chunked_resumable_uploads(mock_storage):
+    client = GoogleCloudStorageClient("bucket", "prefix", chunk_size=256 * 1024)
+    stream = io.BufferedReader(IterableReader([b"video"]))
+
+    assert client.upload_blob("chan/vid.mp4", stream) == "prefix/chan/vid.mp4"
+    bucket = mock_storage.Client.return_value.bucket.return_value
+    bucket.blob.assert_called_once_with("prefix/chan/vid.mp4", chunk_size=256 * 1024)
+    bucket.blob.return_value.upload_from_file.assert_called_once_with(
+        stream, content_type="video/mp4"
+    )
+
+
+async def _chunks(n: int, fail: bool = False) -> AsyncIterator[bytes]:
+    for i in range(n):
+        yield bytes([i]) * 100
+    if fail:
+        raise ConnectionError("download interrupted")
+
+
+@pytest.mark.asyncio
+async def test_upload_async_chunks(tmp_path):
+    client = DiskStorageClient(str(tmp_path))
+
+    blob_path = await upload_async_chunks(client, "vid.mp4", _chunks(50), max_pending=2)
+
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"".join(bytes([i]) * 100 for i in range(50))
+
+
+@pytest.mark.asyncio
+async def test_upload_async_chunks_fails_with_its_source():
+    storage_client = MagicMock()
+    storage_client.upload_blob.side_effect = lambda _, buf, __: buf.read()
+
+    with pytest.raises(ConnectionError):
+        await upload_async_chunks(storage_client, "vid.mp4", _chunks(5, fail=True))
+
+
+def test_disk_client_lists_and_checks_blobs(tmp_path):
+    client = DiskStorageClient(str(tmp_path))
+    for name in ("chan/a.mp4", "chan/b.webm", "chan2/c.mp4"):
+        client.upload_blob(name, io.BytesIO(b"video"))
+
+    assert client.exists("chan/a.mp4")
+    assert not client.exists("chan/c.mp4")
+    assert client.list_blobs("chan/") == ["chan/a.mp4", "chan/b.webm"]
+    assert client.list_blobs("missing/") == []
+    assert stored_ids(client, "chan/") == {"a": "chan/a.mp4", "b": "chan/b.webm"}
+    assert client.blob_path("chan/a.mp4") == str(tmp_path / "chan/a.mp4")
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_lists_blob_names_under_its_prefix(mock_storage):
+    client = GoogleCloudStorageClient("bucket", "prefix")
+    blob = MagicMock()
+    blob.name = "prefix/chan/a.mp4"
+    mock_storage.Client.return_value.list_blobs.return_value = iter([blob])
+
+    assert client.list_blobs("chan/") == ["chan/a.mp4"]
+    _, kwargs = mock_storage.Client.return_value.list_blobs.call_args
+    assert kwargs["prefix"] == "prefix/chan/"
+
+    client.exists("chan/a.mp4")
+    client.bucket.blob.assert_called_once_with("prefix/chan/a.mp4")
+
+
+def _fake_bucket(mock_storage):
+    """Bucket whose blobs remember what was uploaded to and composed into them."""
+    bucket = mock_storage.Client.return_value.bucket.return_value
+    blobs = {}
+
+    def blob(name, **_):
+        if name not in blobs:
+            b = MagicMock()
+            b.name = name
+            b.upload_from_string.side_effect = lambda data, **_: setattr(
+                b, "data", data
+            )
+
+            def compose(sources, b=b):
+                b.data = b"".join(source.data for source in sources)
+                b.crc32c = base64.b64encode(
+                    google_crc32c.Checksum(b.data).digest()
+                ).decode()
+
+            b.compose.side_effect = compose
+            blobs[name] = b
+        return blobs[name]
+
+    bucket.blob.side_effect = blob
+    return bucket, blobs
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_uploads_large_blobs_in_parallel_parts(mock_storage):
+    bucket, blobs = _fake_bucket(mock_storage)
+    client = GoogleCloudStorageClient(
+        "bucket", "prefix", parallel_threshold=100, part_size=10, parallel_workers=3
+    )
+    data = bytes(range(256)) * 2
+
+    assert client.upload_blob("chan/vid.mp4", io.BytesIO(data)) == "prefix/chan/vid.mp4"
+
+    destination = blobs["prefix/chan/vid.mp4"]
+    assert destination.data == data
+    # 52 parts take two compose requests of at most 32 sources
+    assert destination.compose.call_count == 2
+    destination.upload_from_file.assert_not_called()
+    (parts,), _ = bucket.delete_blobs.call_args
+    assert len(parts) == 52
+    assert all(part.name.startswith("prefix/.parts/") for part in parts)
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_keeps_small_blobs_in_one_upload(mock_storage):
+    bucket, blobs = _fake_bucket(mock_storage)
+    client = GoogleCloudStorageClient("bucket", parallel_threshold=100, part_size=10)
+
+    client.upload_blob("vid.mp4", io.BytesIO(b"x" * 99))
+
+    blobs["vid.mp4"].upload_from_file.assert_called_once()
+    blobs["vid.mp4"].compose.assert_not_called()
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_rejects_composed_blob_with_bad_checksum(mock_storage):
+    bucket, blobs = _fake_bucket(mock_storage)
+    client = GoogleCloudStorageClient("bucket", parallel_threshold=10, part_size=10)
+    destination = bucket.blob("vid.mp4")
+    destination.compose.side_effect = lambda _: setattr(
+        destination, "crc32c", "AAAAAA=="
+    )
+
+    with pytest.raises(OSError, match="crc32c mismatch"):
+        client.upload_blob("vid.mp4", io.BytesIO(b"x" * 50))
+    destination.delete.assert_called_once()
+    bucket.delete_blobs.assert_called_once()
+
+
+@patch("scraper_common.storage.storage")
+def test_gcs_client_stops_parallel_upload_when_a_part_fails(mock_storage):
+    bucket = mock_storage.Client.return_value.bucket.return_value
+    client = GoogleCloudStorageClient(
+        "bucket", parallel_threshold=10, part_size=10, parallel_workers=1
+    )
+    failing = MagicMock(side_effect=ConnectionError("part upload failed"))
+    bucket.blob.side_effect = lambda name, **_: MagicMock(upload_from_string=failing)
+
+    with pytest.raises(ConnectionError):
+        client.upload_blob("vid.mp4", io.BytesIO(b"x" * 1000))
+    # the failure stopped reading further parts
+    assert failing.call_count < 100
+    bucket.delete_blobs.assert_called_once()
+
+
+class FailingReader(io.RawIOBase):
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        raise ConnectionError("download interrupted")
+
+
+def test_disk_client_leaves_no_partial_blob(tmp_path):
+    client = DiskStorageClient(str(tmp_path))
+    client.upload_blob("chan/vid.mp4", io.BytesIO(b"old"))
+
+    with pytest.raises(ConnectionError):
+        client.upload_blob("chan/vid.mp4", io.BufferedReader(FailingReader()))
+
+    assert [p.name for p in (tmp_path / "chan").iterdir()] == ["vid.mp4"]
+    assert (tmp_path / "chan/vid.mp4").read_bytes() == b"old"
+
+
+def test_disk_client_copies_files_in_the_kernel(tmp_path):
+    client = DiskStorageClient(str(tmp_path / "blobs"))
+    source = tmp_path / "source"
+    source.write_bytes(b"headervideo")
+
+    with (
+        open(source, "rb") as f,
+        patch("os.copy_file_range", wraps=os.copy_file_range) as copy,
+    ):
+        f.seek(6)
+        blob_path = client.upload_blob("vid.mp4", f)
+        assert f.tell() == 11
+
+    copy.assert_called()
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"video"
+
+
+def test_disk_client_falls_back_to_sendfile(tmp_path):
+    client = DiskStorageClient(str(tmp_path / "blobs"))
+    spooled = tempfile.SpooledTemporaryFile(max_size=4)
+    spooled.write(b"video")  # past max_size, so it is on disk now
+    spooled.seek(0)
+    unsupported = OSError(errno.EXDEV, "cross-device link")
+
+    with (
+        patch("os.copy_file_range", side_effect=unsupported),
+        patch("os.sendfile", wraps=os.sendfile) as sendfile,
+    ):
+        blob_path = client.upload_blob("vid.mp4", spooled)
+
+    sendfile.assert_called()
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"video"
+
+
+def test_disk_client_keeps_spooled_buffers_in_memory(tmp_path):
+    client = DiskStorageClient(str(tmp_path))
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024)
+    spooled.write(b"video")
+    spooled.seek(0)
+
+    blob_path = client.upload_blob("vid.mp4", spooled)
+
+    assert isinstance(spooled._file, io.BytesIO)
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"video"
+
+
+def test_disk_client_fsync_policy(tmp_path):
+    with pytest.raises(ValueError):
+        DiskStorageClient(str(tmp_path), fsync="sometimes")
+
+    client = DiskStorageClient(str(tmp_path), fsync="full")
+    with (
+        patch("os.fsync") as fsync,
+        patch("pathlib.Path.mkdir", wraps=Path.mkdir, autospec=True) as mkdir,
+    ):
+        client.upload_blob("chan/a.mp4", io.BytesIO(b"a"))
+        client.upload_blob("chan/b.mp4", io.BytesIO(b"b"))
+
+    # the blob and its directory, for both uploads
+    assert fsync.call_count == 4
+    # the directory is only created once
+    assert mkdir.call_count == 1
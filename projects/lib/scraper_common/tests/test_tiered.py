@@ -0,0 +1,96 @@
+import io
+import threading
+import time
+
+from scraper_common import DiskStorageClient, Throttle, TieredStorageClient
+
+
+class FlakyStorageClient(DiskStorageClient):
+    """Disk storage failing its first `failures` uploads, until blocked is set."""
+
+    def __init__(self, folder, failures=0):
+        super().__init__(folder)
+        self.failures = failures
+        self.attempts = 0
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+
+    def upload_blob(self, blob_name, buf, content_type=""):
+        self.unblocked.wait(5)
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("remote unavailable")
+        return super().upload_blob(blob_name, buf, content_type)
+
+
+def test_returns_remote_path_and_replicates_in_background(tmp_path):
+    remote = FlakyStorageClient(str(tmp_path / "remote"))
+    remote.unblocked.clear()
+    client = TieredStorageClient(remote, str(tmp_path / "staging"))
+
+    blob_path = client.upload_blob("chan/vid.mp4", io.BytesIO(b"video"))
+
+    assert blob_path == str(tmp_path / "remote/chan/vid.mp4")
+    assert client.pending() == 1
+    assert client.exists("chan/vid.mp4")
+    assert client.list_blobs("chan/") == ["chan/vid.mp4"]
+
+    remote.unblocked.set()
+    assert client.flush(5)
+    with open(blob_path, "rb") as f:
+        assert f.read() == b"video"
+    assert list((tmp_path / "staging/blobs").iterdir()) == []
+    client.close()
+
+
+def test_failed_replications_are_retried(tmp_path):
+    remote = FlakyStorageClient(str(tmp_path / "remote"), failures=2)
+    client = TieredStorageClient(remote, str(tmp_path / "staging"), backoff=0.01)
+
+    client.upload_blob("vid.mp4", io.BytesIO(b"video"))
+
+    assert client.flush(5)
+    assert remote.attempts == 3
+    assert (tmp_path / "remote/vid.mp4").read_bytes() == b"video"
+    client.close()
+
+
+def test_unreplicated_blobs_are_resumed_after_restart(tmp_path):
+    remote = FlakyStorageClient(str(tmp_path / "remote"), failures=1000)
+    client = TieredStorageClient(
+        remote, str(tmp_path / "staging"), drain_timeout=0.1, backoff=60
+    )
+    client.upload_blob("a.mp4", io.BytesIO(b"a"))
+    client.upload_blob("b.mp4", io.BytesIO(b"b"))
+    client.close()
+
+    remote = FlakyStorageClient(str(tmp_path / "remote"))
+    client = TieredStorageClient(remote, str(tmp_path / "staging"))
+    assert client.flush(5)
+    client.close()
+
+    assert (tmp_path / "remote/a.mp4").read_bytes() == b"a"
+    assert (tmp_path / "remote/b.mp4").read_bytes() == b"b"
+
+
+def test_restaging_a_blob_replicates_the_latest_content(tmp_path):
+    remote = FlakyStorageClient(str(tmp_path / "remote"))
+    remote.unblocked.clear()
+    client = TieredStorageClient(remote, str(tmp_path / "staging"), workers=2)
+
+    client.upload_blob("vid.mp4", io.BytesIO(b"old"))
+    client.upload_blob("vid.mp4", io.BytesIO(b"new"))
+    remote.unblocked.set()
+
+    assert client.flush(5)
+    assert (tmp_path / "remote/vid.mp4").read_bytes() == b"new"
+    client.close()
+
+
+def test_throttle_limits_rate():
+    throttle = Throttle(1000)
+    start = time.monotonic()
+    for _ in range(4):
+        throttle.consume(100)
+    # the first 100 bytes go right away, the next 300 take 0.3s
+    assert time.monotonic() - start >= 0.29
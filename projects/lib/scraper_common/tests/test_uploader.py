@@ -0,0 +1,159 @@
+import contextvars
+import io
+import threading
+import time
+from typing import IO, Any
+
+import pytest
+from scraper_common import AsyncUploader, DiskStorageClient
+from structlog.contextvars import bind_contextvars, get_contextvars
+
+
+class BlockingStorageClient:
+    """Storage client whose uploads wait until released."""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.started = threading.Semaphore(0)
+        self.uploaded: list[str] = []
+
+    def upload_blob(
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
+    ) -> str:
+        self.started.release()
+        self.release.wait(5)
+        if blob_name == "broken.mp4":
+            raise ConnectionError("upload failed")
+        self.uploaded.append(blob_name)
+        return self.blob_path(blob_name)
+
+    def blob_path(self, blob_name: str) -> str:
+        return f"bucket/{blob_name}"
+
+    def exists(self, blob_name: str) -> bool:
+        return blob_name in self.uploaded
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        return [name for name in self.uploaded if name.startswith(prefix)]
+
+
+def test_uploads_and_calls_back(tmp_path):
+    completed: list[str] = []
+    buf = io.BytesIO(b"video")
+
+    with AsyncUploader(DiskStorageClient(str(tmp_path)), workers=2) as uploader:
+        uploader.submit("chan/vid.mp4", buf, completed.append)
+
+    assert completed == [str(tmp_path / "chan/vid.mp4")]
+    assert (tmp_path / "chan/vid.mp4").read_bytes() == b"video"
+    assert buf.closed
+
+
+def test_runs_uploads_concurrently():
+    storage_client = BlockingStorageClient()
+    uploader = AsyncUploader(storage_client, workers=3)
+
+    for i in range(3):
+        uploader.submit(f"{i}.mp4", io.BytesIO(b"video"))
+
+    # all three have started before any of them finished
+    for _ in range(3):
+        assert storage_client.started.acquire(timeout=5)
+    storage_client.release.set()
+    uploader.close()
+    assert sorted(storage_client.uploaded) == ["0.mp4", "1.mp4", "2.mp4"]
+
+
+def test_submit_waits_for_room_in_the_queue():
+    storage_client = BlockingStorageClient()
+    uploader = AsyncUploader(storage_client, workers=1, max_pending=1)
+    uploader.submit("0.mp4", io.BytesIO())
+    assert storage_client.started.acquire(timeout=5)
+    uploader.submit("1.mp4", io.BytesIO())
+
+    submitted = threading.Event()
+
+    def submit() -> None:
+        uploader.submit("2.mp4", io.BytesIO())
+        submitted.set()
+
+    threading.Thread(target=submit).start()
+    assert not submitted.wait(0.2)
+
+    storage_client.release.set()
+    assert submitted.wait(5)
+    uploader.close()
+    assert storage_client.uploaded == ["0.mp4", "1.mp4", "2.mp4"]
+
+
+def test_close_waits_for_submits_in_progress(monkeypatch):
+    storage_client = BlockingStorageClient()
+    storage_client.release.set()
+    uploader = AsyncUploader(storage_client, workers=1)
+
+    # hold the submit between its closed check and queueing the job
+    in_submit = threading.Event()
+    copy_context = contextvars.copy_context
+
+    def slow_copy_context() -> contextvars.Context:
+        in_submit.set()
+        time.sleep(0.2)
+        return copy_context()
+
+    monkeypatch.setattr(contextvars, "copy_context", slow_copy_context)
+    buf = io.BytesIO()
+    submitter = threading.Thread(target=uploader.submit, args=("vid.mp4", buf))
+    submitter.start()
+    assert in_submit.wait(5)
+    uploader.close()
+    submitter.join(5)
+
+    assert storage_client.uploaded == ["vid.mp4"]
+    assert buf.closed
+
+
+def test_close_drains_pending_uploads():
+    storage_client = BlockingStorageClient()
+    storage_client.release.set()
+    completed: list[str] = []
+
+    uploader = AsyncUploader(storage_client, workers=2)
+    for i in range(10):
+        uploader.submit(f"{i}.mp4", io.BytesIO(), completed.append)
+    uploader.close()
+
+    assert sorted(completed) == sorted(f"bucket/{i}.mp4" for i in range(10))
+    with pytest.raises(RuntimeError):
+        uploader.submit("late.mp4", io.BytesIO())
+
+
+def test_failed_upload_skips_callback_and_closes_buffer():
+    storage_client = BlockingStorageClient()
+    storage_client.release.set()
+    completed: list[str] = []
+    buf = io.BytesIO(b"video")
+
+    with AsyncUploader(storage_client, workers=1) as uploader:
+        uploader.submit("broken.mp4", buf, completed.append)
+        uploader.submit("ok.mp4", io.BytesIO(), completed.append)
+
+    assert completed == ["bucket/ok.mp4"]
+    assert buf.closed
+
+
+def test_callback_runs_with_submitter_context():
+    storage_client = BlockingStorageClient()
+    storage_client.release.set()
+    seen: list[dict[str, Any]] = []
+
+    def submit() -> None:
+        bind_contextvars(channel_name="chan")
+        uploader.submit(
+            "vid.mp4", io.BytesIO(), lambda _: seen.append(get_contextvars())
+        )
+
+    with AsyncUploader(storage_client, workers=1) as uploader:
+        # bound in a copy, so it doesn't leak into other tests
+        contextvars.copy_context().run(submit)
+
+    assert seen == [{"channel_name": "chan"}]
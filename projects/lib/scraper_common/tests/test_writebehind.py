@@ -0,0 +1,182 @@
+import json
+import threading
+import time
+from typing import cast
+
+import pytest
+import requests
+import responses
+from scraper_common import CoreAPIClient, Video, WriteBehindQueue
+
+CORE_API = "http://core-api.test"
+
+
+def _make_video(id: str) -> Video:
+    return Video(
+        platform="youtube",
+        platform_video_id=id,
+        title=None,
+        description=None,
+        source_url=None,
+        org_ids=[],
+        channel=None,
+        channel_followers=None,
+        views=None,
+        comments=None,
+        likes=None,
+        destination_path=f"chan/{id}.mp4",
+        uploaded_at=None,
+    )
+
+
+def test_stats_updates_are_coalesced():
+    sent = []
+    queue = WriteBehindQueue(
+        register=lambda _: None,
+        update_stats=lambda id, stats: sent.append((id, stats)),
+        max_age=60,
+    )
+    queue.put_stats("vid1", {"views": 1, "likes": 1})
+    queue.put_stats("vid2", {"views": 7})
+    queue.put_stats("vid1", {"views": 5})
+    queue.flush()
+
+    assert sorted(sent) == [("vid1", {"views": 5, "likes": 1}), ("vid2", {"views": 7})]
+    queue.close()
+
+
+def test_flushes_when_batch_is_full():
+    flushed = threading.Event()
+    sent = []
+
+    def register(video):
+        sent.append(video.platform_video_id)
+        if len(sent) == 2:
+            flushed.set()
+
+    queue = WriteBehindQueue(register, lambda *_: None, max_batch=2, max_age=60)
+    queue.put_registration(_make_video("a"))
+    queue.put_registration(_make_video("b"))
+
+    assert flushed.wait(timeout=5)
+    assert sent == ["a", "b"]
+    queue.close()
+
+
+def test_failed_writes_are_retried():
+    attempts = []
+
+    def register(video):
+        attempts.append(video.platform_video_id)
+        if len(attempts) < 3:
+            raise ConnectionError("core api unavailable")
+
+    queue = WriteBehindQueue(register, lambda *_: None, max_age=60, backoff=0)
+    queue.put_registration(_make_video("a"))
+    queue.close()
+
+    assert attempts == ["a", "a", "a"]
+
+
+def _http_error(status: int) -> requests.HTTPError:
+    resp = requests.Response()
+    resp.status_code = status
+    return requests.HTTPError(f"{status} error", response=resp)
+
+
+@pytest.mark.parametrize("status, attempts", [(422, 1), (400, 1), (503, 3)])
+def test_only_transient_failures_are_retried(status, attempts):
+    sent = []
+
+    def register(video):
+        sent.append(video.platform_video_id)
+        raise _http_error(status)
+
+    queue = WriteBehindQueue(register, lambda *_: None, max_attempts=3, backoff=0)
+    queue.put_registration(_make_video("a"))
+    queue.close()
+
+    assert sent == ["a"] * attempts
+
+
+def test_retries_dont_hold_up_other_writes():
+    sent = []
+    second_sent = threading.Event()
+
+    def register(video):
+        sent.append(video.platform_video_id)
+        if video.platform_video_id == "a":
+            raise ConnectionError("core api unavailable")
+        second_sent.set()
+
+    queue = WriteBehindQueue(
+        register, lambda *_: None, max_batch=1, backoff=60, drain_timeout=0.1
+    )
+    queue.put_registration(_make_video("a"))
+    queue.put_registration(_make_video("b"))
+
+    assert second_sent.wait(timeout=5)
+    start = time.monotonic()
+    queue.close()
+
+    # "a" is dropped when the drain timeout is over, rather than retried
+    assert time.monotonic() - start < 5
+    assert sent == ["a", "b"]
+
+
+def test_producers_wait_while_the_queue_is_full():
+    release = threading.Event()
+
+    def register(video):
+        release.wait(5)
+
+    queue = WriteBehindQueue(register, lambda *_: None, max_batch=1, max_pending=2)
+    queue.put_registration(_make_video("a"))
+    queue.put_registration(_make_video("b"))
+
+    third_queued = threading.Event()
+
+    def put_third():
+        queue.put_registration(_make_video("c"))
+        third_queued.set()
+
+    thread = threading.Thread(target=put_third)
+    thread.start()
+    assert not third_queued.wait(timeout=0.2)
+
+    release.set()
+    assert third_queued.wait(timeout=5)
+    thread.join()
+    queue.close()
+
+
+def test_close_drains_pending_writes():
+    sent = []
+    queue = WriteBehindQueue(
+        register=lambda video: sent.append(video.platform_video_id),
+        update_stats=lambda id, _: sent.append(id),
+        max_age=60,
+    )
+    queue.put_registration(_make_video("a"))
+    queue.put_stats("core-b", {"views": 1})
+    queue.close()
+
+    assert sent == ["a", "core-b"]
+
+
+@responses.activate
+def test_client_enqueues_writes_until_closed():
+    _ = responses.add(responses.POST, f"{CORE_API}/videos/filter", json={"data": []})
+    _ = responses.add(responses.POST, f"{CORE_API}/videos", status=201)
+    _ = responses.add(responses.PATCH, f"{CORE_API}/videos/core-1", status=200)
+
+    with CoreAPIClient(CORE_API, "abc123", write_max_age=60) as client:
+        client.enqueue_video_entry(_make_video("a"))
+        client.enqueue_video_stats("core-1", 10, None, None, None)
+        client.enqueue_video_stats("core-1", 20, 2, None, None)
+        assert len(responses.calls) == 0
+
+    patches = [c for c in responses.calls if c.request.method == "PATCH"]
+    assert len(patches) == 1
+    assert json.loads(cast(bytes, patches[0].request.body)) == {"views": 20, "likes": 2}
+    assert any(c.request.url == f"{CORE_API}/videos" for c in responses.calls)
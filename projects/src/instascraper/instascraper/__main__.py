@@ -1,11 +1,16 @@
 import logging
 import os
-import time
 from uuid import UUID
 
 import structlog
 from pas_log import pas_setup_structlog
-from scraper_common import GoogleCloudStorageClient, StorageClient
+from scraper_common import (
+    DedupStorageClient,
+    GoogleCloudStorageClient,
+    StorageClient,
+    TieredStorageClient,
+    drain_on_sigterm,
+)
 
 from instascraper import coreapi
 from instascraper.scrape import scrape_channel
@@ -16,6 +21,7 @@ STORAGE_BUCKET_NAME = os.environ["STORAGE_BUCKET_NAME"]
 log_level = pas_setup_structlog()
 logging.getLogger(__name__).setLevel(log_level)
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
+drain_on_sigterm()
 
 
 type ChannelWatchers = dict[str, list[UUID]]
@@ -24,6 +30,7 @@ type ChannelWatchers = dict[str, list[UUID]]
 def channels_downloader(
     channels: ChannelWatchers, storage_client: StorageClient
 ) -> None:
+    coreapi.prefetch_cursors()
     for channel, orgs in channels.items():
         log = logger.new(channel_name=channel)
         log.info(f"archiving a new channel: {channel}")
@@ -38,11 +45,10 @@ def channels_downloader(
             log.error(
                 "unexpected error processing channel", media_feed=channel, exc_info=ex
             )
-        time.sleep(10)
 
 
 def channel_feeds() -> ChannelWatchers:
-    feeds = coreapi.fetch_channel_feeds()
+    feeds = coreapi.iter_channel_feeds()
     result: ChannelWatchers = {}
     for feed in feeds:
         if feed.platform != "instagram":
@@ -56,6 +62,11 @@ if __name__ == "__main__":
     log = logger.new()
     log.info("Instascraper starting up...")
 
-    storage_client = GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
-    channels = channel_feeds()
-    channels_downloader(channels, storage_client)
+    storage_client = DedupStorageClient.from_env(
+        TieredStorageClient.from_env(
+            GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
+        )
+    )
+    with coreapi.api_client:
+        channels = channel_feeds()
+        channels_downloader(channels, storage_client)
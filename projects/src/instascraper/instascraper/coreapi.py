@@ -1,18 +1,32 @@
 import json
 import os
+from collections.abc import Iterator
 from typing import Any
 from uuid import UUID
 
+import requests
 import structlog
-from scraper_common import ChannelFeed, CoreAPIClient, Platform, Video
+from scraper_common import (
+    ChannelFeed,
+    CoreAPIClient,
+    FeedCache,
+    SeenVideoIndex,
+    Video,
+)
 
-from instascraper.instagram import Reel
+from instascraper.instagram import PLATFORM, Reel
 
 API_URL = os.environ.get("API_URL", "http://localhost:3000/")
 API_KEY = json.loads(os.environ.get("API_KEYS", '["abc123"]'))[0]
-PLATFORM: Platform = "instagram"
+CURSOR_FLUSH_EVERY = int(os.environ.get("CURSOR_FLUSH_EVERY", 10))
 
-api_client = CoreAPIClient(API_URL, API_KEY)
+api_client = CoreAPIClient(
+    API_URL,
+    API_KEY,
+    seen_index=SeenVideoIndex.from_env(),
+    feed_cache=FeedCache.from_env(),
+    cursor_flush_every=CURSOR_FLUSH_EVERY,
+)
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
@@ -21,10 +35,32 @@ def fetch_channel_feeds() -> list[ChannelFeed]:
     return api_client.fetch_channel_feeds()
 
 
+def iter_channel_feeds() -> Iterator[ChannelFeed]:
+    return api_client.iter_channel_feeds()
+
+
 def get_video(platform_video_id: str) -> dict[str, Any] | None:
     return api_client.get_video(platform_video_id, PLATFORM)
 
 
+def get_videos(
+    platform_video_ids: list[str],
+) -> dict[str, dict[str, Any] | None] | None:
+    """Look up the reels of a profile at once.
+
+    Returns:
+        The videos by id, or None if the lookup failed, in which case they have
+        to be looked up one by one.
+    """
+    try:
+        return api_client.get_videos(platform_video_ids, PLATFORM)
+    except requests.RequestException as ex:
+        logger.warning(
+            "failed to look up videos, looking them up one by one", exc_info=ex
+        )
+        return None
+
+
 def register_download(reel: Reel, org_ids: list[UUID], destination_path: str) -> bool:
     video = Video(
         platform_video_id=reel.id,
@@ -42,11 +78,12 @@ def register_download(reel: Reel, org_ids: list[UUID], destination_path: str) ->
         views=reel.view_count,
     )
 
-    return api_client.register_video_entry(video)
+    api_client.enqueue_video_entry(video)
+    return True
 
 
 def update_video_stats(reel: Reel, video_id: str) -> bool:
-    api_client.update_video_stats(
+    api_client.enqueue_video_stats(
         id=video_id,
         views=reel.view_count,
         likes=reel.likes_count,
@@ -56,6 +93,10 @@ def update_video_stats(reel: Reel, video_id: str) -> bool:
     return True
 
 
+def prefetch_cursors() -> None:
+    api_client.prefetch_cursors(PLATFORM)
+
+
 def fetch_cursor(target: str) -> str | None:
     cursor = api_client.fetch_cursor(target, PLATFORM)
     if cursor:
@@ -1,20 +1,20 @@
+import contextlib
 import io
 import json
-import random
-import time
+from collections.abc import Iterator
 from datetime import datetime
-from typing import Any
+from typing import IO, Any
 
 import structlog
 from curl_cffi.requests import Session
 from pydantic import BaseModel
-from scraper_common import proxy_config
+from scraper_common import IterableReader, Platform, proxy_config, rate_limiter
+from scraper_common.ratelimit import LISTING, VIDEO
 from structlog.contextvars import bind_contextvars
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
-SLEEP_MAX = 8
-SLEEP_MIN = 4
+PLATFORM: Platform = "instagram"
 
 
 class InstagramError(Exception):
@@ -40,12 +40,8 @@ def _random_proxy() -> str | None:
     return proxy_url
 
 
-def _random_sleep() -> None:
-    sleep_for = random.uniform(SLEEP_MIN, SLEEP_MAX)
-    logger.info(f"sleeping for {sleep_for:.2f} seconds to avoid rate limits")
-    time.sleep(sleep_for)
-
-
+@proxy_config.track
+@rate_limiter.track
 def new_session() -> Session:
     session = Session(impersonate="chrome")
     session.headers.update(_get_public_headers())
@@ -53,6 +49,7 @@ def new_session() -> Session:
     if proxy:
         session.proxies = {"http": proxy, "https": proxy}
     logger.info("warming up session with instagram.com")
+    rate_limiter.acquire(PLATFORM, LISTING)
     resp = session.get("https://www.instagram.com/", timeout=10)
     resp.raise_for_status()
     csrf = session.cookies.get("csrftoken")
@@ -73,12 +70,22 @@ class Reel(BaseModel):
     video_url: str
     raw: dict[str, Any]
 
-    def video_bytes(self, session: Session) -> io.BytesIO:
-        logger.info("fetching video", user=self.profile.username, video_id=self.id)
-        _random_sleep()
-        resp = session.get(self.video_url, timeout=600)
-        resp.raise_for_status()
-        return io.BytesIO(resp.content)
+    @contextlib.contextmanager
+    def video_stream(self, session: Session) -> Iterator[IO[bytes]]:
+        """Stream the video file, e.g. straight into StorageClient.upload_blob."""
+        rate_limiter.acquire(PLATFORM, VIDEO)
+        logger.info(
+            "fetching video",
+            user=self.profile.username,
+            video_id=self.id,
+            request_rate=rate_limiter.rate(PLATFORM, VIDEO),
+        )
+        resp = session.get(self.video_url, timeout=600, stream=True)
+        try:
+            resp.raise_for_status()
+            yield io.BufferedReader(IterableReader(resp.iter_content()))
+        finally:
+            resp.close()
 
 
 class Profile(BaseModel):
@@ -131,8 +138,11 @@ class Profile(BaseModel):
         return reels
 
 
+@proxy_config.track
+@rate_limiter.track
 def fetch_profile(username: str, session: Session) -> Profile:
     logger.info("fetching profile", username=username)
+    rate_limiter.acquire(PLATFORM, LISTING)
     resp = session.get(
         f"https://www.instagram.com/api/v1/users/web_profile_info/?username={username}",
         timeout=10,
@@ -20,17 +20,22 @@ def scrape_channel(
     profile = instagram.fetch_profile(channel, session)
     reels = profile.reels
     log.debug(f"got {len(reels)} reels for {channel}")
+    known_videos = coreapi.get_videos([reel.id for reel in reels])
     for reel in reels:
         try:
-            existing_video = coreapi.get_video(reel.id)
+            existing_video = (
+                known_videos.get(reel.id)
+                if known_videos is not None
+                else coreapi.get_video(reel.id)
+            )
             if existing_video:
                 log.debug("video already exists, updating stats", reel_id=reel.id)
                 coreapi.update_video_stats(reel, existing_video["id"])
                 continue
 
-            bytes = reel.video_bytes(session)
             blob_name = path.join(channel, f"{reel.id}.mp4")
-            blob_path = storage_client.upload_blob(blob_name, bytes)
+            with reel.video_stream(session) as stream:
+                blob_path = storage_client.upload_blob(blob_name, stream)
             coreapi.register_download(reel, org_ids, blob_path)
 
             if not next_cursor:
@@ -1,4 +1,3 @@
-import io
 from unittest.mock import MagicMock
 
 import pytest
@@ -8,9 +7,9 @@ from instascraper.instagram import (
     Reel,
     fetch_profile,
 )
+from scraper_common import RateLimiter
 
-instagram.SLEEP_MAX = 0
-instagram.SLEEP_MIN = 0
+instagram.rate_limiter = RateLimiter({})
 
 
 @pytest.fixture
@@ -108,6 +107,7 @@ def _mock_session_with_response(json_data=None, content=None, status_code=200):
         response.json.return_value = json_data
     if content is not None:
         response.content = content
+        response.iter_content.return_value = [content[:4], content[4:]]
     session.get.return_value = response
     return session
 
@@ -189,7 +189,7 @@ def test_profile_reels_empty_description():
     assert reels[0].description == ""
 
 
-def test_reel_video_bytes():
+def test_reel_video_stream():
     mock_video_content = b"fake video content"
     session = _mock_session_with_response(content=mock_video_content)
 
@@ -215,7 +215,10 @@ def test_reel_video_bytes():
         raw={},
     )
 
-    result = reel.video_bytes(session)
+    with reel.video_stream(session) as stream:
+        assert stream.read() == mock_video_content
 
-    assert isinstance(result, io.BytesIO)
-    assert result.getvalue() == mock_video_content
+    session.get.assert_called_once_with(
+        "https://example.com/video.mp4", timeout=600, stream=True
+    )
+    session.get.return_value.close.assert_called_once()
@@ -47,7 +47,7 @@ def test_downloads_new_video(mock_instagram, mock_coreapi, mocknew_session):
     mock_instagram.fetch_profile.return_value = profile
     type(profile).reels = property(lambda self: [reel])
 
-    mock_coreapi.get_video.return_value = None
+    mock_coreapi.get_videos.return_value = {"reel1": None}
 
     storage = MagicMock()
     storage.upload_blob.return_value = "blob/path"
@@ -70,7 +70,7 @@ def test_updates_stats_for_existing_video(mock_instagram, mock_coreapi, mocknew_
     mock_instagram.fetch_profile.return_value = profile
     type(profile).reels = property(lambda self: [reel])
 
-    mock_coreapi.get_video.return_value = {"id": "db-video-id"}
+    mock_coreapi.get_videos.return_value = {"reel1": {"id": "db-video-id"}}
 
     storage = MagicMock()
     result = scrape_channel("test_user", "old_cursor", storage, [])
@@ -80,6 +80,33 @@ def test_updates_stats_for_existing_video(mock_instagram, mock_coreapi, mocknew_
     mock_coreapi.register_download.assert_not_called()
 
 
+@patch("instascraper.scrape.new_session")
+@patch("instascraper.scrape.coreapi")
+@patch("instascraper.scrape.instagram")
+def test_failed_bulk_lookup_falls_back_to_lookups_per_reel(
+    mock_instagram, mock_coreapi, mocknew_session
+):
+    mocknew_session.return_value = MagicMock()
+
+    profile = _make_profile()
+    reels = [_make_reel("reel1", profile), _make_reel("reel2", profile)]
+    mock_instagram.fetch_profile.return_value = profile
+    type(profile).reels = property(lambda self: reels)
+
+    mock_coreapi.get_videos.return_value = None
+    mock_coreapi.get_video.side_effect = lambda id: {"id": f"db-{id}"}
+
+    storage = MagicMock()
+    result = scrape_channel("test_user", None, storage, [])
+
+    assert result is None
+    assert [c.args[0] for c in mock_coreapi.get_video.call_args_list] == [
+        "reel1",
+        "reel2",
+    ]
+    mock_coreapi.update_video_stats.assert_any_call(reels[1], "db-reel2")
+    mock_coreapi.register_download.assert_not_called()
+
 @patch("instascraper.scrape.new_session")
 @patch("instascraper.scrape.coreapi")
 @patch("instascraper.scrape.instagram")
@@ -96,7 +123,10 @@ def test_downloads_new_and_updates_existing(mock_instagram, mock_coreapi, mockne
     mock_instagram.fetch_profile.return_value = profile
     type(profile).reels = property(lambda self: [new_reel, old_reel])
 
-    mock_coreapi.get_video.side_effect = [None, {"id": "db-id"}]
+    mock_coreapi.get_videos.return_value = {
+        "new_reel": None,
+        "old_reel": {"id": "db-id"},
+    }
 
     storage = MagicMock()
     storage.upload_blob.return_value = "blob/path"
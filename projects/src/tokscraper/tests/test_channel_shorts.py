@@ -0,0 +1,99 @@
+import io
+from datetime import datetime
+from typing import IO, Any, cast
+from unittest.mock import MagicMock
+
+import pytest
+import requests
+from scraper_common import AsyncUploader, DiskStorageClient
+from tokscraper import scrape
+from tokscraper.coreapi import api_client
+
+NOW = datetime.now()
+KNOWN = {"id": "db-known", "views": 1000, "uploaded_at": NOW.isoformat()}
+ENTRIES = [
+    {"id": "known", "view_count": 2000, "timestamp": NOW.timestamp()},
+    {"id": "new", "view_count": 10, "timestamp": NOW.timestamp()},
+]
+
+
+class FakeUploader:
+    """Records the uploads submitted instead of making them."""
+
+    def __init__(self, storage_client: DiskStorageClient):
+        self.storage_client = storage_client
+        self.submitted: list[str] = []
+
+    def submit(self, blob_name: str, buf: IO[bytes], *_: Any) -> None:
+        self.submitted.append(blob_name)
+        buf.close()
+
+
+def video_details(url: str) -> dict[str, Any]:
+    return {"id": url.rsplit("/", 1)[-1], "ext": "mp4", "timestamp": NOW.timestamp()}
+
+
+def download_video(url: str) -> tuple[dict[str, Any], IO[bytes]]:
+    return video_details(url), io.BytesIO(b"video")
+
+
+@pytest.fixture
+def core_api(monkeypatch: pytest.MonkeyPatch) -> MagicMock:
+    mock = MagicMock()
+    mock.get_videos.return_value = {"known": KNOWN, "new": None}
+    mock.get_video.side_effect = lambda id, platform: {"known": KNOWN}.get(id)
+    for name in ("get_videos", "get_video", "enqueue_video_stats"):
+        monkeypatch.setattr(api_client, name, getattr(mock, name))
+    mock.video_details.side_effect = video_details
+    monkeypatch.setattr(scrape, "video_details", mock.video_details)
+    mock.download_video.side_effect = download_video
+    monkeypatch.setattr(scrape, "download_video", mock.download_video)
+    monkeypatch.setattr(scrape, "register_download", mock.register_download)
+    monkeypatch.setattr(scrape, "channel_entries", lambda channel, num: ENTRIES)
+    return mock
+
+
+def scrape_channel(storage_client: DiskStorageClient) -> FakeUploader:
+    uploader = FakeUploader(storage_client)
+    scrape.download_channel_shorts("chan", NOW, cast(AsyncUploader, uploader), [])
+    return uploader
+
+
+def test_prefetched_videos_are_not_looked_up_again(
+    core_api: MagicMock, tmp_path: Any
+) -> None:
+    uploader = scrape_channel(DiskStorageClient(str(tmp_path)))
+
+    core_api.get_videos.assert_called_once_with(["known", "new"], "tiktok")
+    core_api.get_video.assert_not_called()
+    core_api.enqueue_video_stats.assert_called_once()
+    assert core_api.enqueue_video_stats.call_args.kwargs["id"] == "db-known"
+    assert uploader.submitted == ["chan/new.mp4"]
+
+
+def test_failed_prefetch_falls_back_to_lookups_per_video(
+    core_api: MagicMock, tmp_path: Any
+) -> None:
+    core_api.get_videos.side_effect = requests.HTTPError("503 Server Error")
+
+    uploader = scrape_channel(DiskStorageClient(str(tmp_path)))
+
+    assert [c.args[0] for c in core_api.get_video.call_args_list] == ["known", "new"]
+    assert core_api.enqueue_video_stats.call_args.kwargs["id"] == "db-known"
+    assert uploader.submitted == ["chan/new.mp4"]
+
+
+def test_stored_videos_are_registered_without_downloading(
+    core_api: MagicMock, tmp_path: Any
+) -> None:
+    storage_client = DiskStorageClient(str(tmp_path))
+    storage_client.upload_blob("chan/new.mp4", io.BytesIO(b"video"))
+
+    uploader = scrape_channel(storage_client)
+
+    assert uploader.submitted == []
+    core_api.video_details.assert_called_once_with("https://tiktok.com/chan/video/new")
+    core_api.download_video.assert_not_called()
+    core_api.register_download.assert_called_once()
+    destination_path = core_api.register_download.call_args.args[2]
+    assert destination_path == storage_client.blob_path("chan/new.mp4")
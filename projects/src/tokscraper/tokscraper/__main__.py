@@ -1,11 +1,19 @@
 import logging
 import os
-import time
+from collections.abc import Iterable
 
 import click
 import structlog
 from pas_log import pas_setup_structlog
-from scraper_common import ChannelFeed, GoogleCloudStorageClient, StorageClient
+from scraper_common import (
+    AsyncUploader,
+    ChannelFeed,
+    DedupStorageClient,
+    GoogleCloudStorageClient,
+    StorageClient,
+    TieredStorageClient,
+    drain_on_sigterm,
+)
 from scraper_common.storage import DiskStorageClient
 from structlog.contextvars import bind_contextvars
 
@@ -23,12 +31,18 @@ STORAGE_PATH_PREFIX = "tokscraper"
 log_level = pas_setup_structlog()
 logging.getLogger(__name__).setLevel(log_level)
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
+drain_on_sigterm()
 
 
 def get_storage_client() -> StorageClient:
+    storage_client: StorageClient
     if STORAGE_BUCKET_NAME == "local":
-        return DiskStorageClient("tiktok")
-    return GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
+        storage_client = DiskStorageClient("tiktok")
+    else:
+        storage_client = TieredStorageClient.from_env(
+            GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
+        )
+    return DedupStorageClient.from_env(storage_client)
 
 
 def rescrape_shorts() -> None:
@@ -36,7 +50,7 @@ def rescrape_shorts() -> None:
 
     while True:
         log.info("starting new re-scrape pass")
-        for target in coreapi.api_client.get_rescrape_targets(
+        for target in coreapi.api_client.iter_rescrape_targets(
             PLATFORM, min_age_hours=1, limit=100
         ):
             try:
@@ -48,14 +62,14 @@ def rescrape_shorts() -> None:
                     exc_info=ex,
                 )
                 continue
-            time.sleep(3)
 
 
 def channels_downloader(
-    channel_feeds: list[ChannelFeed], storage_client: StorageClient
+    channel_feeds: Iterable[ChannelFeed], uploader: AsyncUploader
 ) -> None:
     log = logger.bind()
     channels = preprocess_channel_feeds(channel_feeds)
+    coreapi.prefetch_cursors()
     for channel, orgs in channels.items():
         _ = bind_contextvars(channel_name=channel)
         log.info(f"archiving a new channel: {channel}")
@@ -63,7 +77,7 @@ def channels_downloader(
         try:
             cursor = fetch_cursor(channel)
             log.debug(f"using cursor {cursor}")
-            next_cursor = download_channel_shorts(channel, cursor, storage_client, orgs)
+            next_cursor = download_channel_shorts(channel, cursor, uploader, orgs)
             if next_cursor:
                 coreapi.update_cursor(channel, next_cursor)
 
@@ -88,9 +102,10 @@ def channels() -> None:
     log = logger.new()
     log.info("Tokscraper starting up...", mode="channels")
 
-    storage_client = get_storage_client()
-    channel_feeds = coreapi.api_client.fetch_channel_feeds()
-    channels_downloader(channel_feeds, storage_client)
+    # the uploader drains before the core API client flushes its writes
+    with coreapi.api_client, AsyncUploader.from_env(get_storage_client()) as uploader:
+        channel_feeds = coreapi.api_client.iter_channel_feeds()
+        channels_downloader(channel_feeds, uploader)
 
 
 @cli.command()
@@ -98,7 +113,8 @@ def rescrape() -> None:
     """Rescrape TikTok shorts to update stats."""
     log = logger.new()
     log.info("Tokscraper starting up...", mode="rescrape")
-    rescrape_shorts()
+    with coreapi.api_client:
+        rescrape_shorts()
 
 
 if __name__ == "__main__":
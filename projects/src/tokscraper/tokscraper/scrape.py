@@ -1,19 +1,28 @@
-import contextlib
-import io
-from collections.abc import Iterable
+import os
+from collections.abc import Callable, Iterable
 from datetime import datetime, timedelta
 from typing import Any, cast
 from uuid import UUID
 
 import structlog
 import yt_dlp
-from scraper_common import ChannelFeed, StorageClient, proxy_config
+from scraper_common import (
+    AsyncUploader,
+    ChannelFeed,
+    StagedFile,
+    download_buffers,
+    proxy_config,
+    rate_limiter,
+    stored_ids,
+)
+from scraper_common.ratelimit import LISTING, VIDEO
 from structlog.contextvars import bind_contextvars
 from tenacity import retry, stop_after_attempt
 
 from tokscraper.coreapi import (
     PLATFORM,
     api_client,
+    get_videos,
     register_download,
     update_video_stats,
 )
@@ -23,35 +32,70 @@ type ChannelWatchers = dict[str, list[UUID]]
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
 
+def video_details(url: str) -> dict[Any, Any]:
+    with download_buffers.staging_dir() as staging:
+        return _extract_video(url, staging, download=False)
+
+
+def download_video(url: str) -> tuple[dict[Any, Any], StagedFile]:
+    """Get details about a video and download the video file.
+
+    Returns:
+        The details and the downloaded file, which the caller owns and which is
+        removed when closed.
+    """
+    # downloaded into a directory of this call's own rather than to stdout, so
+    # downloads can run concurrently, and handed on from there rather than
+    # copied into a buffer
+    staging = download_buffers.staging_dir()
+    try:
+        details = _extract_video(url, staging.name, download=True)
+        staged = StagedFile(details["requested_downloads"][0]["filepath"], staging)
+    except BaseException:
+        staging.cleanup()
+        raise
+    logger.debug(
+        f"downloaded bytes: {os.fstat(staged.fileno()).st_size}",
+        request_rate=rate_limiter.rate(PLATFORM, VIDEO),
+    )
+    return details, staged
+
+
 @retry(reraise=True, stop=stop_after_attempt(3))
-def video_details(url: str, buf: io.BytesIO | None = None) -> dict[Any, Any]:
+@proxy_config.track
+@rate_limiter.track
+def _extract_video(url: str, staging: str, download: bool) -> dict[Any, Any]:
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
-
-    download = True
-    if not buf:
-        download = False
-        buf = io.BytesIO()
+    rate_limiter.acquire(PLATFORM, VIDEO)
 
     ctx = {
-        "outtmpl": "-",
         "logtostderr": True,
         "format": "w*",
         "proxy": proxy_addr,
+        "outtmpl": os.path.join(staging, "%(id)s.%(ext)s"),
     }
-    buf.seek(0)
-    with contextlib.redirect_stdout(buf), yt_dlp.YoutubeDL(ctx) as video:  # type: ignore
+    with yt_dlp.YoutubeDL(ctx) as video:
         details = video.extract_info(url, download=download)
-        details = cast(dict[Any, Any], details)
-    logger.debug(f"downloaded bytes: {buf.tell()}")
-    buf.seek(0)
-    return details
+    return cast(dict[Any, Any], details)
 
 
 def blob_name(channel_name, downloaded: dict[Any, Any]) -> str:
     return f"{channel_name}/{downloaded['id']}.{downloaded['ext']}"
 
 
+def on_uploaded(
+    details: dict[Any, Any], org_ids: list[UUID], log: structlog.BoundLogger
+) -> Callable[[str], None]:
+    """Completion callback registering an uploaded video with the core API."""
+
+    def register(destination_path: str) -> None:
+        register_download(details, org_ids, destination_path)
+        log.info("download successful", event_metric="download_success")
+
+    return register
+
+
 def rescrape_short(video: dict[Any, Any]) -> None:
     """Rescrape a video to update its stats."""
     log = logger.bind(video_id=video["id"])
@@ -66,23 +110,17 @@ def rescrape_short(video: dict[Any, Any]) -> None:
     update_video_stats(details, video["id"])
 
 
-def download_channel_shorts(
-    channel: str,
-    cursor: datetime,
-    storage_client: StorageClient,
-    org_ids: list[UUID],
-    num: int = 200,
-) -> datetime | None:
+@proxy_config.track
+@rate_limiter.track
+def channel_entries(channel: str, num: int = 200) -> list[dict[Any, Any] | None]:
+    """Fetch the entries of a channel's videos, some of which may be None."""
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
-    log = logger.new(channel=channel, cursor=cursor)
+    rate_limiter.acquire(PLATFORM, LISTING)
 
-    next_cursor = None
     opts = {
         "playlist_items": f"1:{num}",
         "retries": 5,
-        "sleep_interval": 10.0,
-        "max_sleep_interval": 20.0,
         "sleep_interval_requests": 1.0,
         "ignoreerrors": "only_download",
         "logtostderr": True,
@@ -91,7 +129,7 @@ def download_channel_shorts(
         "extract_flat": True,
     }
     with yt_dlp.YoutubeDL(opts) as ydl:
-        log.info(f"fetching entries for {channel}")
+        logger.info(f"fetching entries for {channel}")
         info = ydl.extract_info(f"https://tiktok.com/{channel}", download=False)
         if not info:
             raise ValueError("Empty info dict")
@@ -100,46 +138,83 @@ def download_channel_shorts(
         if not isinstance(entries, list):
             raise ValueError("No or malformed entries")
 
-        log.debug(f"{len(entries)} entries found..")
-        for i, entry in enumerate(entries):
-            log.bind(entry=entry)
-            log.info(f"processing {i + 1} of {len(entries)} for channel {channel}...")
-            if not entry:
-                log.info("entry is none, continuing...")
-                continue
+    return entries
 
-            buf = io.BytesIO()
-            try:
-                existing_video = api_client.get_video(entry["id"], PLATFORM)
-                if existing_video:
-                    update_video_stats(entry)
-                    continue
 
-                timestamp = datetime.fromtimestamp(entry["timestamp"])
-                if timestamp < (cursor - timedelta(days=14)):
-                    continue
+def download_channel_shorts(
+    channel: str,
+    cursor: datetime,
+    uploader: AsyncUploader,
+    org_ids: list[UUID],
+    num: int = 200,
+) -> datetime | None:
+    log = logger.new(channel=channel, cursor=cursor)
 
-                details = video_details(
-                    f"https://tiktok.com/{channel}/video/{entry['id']}", buf
-                )
-                destination_path = blob_name(channel, details)
-                destination_path = storage_client.upload_blob(destination_path, buf)
-                register_download(details, org_ids, destination_path)
-                log.info("download successful", event_metric="download_success")
+    next_cursor = None
+    entries = channel_entries(channel, num)
+    log.debug(f"{len(entries)} entries found..")
+    known_videos = get_videos([entry["id"] for entry in entries if entry])
+    # uploaded before, but not registered, e.g. because the core API was down
+    try:
+        stored = stored_ids(uploader.storage_client, f"{channel}/")
+    except Exception as ex:
+        log.warning("failed to list stored videos", exc_info=ex)
+        stored = {}
+    for i, entry in enumerate(entries):
+        log.bind(entry=entry)
+        log.info(f"processing {i + 1} of {len(entries)} for channel {channel}...")
+        if not entry:
+            log.info("entry is none, continuing...")
+            continue
 
-                if not next_cursor or timestamp > next_cursor:
-                    next_cursor = timestamp
+        buf = None
+        try:
+            existing_video = (
+                known_videos.get(entry["id"])
+                if known_videos is not None
+                else api_client.get_video(entry["id"], PLATFORM)
+            )
+            if existing_video:
+                update_video_stats(entry, existing_video["id"])
+                continue
 
-            except Exception as ex:
-                log.error(
-                    "exception with downloading, skipping entry",
-                    event_metric="download_failure",
-                    exc_info=ex,
+            timestamp = datetime.fromtimestamp(entry["timestamp"])
+            if timestamp < (cursor - timedelta(days=14)):
+                continue
+
+            url = f"https://tiktok.com/{channel}/video/{entry['id']}"
+            if stored_blob := stored.get(entry["id"]):
+                details = video_details(url)
+                destination_path = uploader.storage_client.blob_path(stored_blob)
+                register_download(details, org_ids, destination_path)
+                log.info(
+                    "video already stored, registered without downloading",
+                    event_metric="download_skipped",
+                )
+            else:
+                details, buf = download_video(url)
+                # registered once uploaded, while we get on with the next download
+                uploader.submit(
+                    blob_name(channel, details),
+                    buf,
+                    on_uploaded(details, org_ids, log),
                 )
-            finally:
+                buf = None
+
+            if not next_cursor or timestamp > next_cursor:
+                next_cursor = timestamp
+
+        except Exception as ex:
+            log.error(
+                "exception with downloading, skipping entry",
+                event_metric="download_failure",
+                exc_info=ex,
+            )
+        finally:
+            if buf is not None:
                 buf.close()
 
-        return next_cursor
+    return next_cursor
 
 
 def preprocess_channel_feeds(feeds: Iterable[ChannelFeed]) -> ChannelWatchers:
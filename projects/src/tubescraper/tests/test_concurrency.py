@@ -0,0 +1,43 @@
+import os
+import threading
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import pytest
+from scraper_common import AsyncUploader
+from structlog.contextvars import get_contextvars
+
+os.environ.setdefault("STORAGE_BUCKET_NAME", "local")
+
+from tubescraper import __main__ as tubescraper_main  # noqa: E402
+
+
+def test_run_workers_downloads_targets_concurrently_in_their_own_context():
+    targets = {f"channel_{i}": [uuid4()] for i in range(4)}
+    all_started = threading.Barrier(len(targets))
+    downloaded = {}
+
+    def download(target, org_ids, uploader):
+        tubescraper_main.bind_contextvars(channel_name=target)
+        all_started.wait(5)
+        downloaded[target] = (org_ids, get_contextvars()["channel_name"])
+
+    tubescraper_main.run_workers(
+        download, targets, uploader=MagicMock(spec=AsyncUploader), concurrency=4
+    )
+
+    assert downloaded == {target: (orgs, target) for target, orgs in targets.items()}
+    assert "channel_name" not in get_contextvars()
+
+
+def test_run_workers_raises_unexpected_errors():
+    def download(target, org_ids, uploader):
+        raise RuntimeError(target)
+
+    with pytest.raises(RuntimeError):
+        tubescraper_main.run_workers(
+            download,
+            {"channel_1": []},
+            uploader=MagicMock(spec=AsyncUploader),
+            concurrency=2,
+        )
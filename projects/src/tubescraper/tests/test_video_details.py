@@ -0,0 +1,75 @@
+import os
+import threading
+
+from scraper_common import RateLimiter
+from tubescraper import youtube
+
+
+class FakeYoutubeDL:
+    """Writes a download of the requested id to outtmpl, like yt-dlp does."""
+
+    all_started = threading.Barrier(2)
+
+    def __init__(self, params):
+        self.params = params
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        pass
+
+    def extract_info(self, url, download=True):
+        details = {"id": url, "ext": "mp4"}
+        if download:
+            path = self.params["outtmpl"] % details
+            with open(path, "wb") as f:
+                # both downloads are being written when either finishes
+                f.write(url.encode())
+                self.all_started.wait(5)
+                f.write(url.encode())
+            details["requested_downloads"] = [{"filepath": path}]
+        return details
+
+
+def test_concurrent_downloads_are_handed_on_from_their_own_files(
+    monkeypatch, tmp_path
+):
+    monkeypatch.setattr(youtube.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    monkeypatch.setattr(youtube, "rate_limiter", RateLimiter({}))
+    monkeypatch.setattr(youtube.download_buffers, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(
+        youtube.proxy_config, "get_proxy_details", lambda: ("http://proxy", 1)
+    )
+    downloads = {}
+
+    def download(entry_id):
+        downloads[entry_id] = youtube.download_video(entry_id)
+
+    threads = [
+        threading.Thread(target=download, args=(entry_id,))
+        for entry_id in ("first", "second")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for entry_id, (details, staged) in downloads.items():
+        assert details["id"] == entry_id
+        assert staged.name == details["requested_downloads"][0]["filepath"]
+        with staged:
+            assert staged.read() == entry_id.encode() * 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_details_only_leave_no_files_behind(monkeypatch, tmp_path):
+    monkeypatch.setattr(youtube.yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    monkeypatch.setattr(youtube, "rate_limiter", RateLimiter({}))
+    monkeypatch.setattr(youtube.download_buffers, "tmp_dir", str(tmp_path))
+    monkeypatch.setattr(
+        youtube.proxy_config, "get_proxy_details", lambda: ("http://proxy", 1)
+    )
+
+    assert youtube.video_details("first") == {"id": "first", "ext": "mp4"}
+    assert os.listdir(tmp_path) == []
@@ -1,14 +1,25 @@
+import contextvars
 import logging
 import os
 import random
 import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Iterable
 from uuid import UUID
 
 import click
 import structlog
 from pas_log import pas_setup_structlog
-from scraper_common import ChannelFeed, KeywordFeed
+from scraper_common import (
+    AsyncUploader,
+    ChannelFeed,
+    DedupStorageClient,
+    KeywordFeed,
+    TieredStorageClient,
+    drain_on_sigterm,
+    proxy_config,
+)
 from scraper_common.storage import (
     DiskStorageClient,
     GoogleCloudStorageClient,
@@ -16,7 +27,13 @@ from scraper_common.storage import (
 )
 from structlog.contextvars import bind_contextvars
 
-from tubescraper.coreapi import PLATFORM, api_client, fetch_cursor, update_cursor
+from tubescraper.coreapi import (
+    PLATFORM,
+    api_client,
+    fetch_cursor,
+    prefetch_cursors,
+    update_cursor,
+)
 from tubescraper.scrape import rescrape_short, scrape_shorts
 from tubescraper.youtube import channel_shorts, id_for_channel, keyword_shorts
 
@@ -29,15 +46,21 @@ STORAGE_PATH_PREFIX = "tubescraper"
 log_level = pas_setup_structlog()
 logging.getLogger(__name__).setLevel(log_level)
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
+drain_on_sigterm()
 
 
 def get_storage_client() -> StorageClient:
+    storage_client: StorageClient
     if STORAGE_BUCKET_NAME == "local":
-        return DiskStorageClient("youtube")
-    return GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
+        storage_client = DiskStorageClient("youtube")
+    else:
+        storage_client = TieredStorageClient.from_env(
+            GoogleCloudStorageClient(STORAGE_BUCKET_NAME, STORAGE_PATH_PREFIX)
+        )
+    return DedupStorageClient.from_env(storage_client)
 
 
-def preprocess_keyword_feeds(feeds: list[KeywordFeed]) -> TargetOrgMapping:
+def preprocess_keyword_feeds(feeds: Iterable[KeywordFeed]) -> TargetOrgMapping:
     """Deduplicates organisation ids from the feeds. We should probably do this in the
     api.
     """
@@ -59,71 +82,106 @@ def preprocess_channel_feeds(feeds: Iterable[ChannelFeed]) -> TargetOrgMapping:
     return result
 
 
-def channels_downloader(
-    channel_feeds: list[ChannelFeed], storage_client: StorageClient
+def run_workers(
+    download: Callable[[str, list[UUID], AsyncUploader], None],
+    targets: TargetOrgMapping,
+    uploader: AsyncUploader,
+    concurrency: int,
 ) -> None:
-    log = logger.bind()
-    channels = preprocess_channel_feeds(channel_feeds)
-    for i, (channel, orgs) in enumerate(channels.items()):
-        if i > 0:
-            sleep_for = random.uniform(10, 20)
-            log.info(f"sleeping {sleep_for:.1f}s between channels")
-            time.sleep(sleep_for)
+    """Download up to `concurrency` targets at a time.
+
+    Each target is downloaded in a context of its own, so the log context it
+    binds stays with it, and with a proxy of its own, see `ProxyConfig.pinned`.
+    An unexpected error cancels the targets not started yet and is raised.
+    """
 
-        _ = bind_contextvars(channel_name=channel)
-        log.info(f"archiving a new channel: {channel}")
+    def work(target: str, org_ids: list[UUID]) -> None:
+        with proxy_config.pinned():
+            download(target, org_ids, uploader)
 
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="worker") as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, work, target, org_ids)
+            for target, org_ids in targets.items()
+        ]
         try:
-            channel_id = id_for_channel(channel)
-            cursor = fetch_cursor(channel_id)
-            entries = channel_shorts(channel_id, SHORTS_PER_TARGET)
-            next_cursor = scrape_shorts(entries, cursor, storage_client, channel_id, orgs)
-            if next_cursor:
-                update_cursor(channel, next_cursor)
-        except ValueError as ex:
-            log.error(
-                "youtube error or media feed probably does not exist, skipping",
-                media_feed=channel,
-                exc_info=ex,
-            )
-            continue
+            for future in as_completed(futures):
+                future.result()
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
 
 
-def keywords_downloader(
-    keyword_feeds: list[KeywordFeed], storage_client: StorageClient
+def download_channel(channel: str, orgs: list[UUID], uploader: AsyncUploader) -> None:
+    log = logger.bind()
+    _ = bind_contextvars(channel_name=channel)
+    log.info(f"archiving a new channel: {channel}")
+
+    try:
+        channel_id = id_for_channel(channel)
+        cursor = fetch_cursor(channel_id)
+        entries = channel_shorts(channel_id, SHORTS_PER_TARGET)
+        next_cursor = scrape_shorts(entries, cursor, uploader, channel_id, orgs)
+        if next_cursor:
+            update_cursor(channel, next_cursor)
+    except ValueError as ex:
+        log.error(
+            "youtube error or media feed probably does not exist, skipping",
+            media_feed=channel,
+            exc_info=ex,
+        )
+
+
+def channels_downloader(
+    channel_feeds: Iterable[ChannelFeed],
+    uploader: AsyncUploader,
+    concurrency: int = 1,
+) -> None:
+    channels = preprocess_channel_feeds(channel_feeds)
+    prefetch_cursors()
+    run_workers(download_channel, channels, uploader, concurrency)
+
+
+def download_keyword(
+    keyword: str, org_ids: list[UUID], uploader: AsyncUploader
 ) -> None:
     log = logger.new()
+    bind_contextvars(keyword=keyword)
+    log.info(f"archiving a new keyword: {keyword}")
+
+    try:
+        cursor = fetch_cursor(keyword)
+        entries = keyword_shorts(keyword, SHORTS_PER_TARGET)
+        next_cursor = scrape_shorts(entries, cursor, uploader, keyword, org_ids)
+        if next_cursor:
+            update_cursor(keyword, next_cursor)
+    except ValueError as ex:
+        log.error(
+            "youtube error or search failed for keyword, skipping",
+            keyword=keyword,
+            exc_info=ex,
+        )
+
 
+def keywords_downloader(
+    keyword_feeds: Iterable[KeywordFeed],
+    uploader: AsyncUploader,
+    concurrency: int = 1,
+) -> None:
     processed_keywords = preprocess_keyword_feeds(keyword_feeds)
 
     # Process keywords in a random order to avoid always scraping the same ones
     keywords = list(processed_keywords.keys())
     random.shuffle(keywords)
+    prefetch_cursors()
 
-    for i, keyword in enumerate(keywords):
-        if i > 0:
-            sleep_for = random.uniform(10, 20)
-            log.info(f"sleeping {sleep_for:.1f}s between keywords")
-            time.sleep(sleep_for)
-
-        org_ids = processed_keywords[keyword]
-
-        bind_contextvars(keyword=keyword)
-        log.info(f"archiving a new keyword: {keyword}")
-
-        try:
-            cursor = fetch_cursor(keyword)
-            entries = keyword_shorts(keyword, SHORTS_PER_TARGET)
-            next_cursor = scrape_shorts(entries, cursor, storage_client, keyword, org_ids)
-            if next_cursor:
-                update_cursor(keyword, next_cursor)
-        except ValueError as ex:
-            log.error(
-                "youtube error or search failed for keyword, skipping",
-                keyword=keyword,
-                exc_info=ex,
-            )
-            continue
+    run_workers(
+        download_keyword,
+        {keyword: processed_keywords[keyword] for keyword in keywords},
+        uploader,
+        concurrency,
+    )
 
 
 def rescrape_shorts() -> None:
@@ -131,7 +189,9 @@ def rescrape_shorts() -> None:
 
     while True:
         log.info("starting new re-scrape pass")
-        for target in api_client.get_rescrape_targets(PLATFORM, min_age_hours=1, limit=100):
+        for target in api_client.iter_rescrape_targets(
+            PLATFORM, min_age_hours=1, limit=100
+        ):
             try:
                 log.info(f"rescraping {target['id']}")
                 rescrape_short(target)
@@ -141,7 +201,6 @@ def rescrape_shorts() -> None:
                     exc_info=ex,
                 )
                 continue
-            time.sleep(random.uniform(5, 15))
         log.info("re-scrape pass complete, cooling down")
         time.sleep(60)
 
@@ -152,26 +211,39 @@ def cli() -> None:
     pass
 
 
+concurrency_option = click.option(
+    "--concurrency",
+    default=1,
+    show_default=True,
+    envvar="SCRAPE_CONCURRENCY",
+    help="Number of targets scraped at the same time, each through its own proxy.",
+)
+
+
 @cli.command()
-def channels() -> None:
+@concurrency_option
+def channels(concurrency: int) -> None:
     """Scrape YouTube shorts from channels."""
     log = logger.new()
-    log.info("Tubescraper starting up...", mode="channels")
+    log.info("Tubescraper starting up...", mode="channels", concurrency=concurrency)
 
-    storage_client = get_storage_client()
-    channel_feeds = api_client.fetch_channel_feeds()
-    channels_downloader(channel_feeds, storage_client)
+    # the uploader drains before the core API client flushes its writes
+    with api_client, AsyncUploader.from_env(get_storage_client()) as uploader:
+        channel_feeds = api_client.iter_channel_feeds()
+        channels_downloader(channel_feeds, uploader, concurrency)
 
 
 @cli.command()
-def keywords() -> None:
+@concurrency_option
+def keywords(concurrency: int) -> None:
     """Scrape YouTube shorts from keywords."""
     log = logger.new()
-    log.info("Tubescraper starting up...", mode="keywords")
+    log.info("Tubescraper starting up...", mode="keywords", concurrency=concurrency)
 
-    storage_client = get_storage_client()
-    keyword_feeds = api_client.fetch_keyword_feeds()
-    keywords_downloader(keyword_feeds, storage_client)
+    # the uploader drains before the core API client flushes its writes
+    with api_client, AsyncUploader.from_env(get_storage_client()) as uploader:
+        keyword_feeds = api_client.iter_keyword_feeds()
+        keywords_downloader(keyword_feeds, uploader, concurrency)
 
 
 @cli.command()
@@ -179,7 +251,8 @@ def rescrape() -> None:
     """Rescrape YouTube shorts"""
     log = logger.new()
     log.info("Tubescraper starting up...", mode="rescrape")
-    rescrape_shorts()
+    with api_client:
+        rescrape_shorts()
 
 
 if __name__ == "__main__":
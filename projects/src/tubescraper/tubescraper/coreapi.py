@@ -4,25 +4,33 @@ from datetime import datetime, timedelta
 from typing import Any
 from uuid import UUID
 
+import requests
 import structlog
-from scraper_common import CoreAPIClient, Platform, Video
+from scraper_common import CoreAPIClient, FeedCache, Platform, SeenVideoIndex, Video
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
 API_URL = os.environ.get("API_URL", "http://localhost:8000/")
 API_KEY = json.loads(os.environ.get("API_KEYS", '["abc123"]'))[0]
 PLATFORM: Platform = "youtube"
+CURSOR_FLUSH_EVERY = int(os.environ.get("CURSOR_FLUSH_EVERY", 10))
 
-api_client = CoreAPIClient(API_URL, API_KEY)
+api_client = CoreAPIClient(
+    API_URL,
+    API_KEY,
+    seen_index=SeenVideoIndex.from_env(),
+    feed_cache=FeedCache.from_env(),
+    cursor_flush_every=CURSOR_FLUSH_EVERY,
+)
 
 
 def register_download(
     entry: dict[Any, Any], org_ids: list[UUID], destination_path: str
 ) -> bool:
-    """Register a downloaded YouTube video with the API.
+    """Queue a downloaded YouTube video for registration with the API.
 
     Returns:
-        True if registered successfully, False otherwise.
+        True if the video was queued, False if the entry is unusable.
     """
     if not entry:
         return False
@@ -53,21 +61,40 @@ def register_download(
         views=entry.get("view_count") or 0,
     )
 
-    return api_client.register_video_entry(video)
+    api_client.enqueue_video_entry(video)
+    return True
+
+
+def get_videos(
+    platform_video_ids: list[str],
+) -> dict[str, dict[str, Any] | None] | None:
+    """Look up the videos of a listing at once.
+
+    Returns:
+        The videos by id, or None if the lookup failed, in which case they have
+        to be looked up one by one.
+    """
+    try:
+        return api_client.get_videos(platform_video_ids, PLATFORM)
+    except requests.RequestException as ex:
+        logger.warning(
+            "failed to look up videos, looking them up one by one", exc_info=ex
+        )
+        return None
 
 
 def update_video_stats(entry: dict[Any, Any], video_id: str = "") -> bool:
-    """Updates the stats for a video.
+    """Queues a stats update for a video.
 
     Returns:
-        True if the stats are updated. False if not (e.g. because it doesn't exist)"""
+        True if the update is queued. False if not (e.g. because it doesn't exist)"""
     if not video_id:
         video = api_client.get_video(entry["id"], PLATFORM)
         if not video:
             return False
         video_id = video["id"]
 
-    api_client.update_video_stats(
+    api_client.enqueue_video_stats(
         id=video_id,
         views=entry.get("view_count") or 0,
         likes=entry.get("like_count") or 0,
@@ -77,6 +104,11 @@ def update_video_stats(entry: dict[Any, Any], video_id: str = "") -> bool:
     return True
 
 
+def prefetch_cursors() -> None:
+    """Loads the cursors for every target up front."""
+    api_client.prefetch_cursors(PLATFORM)
+
+
 def fetch_cursor(target: str) -> datetime:
     """Fetches the current cursor (last_video_datetime) for a given channel."""
     cursor = api_client.fetch_cursor(target, PLATFORM)
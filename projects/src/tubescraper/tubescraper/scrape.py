@@ -1,20 +1,19 @@
-import io
-import random
-import time
+from collections.abc import Callable
 from datetime import datetime, timedelta
 from typing import Any
 from uuid import UUID
 
 import structlog
-from scraper_common.storage import StorageClient
+from scraper_common import AsyncUploader, StorageClient, stored_ids
 
 from tubescraper.coreapi import (
     PLATFORM,
     api_client,
+    get_videos,
     register_download,
     update_video_stats,
 )
-from tubescraper.youtube import video_details
+from tubescraper.youtube import download_video, video_details
 
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
@@ -23,6 +22,18 @@ def blob_name(details: dict[Any, Any]) -> str:
     return f"{details['channel_id']}/{details['id']}.{details['ext']}"
 
 
+def on_uploaded(
+    details: dict[Any, Any], org_ids: list[UUID], log: structlog.BoundLogger
+) -> Callable[[str], None]:
+    """Completion callback registering an uploaded video with the core API."""
+
+    def register(destination_path: str) -> None:
+        register_download(details, org_ids, destination_path)
+        log.info("download successful", event_metric="download_success")
+
+    return register
+
+
 def rescrape_short(video: dict[Any, Any]) -> None:
     try:
         details = video_details(video["source_url"])
@@ -34,10 +45,35 @@ def rescrape_short(video: dict[Any, Any]) -> None:
     update_video_stats(details, video["id"])
 
 
+def stored_videos(
+    storage_client: StorageClient,
+    entries: list[dict[Any, Any]],
+    known_videos: dict[str, Any] | None,
+    target: str,
+) -> dict[str, str]:
+    """Blob names of the unregistered entries that are already stored, by id.
+
+    Each channel is listed once, rather than checking every entry. Every
+    entry counts as unregistered if `known_videos` is None.
+    """
+    channels = {
+        entry.get("channel_id") or target
+        for entry in entries
+        if known_videos is None or not known_videos.get(entry["id"])
+    }
+    stored: dict[str, str] = {}
+    for channel in channels:
+        try:
+            stored.update(stored_ids(storage_client, f"{channel}/"))
+        except Exception as ex:
+            logger.warning(f"failed to list stored videos of {channel}", exc_info=ex)
+    return stored
+
+
 def scrape_shorts(
     entries: list[dict[Any, Any]],
     cursor: datetime,
-    storage_client: StorageClient,
+    uploader: AsyncUploader,
     target: str,
     org_ids: list[UUID],
 ) -> datetime | None:
@@ -45,12 +81,9 @@ def scrape_shorts(
     next_cursor = None
 
     log.debug(f"{len(entries)} shorts found for {target}")
+    known_videos = get_videos([entry["id"] for entry in entries])
+    stored = stored_videos(uploader.storage_client, entries, known_videos, target)
     for i, entry in enumerate(entries):
-        if i > 0:
-            sleep_for = random.uniform(5, 15)
-            log.debug(f"sleeping {sleep_for:.1f}s between downloads")
-            time.sleep(sleep_for)
-
         log.bind(entry=entry)
         log.info(f"processing {i + 1} of {len(entries)} for {target}...")
 
@@ -58,10 +91,16 @@ def scrape_shorts(
         # timestamp information as part of the entry, so we have to download
         # videos until we reach the cursor (or something older than it). We
         # can however stop if we've seen a video before
-        existing_video = api_client.get_video(entry["id"], PLATFORM)
+        # uploaded before, but not registered, e.g. because the core API was down
+        stored_blob = stored.get(entry["id"])
         max_age_reached = False
-        buf = io.BytesIO() if not existing_video else None
+        buf = None
         try:
+            existing_video = (
+                known_videos.get(entry["id"])
+                if known_videos is not None
+                else api_client.get_video(entry["id"], PLATFORM)
+            )
             if existing_video:
                 # If we've seen less than a 10% growth in views, don't query for likes,
                 # comments, etc.
@@ -84,16 +123,28 @@ def scrape_shorts(
                 # any stats for videos we already have
                 continue
 
-            details = video_details(entry["id"], buf)
+            if stored_blob:
+                details = video_details(entry["id"])
+            else:
+                details, buf = download_video(entry["id"])
             timestamp = datetime.fromtimestamp(details["timestamp"])
             if timestamp < (cursor - timedelta(days=14)):
                 max_age_reached = True
                 continue
 
-            if buf:
-                destination_path = storage_client.upload_blob(blob_name(details), buf)
+            if stored_blob:
+                destination_path = uploader.storage_client.blob_path(stored_blob)
                 register_download(details, org_ids, destination_path)
-                log.info("download successful", event_metric="download_success")
+                log.info(
+                    "video already stored, registered without downloading",
+                    event_metric="download_skipped",
+                )
+            elif buf:
+                # registered once uploaded, while we get on with the next download
+                uploader.submit(
+                    blob_name(details), buf, on_uploaded(details, org_ids, log)
+                )
+                buf = None
 
             if not next_cursor or timestamp > next_cursor:
                 next_cursor = timestamp
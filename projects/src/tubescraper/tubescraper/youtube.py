@@ -1,23 +1,27 @@
-import contextlib
-import io
 import os
 from typing import Any, cast
 
 import structlog
 import yt_dlp
-from scraper_common import proxy_config
+from scraper_common import StagedFile, download_buffers, proxy_config, rate_limiter
+from scraper_common.ratelimit import LISTING, VIDEO
 from structlog.contextvars import bind_contextvars
 from tenacity import retry, stop_after_attempt, wait_exponential
 from yt_dlp.networking.impersonate import ImpersonateTarget
 
+from tubescraper.coreapi import PLATFORM
+
 logger: structlog.BoundLogger = structlog.get_logger(__name__)
 
 POT_PROVIDER_URL = os.environ.get("POT_PROVIDER_URL", "")
 
 
+@proxy_config.track
+@rate_limiter.track
 def id_for_channel(s: str) -> str:
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
+    rate_limiter.acquire(PLATFORM, LISTING)
     opts = {
         "extract_flat": False,
         "proxy": proxy_addr,
@@ -41,17 +45,18 @@ def id_for_channel(s: str) -> str:
 
 
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(min=30, max=120))
+@proxy_config.track
+@rate_limiter.track
 def channel_shorts(channel_id: str, num: int = 200) -> list[dict[Any, Any]]:
     """fetch channel video entries"""
 
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
+    rate_limiter.acquire(PLATFORM, LISTING)
 
     opts = {
         "playlist_items": f"1:{num}",
         "retries": 5,
-        "sleep_interval": 10.0,
-        "max_sleep_interval": 20.0,
         "sleep_interval_requests": 1.0,
         "impersonate": ImpersonateTarget(client="chrome"),
         "ignoreerrors": "only_download",
@@ -84,15 +89,16 @@ def channel_shorts(channel_id: str, num: int = 200) -> list[dict[Any, Any]]:
 
 
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(min=30, max=120))
+@proxy_config.track
+@rate_limiter.track
 def keyword_shorts(keyword, num: int = 200) -> list[dict[Any, Any]]:
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
+    rate_limiter.acquire(PLATFORM, LISTING)
 
     opts = {
         "playlist_items": f"1:{num}",
         "retries": 5,
-        "sleep_interval": 10.0,
-        "max_sleep_interval": 20.0,
         "sleep_interval_requests": 1.0,
         "impersonate": ImpersonateTarget(client="chrome"),
         "ignoreerrors": "only_download",
@@ -124,25 +130,50 @@ def keyword_shorts(keyword, num: int = 200) -> list[dict[Any, Any]]:
     return filtered
 
 
+def video_details(entry_id: str) -> dict[Any, Any]:
+    """Get details about a video."""
+    with download_buffers.staging_dir() as staging:
+        return _extract_video(entry_id, staging, download=False)
+
+
+def download_video(entry_id: str) -> tuple[dict[Any, Any], StagedFile]:
+    """Get details about a video and download the video file.
+
+    The video is downloaded into a directory of this call's own, as writing it
+    to stdout would keep downloads from running concurrently, and handed on
+    from there rather than copied into a buffer.
+
+    Returns:
+        The details and the downloaded file, which the caller owns and which is
+        removed when closed.
+    """
+    staging = download_buffers.staging_dir()
+    try:
+        details = _extract_video(entry_id, staging.name, download=True)
+        staged = StagedFile(details["requested_downloads"][0]["filepath"], staging)
+    except BaseException:
+        staging.cleanup()
+        raise
+    logger.debug(
+        f"downloaded bytes: {os.fstat(staged.fileno()).st_size}",
+        request_rate=rate_limiter.rate(PLATFORM, VIDEO),
+    )
+    return details, staged
+
+
 @retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(min=30, max=120))
-def video_details(entry_id: str, buf: io.BytesIO | None = None) -> dict[Any, Any]:
-    """Get details about a video. If buf is specified, download the video file
-    into the buffer."""
+@proxy_config.track
+@rate_limiter.track
+def _extract_video(entry_id: str, staging: str, download: bool) -> dict[Any, Any]:
     proxy_addr, proxy_id = proxy_config.get_proxy_details()
     bind_contextvars(proxy_id=proxy_id)
-
-    download = True
-    if not buf:
-        download = False
-        buf = io.BytesIO()
+    rate_limiter.acquire(PLATFORM, VIDEO)
 
     # 18 (360p mp4) is the only format that doesn't require ffmpeg post-processing.
     # if we use any other format yt-dlp has to merge video and audio streams
-    # separately, which results in the output not correctly being written to stdout
-    # (something to do with subprocesses? not sure) so this is something to consider
-    # when making a change here
+    # separately with ffmpeg, which isn't available everywhere we run, so this is
+    # something to consider when making a change here
     ctx = {
-        "outtmpl": "-",
         "logtostderr": True,
         "format": "18",
         "proxy": proxy_addr,
@@ -155,11 +186,59 @@ def video_details(entry_id: str, buf: io.BytesIO | None = None) -> dict[Any, Any
             },
             "youtubepot-bgutilhttp": {"base_url": [POT_PROVIDER_URL]},
         },
+        "outtmpl": os.path.join(staging, "%(id)s.%(ext)s"),
     }
-    buf.seek(0)
-    with contextlib.redirect_stdout(buf), yt_dlp.YoutubeDL(ctx) as video:  # type: ignore
+    with yt_dlp.YoutubeDL(ctx) as video:
         details = video.extract_info(entry_id, download=download)
-        details = cast(dict[Any, Any], details)
-    logger.debug(f"downloaded bytes: {buf.tell()}")
-    buf.seek(0)
-    return details
+    return cast(dict[Any, Any], details)
+
+
+@retry(reraise=True, stop=stop_after_attempt(3), wait=wait_exponential(min=30, max=120))
+@proxy_config.track
+@rate_limiter.track
+def _extract_video(
+    entry_id: str, download: bool
+) -> tuple[dict[Any, Any], StagedFile | None]:
+    proxy_addr, proxy_id = proxy_config.get_proxy_details()
+    bind_contextvars(proxy_id=proxy_id)
+    rate_limiter.acquire(PLATFORM, VIDEO)
+
+    # 18 (360p mp4) is the only format that doesn't require ffmpeg post-processing.
+    # if we use any other format yt-dlp has to merge video and audio streams
+    # separately with ffmpeg, which isn't available everywhere we run, so this is
+    # something to consider when making a change here
+    ctx = {
+        "logtostderr": True,
+        "format": "18",
+        "proxy": proxy_addr,
+        "impersonate": ImpersonateTarget(client="chrome"),
+        "extractor_args": {
+            "youtube": {
+                "player_skip": ["configs", "initial_data"],
+                "skip": ["dash", "hls", "translated_subs", "subs"],
+                "player_js_version": ["actual"],
+            },
+            "youtubepot-bgutilhttp": {"base_url": [POT_PROVIDER_URL]},
+        },
+    }
+    # the video is downloaded into a directory of this call's own, as writing it
+    # to stdout would keep downloads from running concurrently, and handed on as
+    # it is there rather than copied again
+    staging = download_buffers.staging_dir()
+    try:
+        ctx["outtmpl"] = os.path.join(staging.name, "%(id)s.%(ext)s")
+        with yt_dlp.YoutubeDL(ctx) as video:
+            details = video.extract_info(entry_id, download=download)
+            details = cast(dict[Any, Any], details)
+        if not download:
+            staging.cleanup()
+            return details, None
+        staged = StagedFile(details["requested_downloads"][0]["filepath"], staging)
+    except BaseException:
+        staging.cleanup()
+        raise
+    logger.debug(
+        f"downloaded bytes: {os.fstat(staged.fileno()).st_size}",
+        request_rate=rate_limiter.rate(PLATFORM, VIDEO),
+    )
+    return details, staged
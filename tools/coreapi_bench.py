@@ -0,0 +1,91 @@
+"""Benchmark CoreAPIClient request throughput against a local stand-in API.
+
+Compares the old one-connection-per-call behaviour (module-level ``requests``
+calls) with the pooled, keep-alive session owned by CoreAPIClient.
+
+Usage:
+    uv run python tools/coreapi_bench.py --requests 500 --threads 4
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from scraper_common import CoreAPIClient
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Answers every /videos/filter call with an empty result."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+        body = json.dumps({"data": []}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def unpooled_get_video(api_url: str, video_id: str) -> None:
+    with requests.post(
+        f"{api_url}/videos/filter",
+        json={"metadata": f'$.youtube_id == "{video_id}"'},
+        headers={"X-API-TOKEN": "bench"},
+    ) as resp:
+        resp.json()
+
+
+def run(name: str, fn: Callable[[str], object], total: int, threads: int) -> float:
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(fn, (f"vid{i}" for i in range(total))))
+    elapsed = time.perf_counter() - start
+    rps = total / elapsed
+    print(f"{name:>10}: {total} requests in {elapsed:.2f}s ({rps:.0f} req/s)")
+    return rps
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        before = run(
+            "unpooled",
+            lambda vid: unpooled_get_video(api_url, vid),
+            args.requests,
+            args.threads,
+        )
+        with CoreAPIClient(api_url, "bench", pool_maxsize=args.threads) as client:
+            after = run(
+                "pooled",
+                lambda vid: client.get_video(vid, "youtube"),
+                args.requests,
+                args.threads,
+            )
+        print(f"speedup: {after / before:.2f}x")
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""A local stand-in for core-api, for exercising CoreAPIClient without the real thing.
+
+Implements every endpoint CoreAPIClient uses, backed by an in-memory dataset of
+feeds, videos and cursors, with configurable latency and error rate. Feed pages
+carry an ETag and answer If-None-Match with 304, like the real API.
+
+Usage:
+    uv run python tools/fake_coreapi.py --port 8000 --latency 0.02 --error-rate 0.01
+
+It can also be started in-process, which is what tools/loadtest.py does:
+
+    with FakeCoreAPI(videos=1000) as api:
+        client = CoreAPIClient(api.url, "fake")
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlsplit
+
+PLATFORMS = ("youtube", "tiktok", "instagram")
+
+# matches one predicate of a /videos/filter query, e.g. $.youtube_id == "abc"
+FILTER_PREDICATE = re.compile(r'\$\.(\w+)_id == ("(?:[^"\\]|\\.)*")')
+
+CURSOR_PATH = re.compile(r"^/media_feeds/cursors/([^/]+)/(\w+)$")
+VIDEO_PATH = re.compile(r"^/videos/([^/]+)$")
+
+
+def channel_name(platform: str, n: int) -> str:
+    """Name of the n-th generated channel on a platform."""
+    return f"chan{n}" if platform == "instagram" else f"@chan{n}"
+
+
+def video_id(platform: str, n: int) -> str:
+    """Platform id of the n-th generated video on a platform."""
+    return str(10**15 + n) if platform == "instagram" else f"{platform[:2]}{n:09d}"
+
+
+class Dataset:
+    """In-memory feeds, videos and cursors, shared by all request handler threads.
+
+    Args:
+        channels: Number of channel feeds per platform.
+        keywords: Number of keyword feeds.
+        videos: Number of videos already registered per platform.
+        seed: Seed for the generated data.
+    """
+
+    def __init__(
+        self, channels: int = 50, keywords: int = 20, videos: int = 1000, seed: int = 0
+    ):
+        rng = random.Random(seed)
+        self.lock = threading.Lock()
+        orgs = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(5)]
+
+        self.channel_feeds = [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "organisation_id": rng.choice(orgs),
+                "is_archived": False,
+                "platform": platform,
+                "channel": channel_name(platform, n),
+            }
+            for platform in PLATFORMS
+            for n in range(channels)
+        ]
+        self.keyword_feeds = [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "organisation_id": rng.choice(orgs),
+                "is_archived": False,
+                "topic": f"topic{n}",
+                "keywords": [f"keyword{n}", f"keyword{n + 1}"],
+            }
+            for n in range(keywords)
+        ]
+
+        # (platform, platform video id) -> video
+        self.videos: dict[tuple[str, str], dict[str, Any]] = {}
+        self.videos_by_id: dict[str, dict[str, Any]] = {}
+        now = datetime.now()
+        for platform in PLATFORMS:
+            for n in range(videos):
+                uploaded_at = now - timedelta(hours=rng.uniform(1, 24 * 30))
+                self.add_video(
+                    {
+                        "platform": platform,
+                        "title": f"video {n}",
+                        "description": None,
+                        "source_url": f"https://{platform}.test/{video_id(platform, n)}",
+                        "channel": channel_name(platform, n % max(channels, 1)),
+                        "channel_followers": rng.randrange(100_000),
+                        "views": rng.randrange(1_000_000),
+                        "comments": rng.randrange(1000),
+                        "likes": rng.randrange(10_000),
+                        "destination_path": f"chan/{video_id(platform, n)}.mp4",
+                        "uploaded_at": uploaded_at.isoformat(),
+                        "metadata": {f"{platform}_id": video_id(platform, n)},
+                    },
+                    scraped_at=now - timedelta(hours=rng.uniform(0, 48)),
+                )
+
+        # (target, platform) -> cursor
+        self.cursors: dict[tuple[str, str], dict[str, Any]] = {}
+
+    def add_video(self, video: dict[str, Any], scraped_at: datetime) -> dict[str, Any]:
+        platform = video["platform"]
+        video = {**video, "id": str(uuid.uuid4()), "scraped_at": scraped_at}
+        self.videos[(platform, video["metadata"][f"{platform}_id"])] = video
+        self.videos_by_id[video["id"]] = video
+        return video
+
+
+def _public(video: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in video.items() if k != "scraped_at"}
+
+
+type Reply = tuple[int, Any, dict[str, str]]
+
+
+def _reply_page(
+    items: list[dict[str, Any]],
+    query: dict[str, str],
+    if_none_match: str | None = None,
+) -> Reply:
+    """Slice a limit/offset page out of items, with an ETag if asked to."""
+    offset = int(query.get("offset", 0))
+    limit = int(query.get("limit", len(items)))
+    data = {"data": items[offset : offset + limit]}
+    if if_none_match is None:
+        return 200, data, {}
+
+    etag = '"' + hashlib.sha1(json.dumps(data).encode()).hexdigest() + '"'
+    if if_none_match == etag:
+        return 304, None, {"ETag": etag}
+    return 200, data, {"ETag": etag}
+
+
+class FakeCoreAPIHandler(BaseHTTPRequestHandler):
+    """Routes core-api requests to the dataset of the server it belongs to."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeCoreAPIServer"
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self._handle("GET")
+
+    def do_POST(self) -> None:
+        self._handle("POST")
+
+    def do_PATCH(self) -> None:
+        self._handle("PATCH")
+
+    def _handle(self, method: str) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length)) if length else None
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+
+        if self.server.latency:
+            time.sleep(random.expovariate(1 / self.server.latency))
+        if random.random() < self.server.error_rate:
+            self._reply(503, {"error": "injected failure"})
+            return
+
+        dataset = self.server.dataset
+        etag = self.headers.get("If-None-Match", "")
+        with dataset.lock:
+            match (method, url.path):
+                case ("GET", "/media_feeds/channels"):
+                    reply = _reply_page(dataset.channel_feeds, query, etag)
+                case ("GET", "/media_feeds/keywords"):
+                    reply = _reply_page(dataset.keyword_feeds, query, etag)
+                case ("GET", "/media_feeds/cursors"):
+                    reply = self._list_cursors(query)
+                case ("GET" | "POST", path) if m := CURSOR_PATH.match(path):
+                    reply = self._cursor(method, unquote(m[1]), m[2], body)
+                case ("POST", "/videos/filter"):
+                    reply = self._filter_videos(body)
+                case ("POST", "/videos"):
+                    reply = self._register_video(body)
+                case ("GET", "/videos/by-expected-views"):
+                    reply = self._rescrape_targets(query)
+                case ("PATCH", path) if m := VIDEO_PATH.match(path):
+                    reply = self._update_video(m[1], body)
+                case _:
+                    reply = 404, {"error": "not found"}, {}
+        self._reply(*reply)
+
+    def _reply(
+        self, status: int, data: Any = None, headers: dict[str, str] | None = None
+    ) -> None:
+        body = json.dumps(data, default=str).encode() if data is not None else b""
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _list_cursors(self, query: dict[str, str]) -> Reply:
+        platform = query.get("platform")
+        cursors = [
+            c for (_, p), c in self.server.dataset.cursors.items() if p == platform
+        ]
+        return _reply_page(cursors, query)
+
+    def _cursor(
+        self, method: str, target: str, platform: str, body: dict[str, Any] | None
+    ) -> Reply:
+        cursors = self.server.dataset.cursors
+        if method == "GET":
+            if (target, platform) not in cursors:
+                return 404, {"error": "cursor not found"}, {}
+            return 200, {"data": cursors[(target, platform)]}, {}
+
+        cursor = cursors.setdefault(
+            (target, platform),
+            {"id": str(uuid.uuid4()), "target": target, "platform": platform},
+        )
+        cursor["cursor"] = body or {}
+        return 200, {"data": cursor}, {}
+
+    def _filter_videos(self, body: dict[str, Any] | None) -> Reply:
+        videos = self.server.dataset.videos
+        query = (body or {}).get("metadata", "")
+        matches = [
+            _public(video)
+            for platform, raw_id in FILTER_PREDICATE.findall(query)
+            if (video := videos.get((platform, json.loads(raw_id))))
+        ]
+        return 200, {"data": matches}, {}
+
+    def _register_video(self, body: dict[str, Any] | None) -> Reply:
+        body = body or {}
+        platform = body.get("platform", "")
+        platform_video_id = (body.get("metadata") or {}).get(f"{platform}_id")
+        if not platform_video_id:
+            return 422, {"error": "missing platform id"}, {}
+        if (platform, platform_video_id) in self.server.dataset.videos:
+            return 409, {"error": "video already exists"}, {}
+        video = self.server.dataset.add_video(body, scraped_at=datetime.now())
+        return 201, {"data": _public(video)}, {}
+
+    def _rescrape_targets(self, query: dict[str, str]) -> Reply:
+        cutoff = datetime.now() - timedelta(hours=float(query.get("min_age_hours", 1)))
+        due = sorted(
+            (
+                video
+                for video in self.server.dataset.videos_by_id.values()
+                if video["platform"] == query.get("platform")
+                and video["scraped_at"] < cutoff
+            ),
+            key=lambda video: video["views"] or 0,
+            reverse=True,
+        )
+        return _reply_page([_public(video) for video in due], query)
+
+    def _update_video(self, id: str, body: dict[str, Any] | None) -> Reply:
+        video = self.server.dataset.videos_by_id.get(id)
+        if video is None:
+            return 404, {"error": "video not found"}, {}
+        video.update(body or {})
+        video["scraped_at"] = datetime.now()
+        return 200, {"data": _public(video)}, {}
+
+
+class FakeCoreAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        dataset: Dataset,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+    ):
+        super().__init__(address, FakeCoreAPIHandler)
+        self.dataset = dataset
+        self.latency = latency
+        self.error_rate = error_rate
+
+
+class FakeCoreAPI:
+    """Runs a fake core-api in a background thread.
+
+    Args:
+        latency: Mean latency in seconds added to every request. Latencies are
+            drawn from an exponential distribution, so there is a long tail.
+        error_rate: Fraction of requests answered with 503 Service Unavailable.
+        channels: Number of channel feeds per platform.
+        keywords: Number of keyword feeds.
+        videos: Number of videos already registered per platform.
+        seed: Seed for the generated data.
+        port: Port to listen on, or 0 for any free port.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        channels: int = 50,
+        keywords: int = 20,
+        videos: int = 1000,
+        seed: int = 0,
+        port: int = 0,
+    ):
+        self.dataset = Dataset(channels, keywords, videos, seed)
+        self.server = FakeCoreAPIServer(
+            ("127.0.0.1", port), self.dataset, latency, error_rate
+        )
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="fake-core-api", daemon=True
+        )
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self) -> "FakeCoreAPI":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeCoreAPI":
+        return self.start()
+
+    def __exit__(self, *_: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--keywords", type=int, default=20)
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    api = FakeCoreAPI(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        channels=args.channels,
+        keywords=args.keywords,
+        videos=args.videos,
+        seed=args.seed,
+        port=args.port,
+    )
+    print(f"fake core-api listening on {api.url}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""A fake of the parts of the GCS JSON API that GoogleCloudStorageClient uses.
+
+Serves resumable and multipart uploads, compose, get, list and delete for any
+bucket, so storage clients can be exercised and benchmarked without a real
+bucket. Object data is kept in a temporary directory, not in memory, so a
+benchmark sharing a machine with the fake isn't charged for its memory.
+
+Point google-cloud-storage at it with the STORAGE_EMULATOR_HOST environment
+variable.
+
+Usage:
+    uv run python tools/fake_gcs.py --port 9023
+    STORAGE_EMULATOR_HOST=http://127.0.0.1:9023 uv run python ...
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import google_crc32c
+
+OBJECT_PATH = re.compile(r"^/storage/v1/b/([^/]+)/o/([^/]+)(/compose)?$")
+LIST_PATH = re.compile(r"^/storage/v1/b/([^/]+)/o$")
+UPLOAD_PATH = re.compile(r"^/upload/storage/v1/b/([^/]+)/o$")
+CONTENT_RANGE = re.compile(r"^bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)$")
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ObjectStore:
+    """Objects of all buckets, with their data in files under `directory`."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.objects: dict[tuple[str, str], dict[str, Any]] = {}
+        # resumable upload sessions: id -> (bucket, metadata, data file)
+        self.sessions: dict[str, tuple[str, dict[str, Any], str]] = {}
+
+    def new_file(self) -> str:
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        os.close(fd)
+        return path
+
+    def store(self, bucket: str, metadata: dict[str, Any], path: str) -> dict[str, Any]:
+        """Finish writing an object, replacing any object of the same name."""
+        crc = google_crc32c.Checksum()
+        md5 = hashlib.md5()
+        size = 0
+        with open(path, "rb") as f:
+            while chunk := f.read(COPY_CHUNK_SIZE):
+                crc.update(chunk)
+                md5.update(chunk)
+                size += len(chunk)
+        name = metadata["name"]
+        with self.lock:
+            previous = self.objects.get((bucket, name))
+            resource = {
+                "kind": "storage#object",
+                "id": f"{bucket}/{name}",
+                "bucket": bucket,
+                "name": name,
+                "size": str(size),
+                "contentType": metadata.get("contentType", "application/octet-stream"),
+                "metadata": metadata.get("metadata") or {},
+                "crc32c": base64.b64encode(crc.digest()).decode(),
+                "md5Hash": base64.b64encode(md5.digest()).decode(),
+                "generation": str(int(previous["generation"]) + 1 if previous else 1),
+                "metageneration": "1",
+                "_path": path,
+            }
+            self.objects[(bucket, name)] = resource
+        if previous:
+            os.unlink(previous["_path"])
+        return resource
+
+    def get(self, bucket: str, name: str) -> dict[str, Any] | None:
+        with self.lock:
+            return self.objects.get((bucket, name))
+
+    def delete(self, bucket: str, name: str) -> bool:
+        with self.lock:
+            resource = self.objects.pop((bucket, name), None)
+        if resource is None:
+            return False
+        os.unlink(resource["_path"])
+        return True
+
+    def list(self, bucket: str, prefix: str) -> list[dict[str, Any]]:
+        with self.lock:
+            return sorted(
+                (
+                    r
+                    for (b, n), r in self.objects.items()
+                    if b == bucket and n.startswith(prefix)
+                ),
+                key=lambda r: r["name"],
+            )
+
+
+def public(resource: dict[str, Any]) -> dict[str, Any]:
+    return {k: v for k, v in resource.items() if not k.startswith("_")}
+
+
+class FakeGCSHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeGCSServer"
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+    @property
+    def store(self) -> ObjectStore:
+        return self.server.store
+
+    def reply(
+        self, status: int, body: Any = None, headers: dict[str, str] | None = None
+    ) -> None:
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def error(self, status: int, message: str) -> None:
+        self.reply(status, {"error": {"code": status, "message": message}})
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def copy_body(self, f: Any) -> None:
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining:
+            chunk = self.rfile.read(min(remaining, COPY_CHUNK_SIZE))
+            f.write(chunk)
+            remaining -= len(chunk)
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if match := OBJECT_PATH.match(url.path):
+            resource = self.store.get(match[1], unquote(match[2]))
+            if resource is None:
+                return self.error(404, "No such object")
+            return self.reply(200, public(resource))
+        if match := LIST_PATH.match(url.path):
+            prefix = query.get("prefix", [""])[0]
+            items = [public(r) for r in self.store.list(match[1], prefix)]
+            return self.reply(200, {"kind": "storage#objects", "items": items})
+        self.error(404, "Not found")
+
+    def do_DELETE(self) -> None:
+        url = urlsplit(self.path)
+        if (match := OBJECT_PATH.match(url.path)) and self.store.delete(
+            match[1], unquote(match[2])
+        ):
+            return self.reply(204)
+        self.error(404, "No such object")
+
+    def do_POST(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        if (match := OBJECT_PATH.match(url.path)) and match[3]:
+            return self.compose(
+                match[1], unquote(match[2]), json.loads(self.read_body())
+            )
+        if match := UPLOAD_PATH.match(url.path):
+            upload_type = query.get("uploadType", [""])[0]
+            if upload_type == "resumable":
+                return self.start_resumable(match[1], query)
+            if upload_type == "multipart":
+                return self.multipart(match[1], query)
+        self.error(404, "Not found")
+
+    def do_PUT(self) -> None:
+        url = urlsplit(self.path)
+        session_id = parse_qs(url.query).get("upload_id", [""])[0]
+        with self.store.lock:
+            session = self.store.sessions.get(session_id)
+        if session is None:
+            return self.error(404, "No such upload")
+        bucket, metadata, path = session
+
+        match = CONTENT_RANGE.match(self.headers.get("Content-Range", ""))
+        if not match:
+            return self.error(400, "Bad Content-Range")
+        with open(path, "ab") as f:
+            self.copy_body(f)
+            written = f.tell()
+        if match[3] == "*":
+            return self.reply(308, headers={"Range": f"bytes=0-{written - 1}"})
+
+        with self.store.lock:
+            del self.store.sessions[session_id]
+        self.reply(200, public(self.store.store(bucket, metadata, path)))
+
+    def precondition_failed(self, bucket: str, name: str, query: dict) -> bool:
+        match = query.get("ifGenerationMatch", [None])[0]
+        if match is None:
+            return False
+        resource = self.store.get(bucket, name)
+        generation = resource["generation"] if resource else "0"
+        return generation != match
+
+    def start_resumable(self, bucket: str, query: dict) -> None:
+        body = self.read_body()
+        metadata = json.loads(body) if body else {}
+        metadata.setdefault("name", query.get("name", [""])[0])
+        if self.precondition_failed(bucket, metadata["name"], query):
+            return self.error(412, "Precondition failed")
+        session_id = uuid.uuid4().hex
+        with self.store.lock:
+            self.store.sessions[session_id] = (bucket, metadata, self.store.new_file())
+        host = self.headers.get("Host")
+        location = (
+            f"http://{host}/upload/storage/v1/b/{bucket}/o"
+            f"?uploadType=resumable&upload_id={session_id}"
+        )
+        self.reply(200, headers={"Location": location})
+
+    def multipart(self, bucket: str, query: dict) -> None:
+        boundary = self.headers.get_param("boundary")
+        if not isinstance(boundary, str):
+            return self.error(400, "Missing boundary")
+        body = self.read_body()
+        parts = body.split(b"--" + boundary.encode())[1:-1]
+        metadata_part, data_part = (part.split(b"\r\n\r\n", 1)[1] for part in parts)
+        metadata = json.loads(metadata_part)
+        if self.precondition_failed(bucket, metadata["name"], query):
+            return self.error(412, "Precondition failed")
+        path = self.store.new_file()
+        with open(path, "wb") as f:
+            f.write(data_part.removesuffix(b"\r\n"))
+        self.reply(200, public(self.store.store(bucket, metadata, path)))
+
+    def compose(self, bucket: str, name: str, request: dict[str, Any]) -> None:
+        sources = [self.store.get(bucket, s["name"]) for s in request["sourceObjects"]]
+        if any(source is None for source in sources):
+            return self.error(404, "No such source object")
+        path = self.store.new_file()
+        with open(path, "wb") as out:
+            for source in sources:
+                assert source is not None
+                with open(source["_path"], "rb") as f:
+                    shutil.copyfileobj(f, out, COPY_CHUNK_SIZE)
+        metadata = {**request.get("destination", {}), "name": name}
+        self.reply(200, public(self.store.store(bucket, metadata, path)))
+
+
+class FakeGCSServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int, directory: str):
+        super().__init__(("127.0.0.1", port), FakeGCSHandler)
+        self.store = ObjectStore(directory)
+
+
+class FakeGCS:
+    """Runs a fake GCS server in a background thread while used as a context.
+
+    Args:
+        port: Port to listen on, 0 for any free port.
+    """
+
+    def __init__(self, port: int = 0):
+        self._tmp = tempfile.TemporaryDirectory(prefix="fake-gcs-")
+        self.server = FakeGCSServer(port, self._tmp.name)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self) -> "FakeGCS":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self._tmp.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9023)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="fake-gcs-") as directory:
+        server = FakeGCSServer(args.port, directory)
+        print(f"fake GCS listening on http://127.0.0.1:{server.server_port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""Load test a scraper's core API traffic against tools/fake_coreapi.py.
+
+Runs the real tubescraper, tokscraper or instascraper loop with the platform side
+(yt-dlp, Instagram) replaced by fakes that answer instantly or after
+--platform-latency, and with the request pacing of the rate limiter removed. Every
+core API response is timed, and throughput plus p50/p95/p99 latencies per
+endpoint are reported at the end.
+
+Rescrape loops run forever, so in rescrape mode a single pass is made.
+
+Usage:
+    uv run python tools/loadtest.py tubescraper channels --latency 0.02
+    uv run python tools/loadtest.py tokscraper rescrape --error-rate 0.01
+    uv run python tools/loadtest.py instascraper channels --json
+
+Pass --api-url to drive an already running fake (or real) core-api instead of an
+in-process one.
+"""
+
+import argparse
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import IO, Any
+from unittest import mock
+from urllib.parse import urlsplit
+
+import requests
+from fake_coreapi import CURSOR_PATH, VIDEO_PATH, FakeCoreAPI, video_id
+
+MODES = {
+    "tubescraper": ("channels", "keywords", "rescrape"),
+    "tokscraper": ("channels", "rescrape"),
+    "instascraper": ("channels",),
+}
+PLATFORMS = {
+    "tubescraper": "youtube",
+    "tokscraper": "tiktok",
+    "instascraper": "instagram",
+}
+
+# modules pacing requests to the platform with scraper_common's rate limiter
+PACED_MODULES = {
+    "tubescraper": "tubescraper.youtube",
+    "tokscraper": "tokscraper.scrape",
+    "instascraper": "instascraper.instagram",
+}
+
+
+class FakePlatform:
+    """Generates listings and downloads in place of the real platform.
+
+    Each listed entry is, with probability `known_ratio`, one of the `videos`
+    videos the fake core-api was seeded with, and otherwise a new video.
+    """
+
+    def __init__(
+        self,
+        platform: str,
+        entries: int,
+        videos: int,
+        known_ratio: float,
+        latency: float,
+        video_size: int,
+        seed: int,
+    ):
+        self.platform = platform
+        self.entries = entries
+        self.videos = videos
+        self.known_ratio = known_ratio
+        self.latency = latency
+        self.video = os.urandom(video_size)
+        self._rng = random.Random(seed)
+        self._new_ids = itertools.count(videos)
+        self._lock = threading.Lock()
+        self.listed = 0
+        self.looked_up = 0
+        self.downloaded = 0
+
+    def _wait(self) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _video_id(self) -> str:
+        with self._lock:
+            if self.videos and self._rng.random() < self.known_ratio:
+                return video_id(self.platform, self._rng.randrange(self.videos))
+            return video_id(self.platform, next(self._new_ids))
+
+    def _timestamp(self) -> float:
+        age = timedelta(hours=self._rng.uniform(0, 24 * 7))
+        return (datetime.now() - age).timestamp()
+
+    def listing(self, target: str) -> list[dict[str, Any]]:
+        """Entries of a channel or keyword, as yt-dlp lists them."""
+        self._wait()
+        entries = []
+        for _ in range(self.entries):
+            id = self._video_id()
+            entries.append(
+                {
+                    "id": id,
+                    "url": f"https://{self.platform}.test/shorts/{id}",
+                    "timestamp": self._timestamp(),
+                    "view_count": self._rng.randrange(2_000_000),
+                }
+            )
+        self.listed += len(entries)
+        return entries
+
+    def details(self, url: str, buf: IO[bytes] | None = None) -> dict[str, Any]:
+        """Details of a video as yt-dlp returns them, downloading it into buf."""
+        self._wait()
+        id = url.rstrip("/").rsplit("/", 1)[-1]
+        if buf is None:
+            self.looked_up += 1
+        else:
+            buf.write(self.video)
+            buf.seek(0)
+            self.downloaded += 1
+        return {
+            "id": id,
+            "ext": "mp4",
+            "video_ext": "mp4",
+            "channel_id": "chan",
+            "uploader": "chan",
+            "uploader_id": "@chan",
+            "timestamp": self._timestamp(),
+            "title": f"video {id}",
+            "description": None,
+            "webpage_url": url,
+            "original_url": url,
+            "view_count": self._rng.randrange(2_000_000),
+            "like_count": self._rng.randrange(10_000),
+            "comment_count": self._rng.randrange(1000),
+            "channel_follower_count": self._rng.randrange(100_000),
+        }
+
+    def instagram_profile(self, username: str, _session: Any) -> Any:
+        """An Instagram profile whose timeline holds `entries` reels."""
+        from instascraper.instagram import Profile
+
+        self._wait()
+        nodes = []
+        for _ in range(self.entries):
+            id = self._video_id()
+            nodes.append(
+                {
+                    "node": {
+                        "__typename": "GraphVideo",
+                        "id": id,
+                        "shortcode": f"sc{id}",
+                        "video_view_count": self._rng.randrange(2_000_000),
+                        "edge_liked_by": {"count": self._rng.randrange(10_000)},
+                        "edge_media_to_comment": {"count": self._rng.randrange(1000)},
+                        "edge_media_to_caption": {"edges": []},
+                        "taken_at_timestamp": self._timestamp(),
+                        "video_url": f"https://instagram.test/{id}.mp4",
+                    }
+                }
+            )
+        self.listed += len(nodes)
+        return Profile(
+            id=username,
+            username=username,
+            display_name=username,
+            followers=self._rng.randrange(100_000),
+            following=0,
+            raw={"edge_owner_to_timeline_media": {"edges": nodes}},
+        )
+
+    @contextmanager
+    def reel_stream(self, _session: Any) -> Iterator[IO[bytes]]:
+        """Replaces Reel.video_stream, whose reel it doesn't need."""
+        self._wait()
+        self.downloaded += 1
+        yield io.BytesIO(self.video)
+
+
+class FakeYoutubeDL:
+    """Just enough of yt_dlp.YoutubeDL for tokscraper's channel listing."""
+
+    platform: FakePlatform
+
+    def __init__(self, _opts: dict[str, Any]):
+        pass
+
+    def __enter__(self) -> "FakeYoutubeDL":
+        return self
+
+    def __exit__(self, *_: Any) -> None:
+        pass
+
+    def extract_info(self, url: str, download: bool = False) -> dict[str, Any]:
+        return {"entries": self.platform.listing(url)}
+
+
+class NullStorageClient:
+    """Accepts uploads without storing them."""
+
+    def __init__(self) -> None:
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def blob_path(self, blob_name: str) -> str:
+        return blob_name
+
+    def exists(self, blob_name: str) -> bool:
+        return False
+
+    def list_blobs(self, prefix: str) -> list[str]:
+        return []
+
+    def upload_blob(
+        self, blob_name: str, buf: IO[bytes], content_type: str = "video/mp4"
+    ) -> str:
+        while chunk := buf.read(1024 * 1024):
+            with self._lock:
+                self.bytes += len(chunk)
+        return blob_name
+
+
+class LatencyRecorder:
+    """Session response hook recording the latency of every core API call."""
+
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = defaultdict(list)
+        self.errors = 0
+
+    def __call__(self, resp: requests.Response, *_: Any, **__: Any) -> None:
+        method = resp.request.method
+        path = urlsplit(resp.url).path
+        if CURSOR_PATH.match(path):
+            path = "/media_feeds/cursors/{target}/{platform}"
+        elif method == "PATCH" and VIDEO_PATH.match(path):
+            path = "/videos/{id}"
+        self.samples[f"{method} {path}"].append(resp.elapsed.total_seconds())
+        if resp.status_code >= 500:
+            self.errors += 1
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """p50, p95 and p99 of the samples, in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    if len(samples) == 1:
+        return {p: samples[0] * 1000 for p in ("p50", "p95", "p99")}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+def patch_platform(scraper: str, platform: FakePlatform) -> list[Any]:
+    """Patches replacing the platform side and the request pacing of a scraper."""
+    from scraper_common import RateLimiter
+
+    main = importlib.import_module(f"{scraper}.__main__")
+    scrape = importlib.import_module(f"{scraper}.scrape")
+    paced = importlib.import_module(PACED_MODULES[scraper])
+    patches: list[Any] = [mock.patch.object(paced, "rate_limiter", RateLimiter({}))]
+    if scraper == "tubescraper":
+        patches += [
+            mock.patch.object(main, "id_for_channel", lambda channel: channel),
+            mock.patch.object(main, "channel_shorts", lambda c, _: platform.listing(c)),
+            mock.patch.object(main, "keyword_shorts", lambda k, _: platform.listing(k)),
+            mock.patch.object(scrape, "video_details", platform.details),
+        ]
+    elif scraper == "tokscraper":
+        FakeYoutubeDL.platform = platform
+        patches += [
+            mock.patch.object(
+                scrape, "yt_dlp", SimpleNamespace(YoutubeDL=FakeYoutubeDL)
+            ),
+            mock.patch.object(scrape, "video_details", platform.details),
+        ]
+    else:
+        instagram = importlib.import_module("instascraper.instagram")
+        patches += [
+            mock.patch.object(scrape, "new_session", lambda: None),
+            mock.patch.object(instagram, "fetch_profile", platform.instagram_profile),
+            mock.patch.object(instagram.Reel, "video_stream", platform.reel_stream),
+        ]
+    return patches
+
+
+def run_scraper(
+    scraper: str, mode: str, targets: int | None, storage_client: NullStorageClient
+) -> None:
+    """Run one scrape of the given mode, as the scraper's CLI would."""
+    from scraper_common import AsyncUploader
+    from scraper_common.coreapi import RESCRAPE_LIMIT
+
+    main = importlib.import_module(f"{scraper}.__main__")
+    coreapi = importlib.import_module(f"{scraper}.coreapi")
+    api_client = coreapi.api_client
+
+    with api_client, AsyncUploader.from_env(storage_client) as uploader:
+        if mode == "rescrape":
+            scrape = importlib.import_module(f"{scraper}.scrape")
+            for target in api_client.iter_rescrape_targets(
+                coreapi.PLATFORM,
+                min_age_hours=1,
+                limit=RESCRAPE_LIMIT if targets is None else targets,
+            ):
+                scrape.rescrape_short(target)
+        elif scraper == "instascraper":
+            channels = main.channel_feeds()
+            if targets is not None:
+                channels = dict(itertools.islice(channels.items(), targets))
+            main.channels_downloader(channels, storage_client)
+        elif mode == "channels":
+            feeds = (
+                feed
+                for feed in api_client.iter_channel_feeds()
+                if feed.platform == coreapi.PLATFORM
+            )
+            main.channels_downloader(itertools.islice(feeds, targets), uploader)
+        else:
+            keyword_feeds = itertools.islice(api_client.iter_keyword_feeds(), targets)
+            main.keywords_downloader(keyword_feeds, uploader)
+
+
+def report(
+    args: argparse.Namespace,
+    elapsed: float,
+    platform: FakePlatform,
+    storage_client: NullStorageClient,
+    recorder: LatencyRecorder,
+    error: Exception | None,
+) -> dict[str, Any]:
+    all_samples = [s for samples in recorder.samples.values() for s in samples]
+    # rescrapes look videos up instead of listing targets
+    processed = platform.listed or platform.looked_up
+    return {
+        "scraper": args.scraper,
+        "mode": args.mode,
+        "aborted": repr(error) if error else None,
+        "elapsed_s": elapsed,
+        "entries": processed,
+        "entries_per_s": processed / elapsed,
+        "downloads": platform.downloaded,
+        "uploaded_bytes": storage_client.bytes,
+        "requests": len(all_samples),
+        "requests_per_s": len(all_samples) / elapsed,
+        "server_errors": recorder.errors,
+        "latency_ms": {
+            endpoint: {"count": len(samples), **percentiles(samples)}
+            for endpoint, samples in [
+                *sorted(recorder.samples.items()),
+                ("all", all_samples),
+            ]
+        },
+    }
+
+
+def print_report(result: dict[str, Any]) -> None:
+    if result["aborted"]:
+        print(f"scrape aborted early: {result['aborted']}")
+    print(
+        f"{result['scraper']} {result['mode']}: {result['entries']} entries and "
+        f"{result['downloads']} downloads in {result['elapsed_s']:.2f}s "
+        f"({result['entries_per_s']:.0f} entries/s)"
+    )
+    print(
+        f"core api: {result['requests']} requests "
+        f"({result['requests_per_s']:.0f} req/s), "
+        f"{result['server_errors']} server errors"
+    )
+    print(f"{'endpoint':<48}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}  (ms)")
+    for endpoint, stats in result["latency_ms"].items():
+        print(
+            f"{endpoint:<48}{stats['count']:>7}{stats['p50']:>9.1f}"
+            f"{stats['p95']:>9.1f}{stats['p99']:>9.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("scraper", choices=MODES)
+    parser.add_argument(
+        "mode", choices=sorted({m for ms in MODES.values() for m in ms})
+    )
+    parser.add_argument("--api-url", help="use a running core-api instead")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--channels", type=int, default=50)
+    parser.add_argument("--keywords", type=int, default=20)
+    parser.add_argument("--videos", type=int, default=1000)
+    parser.add_argument(
+        "--targets", type=int, help="limit on channels, keywords or rescrapes"
+    )
+    parser.add_argument("--entries", type=int, default=20, help="entries per target")
+    parser.add_argument("--known-ratio", type=float, default=0.5)
+    parser.add_argument("--platform-latency", type=float, default=0.0)
+    parser.add_argument("--video-size", type=int, default=256 * 1024)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    if args.mode not in MODES[args.scraper]:
+        parser.error(f"{args.scraper} has no {args.mode} mode")
+
+    with ExitStack() as stack:
+        api_url = args.api_url
+        if api_url is None:
+            api = FakeCoreAPI(
+                latency=args.latency,
+                error_rate=args.error_rate,
+                channels=args.channels,
+                keywords=args.keywords,
+                videos=args.videos,
+                seed=args.seed,
+            )
+            api_url = stack.enter_context(api).url
+
+        # the scrapers configure themselves from the environment on import
+        os.environ["API_URL"] = api_url
+        os.environ.setdefault("API_KEYS", '["loadtest"]')
+        os.environ.setdefault("STORAGE_BUCKET_NAME", "local")
+        # scraper logs go to stdout with the report, set APP_LOG_LEVEL to see them
+        os.environ.setdefault("APP_LOG_LEVEL", "critical")
+        for name in ("PROXY_COUNT", "PROXY_USERNAME", "PROXY_PASSWORD"):
+            os.environ.setdefault(name, "1" if name == "PROXY_COUNT" else "loadtest")
+
+        platform = FakePlatform(
+            PLATFORMS[args.scraper],
+            entries=args.entries,
+            videos=args.videos,
+            known_ratio=args.known_ratio,
+            latency=args.platform_latency,
+            video_size=args.video_size,
+            seed=args.seed,
+        )
+        for patch in patch_platform(args.scraper, platform):
+            stack.enter_context(patch)
+
+        recorder = LatencyRecorder()
+        coreapi = importlib.import_module(f"{args.scraper}.coreapi")
+        coreapi.api_client.session.hooks["response"].append(recorder)
+
+        storage_client = NullStorageClient()
+        error = None
+        start = time.perf_counter()
+        try:
+            run_scraper(args.scraper, args.mode, args.targets, storage_client)
+        except Exception as ex:
+            # a crash is a result too, e.g. when injected errors aren't handled
+            error = ex
+        elapsed = time.perf_counter() - start
+
+    result = report(args, elapsed, platform, storage_client, recorder, error)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark StorageClient uploads: throughput, peak RSS and allocations.
+
+Uploads videos of each --sizes to each --clients from each --buffers kind:
+
+    bytesio   the whole video in an io.BytesIO
+    spooled   a download buffer from DownloadBuffers, spilled to disk when large
+    file      a regular file on disk
+    stream    an unseekable stream, like a streamed HTTP response
+
+The clients are DiskStorageClient ("disk") and GoogleCloudStorageClient with
+parallel composite uploads off ("gcs") and for every seekable stream
+("gcs-parallel"), the latter two against tools/fake_gcs.py.
+
+Every case runs in a fresh process, so peak RSS (ru_maxrss) is the case's own.
+The upload itself is traced with memray for its peak heap memory and number of
+allocations; --no-memray skips that, for throughput without tracing overhead.
+
+Usage:
+    uv run python tools/storage_bench.py
+    uv run python tools/storage_bench.py --sizes 5 200 --clients gcs --json
+"""
+
+import argparse
+import io
+import itertools
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from typing import IO, Any
+
+from fake_gcs import FakeGCS
+
+CLIENTS = ("disk", "gcs", "gcs-parallel")
+BUFFERS = ("bytesio", "spooled", "file", "stream")
+
+MIB = 1024 * 1024
+BLOCK = os.urandom(MIB)
+
+
+def chunks(size: int) -> Iterator[bytes]:
+    """`size` bytes of video stand-in, in blocks of at most 1 MiB."""
+    for offset in range(0, size, MIB):
+        yield BLOCK[: min(MIB, size - offset)]
+
+
+def make_buffer(kind: str, size: int, tmp_dir: str) -> IO[bytes]:
+    from scraper_common import DownloadBuffers, IterableReader
+
+    if kind == "stream":
+        return io.BufferedReader(IterableReader(chunks(size)))
+
+    buf: IO[bytes]
+    if kind == "bytesio":
+        buf = io.BytesIO()
+    elif kind == "spooled":
+        buf = DownloadBuffers(tmp_dir=tmp_dir).acquire()
+    else:
+        buf = tempfile.TemporaryFile(dir=tmp_dir)
+    for chunk in chunks(size):
+        buf.write(chunk)
+    buf.seek(0)
+    return buf
+
+
+def make_client(kind: str, tmp_dir: str) -> Any:
+    from scraper_common import DiskStorageClient, GoogleCloudStorageClient
+
+    if kind == "disk":
+        return DiskStorageClient(os.path.join(tmp_dir, "blobs"))
+    if kind == "gcs":
+        return GoogleCloudStorageClient("bench", "bench", parallel_threshold=0)
+    return GoogleCloudStorageClient("bench", "bench", parallel_threshold=1)
+
+
+def current_rss() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def run_case(client_kind: str, buffer_kind: str, size: int, memray: bool) -> dict:
+    """Upload one video and measure it. Runs in the case's own process."""
+    with tempfile.TemporaryDirectory(prefix="storage-bench-") as tmp_dir:
+        client = make_client(client_kind, tmp_dir)
+        buf = make_buffer(buffer_kind, size, tmp_dir)
+        rss_before = current_rss()
+
+        allocations = peak_memory = None
+        start = time.perf_counter()
+        if memray:
+            import memray as memray_
+
+            trace = os.path.join(tmp_dir, "upload.bin")
+            with memray_.Tracker(trace):
+                client.upload_blob("chan/vid.mp4", buf)
+            elapsed = time.perf_counter() - start
+            metadata = memray_.FileReader(trace).metadata
+            allocations = metadata.total_allocations
+            peak_memory = metadata.peak_memory
+        else:
+            client.upload_blob("chan/vid.mp4", buf)
+            elapsed = time.perf_counter() - start
+        buf.close()
+
+    return {
+        "client": client_kind,
+        "buffer": buffer_kind,
+        "size_mb": size / MIB,
+        "elapsed_s": elapsed,
+        "throughput_mb_s": size / MIB / elapsed,
+        "rss_before_mb": rss_before / MIB,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_heap_mb": peak_memory / MIB if peak_memory is not None else None,
+        "allocations": allocations,
+    }
+
+
+def run_in_process(
+    client_kind: str, buffer_kind: str, size: int, memray: bool, gcs_url: str
+) -> dict:
+    cmd = [sys.executable, __file__, "--case", client_kind, buffer_kind, str(size)]
+    if not memray:
+        cmd.append("--no-memray")
+    env = {**os.environ, "STORAGE_EMULATOR_HOST": gcs_url, "APP_LOG_LEVEL": "error"}
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def print_report(results: list[dict]) -> None:
+    print(
+        f"{'client':<14}{'buffer':<9}{'MiB':>6}{'MiB/s':>9}{'rss before':>12}"
+        f"{'peak rss':>10}{'peak heap':>11}{'allocs':>10}"
+    )
+    for r in results:
+        heap = f"{r['peak_heap_mb']:.1f}" if r["peak_heap_mb"] is not None else "-"
+        allocs = r["allocations"] if r["allocations"] is not None else "-"
+        print(
+            f"{r['client']:<14}{r['buffer']:<9}{r['size_mb']:>6.0f}"
+            f"{r['throughput_mb_s']:>9.1f}{r['rss_before_mb']:>12.1f}"
+            f"{r['peak_rss_mb']:>10.1f}{heap:>11}{allocs:>10}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 200], help="MiB")
+    parser.add_argument("--clients", nargs="+", choices=CLIENTS, default=CLIENTS)
+    parser.add_argument("--buffers", nargs="+", choices=BUFFERS, default=BUFFERS)
+    parser.add_argument("--no-memray", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        client_kind, buffer_kind, size = args.case
+        result = run_case(client_kind, buffer_kind, int(size), not args.no_memray)
+        print(json.dumps(result))
+        return
+
+    results = []
+    with FakeGCS() as gcs:
+        for client_kind, buffer_kind, size in itertools.product(
+            args.clients, args.buffers, args.sizes
+        ):
+            results.append(
+                run_in_process(
+                    client_kind, buffer_kind, size * MIB, not args.no_memray, gcs.url
+                )
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
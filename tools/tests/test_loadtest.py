@@ -0,0 +1,37 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+LOADTEST = Path(__file__).parents[1] / "loadtest.py"
+
+
+@pytest.mark.parametrize(
+    "scraper, mode",
+    [
+        ("tubescraper", "channels"),
+        ("tubescraper", "keywords"),
+        ("tubescraper", "rescrape"),
+        ("tokscraper", "channels"),
+        ("tokscraper", "rescrape"),
+        ("instascraper", "channels"),
+    ],
+)
+def test_loadtest_runs_every_mode(scraper: str, mode: str) -> None:
+    # the scrapers configure themselves from the environment on import, so each
+    # run needs a process of its own
+    out = subprocess.run(
+        [sys.executable, str(LOADTEST), scraper, mode, "--targets", "2", "--json"],
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert out.returncode == 0, out.stderr
+    result: dict[str, Any] = json.loads(out.stdout)
+
+    assert result["aborted"] is None
+    assert result["entries"] > 0
+    assert result["requests"] > 0